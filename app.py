@@ -1,8 +1,21 @@
 import streamlit as st
-import pandas as pd
-import pyodbc
-from datetime import datetime, timedelta
-import re
+import os
+import uuid
+from datetime import datetime
+
+from bulk_calculate import read_bulk_input
+from business_calendars import describe_calendars, get_calendars
+from exporter import EXPORT_FORMATS, export_to_file, remove_export
+from instrumentation import TRACE_LOG, read_sql, stage, start_trace
+from master_data import master_data_cache
+from mirror import MIRROR_ENABLED, describe_sync, get_mirror
+from paging import PAGE_SIZES, get_pager, page_count
+from query_handler import get_query_log
+from report_engine import (CHANGED_RULES, RELEASE_VIEWS, bulk_calculate_report, calculate_rule_report,
+                           get_connection_pool, release_impact_report, release_notes_report, rule_diff_report,
+                           what_triggers_what_report)
+from rule_diff import PROD_DATABASE, QA_DATABASE
+from snapshot_cache import hierarchy_cache
 
 # Initialize session state
 if 'authenticated' not in st.session_state:
@@ -13,199 +26,109 @@ if 'authenticated' not in st.session_state:
 
 st.set_page_config(page_title="IP Rule Family Analyzer", layout="wide", initial_sidebar_state="expanded")
 
-def get_db_connection(username, password, database):
-    conn_str = (
-        f"Driver={{ODBC Driver 17 for SQL Server}};"
-        f"Server=tcp:lumenip.database.windows.net,1433;"
-        f"Database={database};"
-        f"Uid={username}@lumenip;"
-        f"Pwd={password};"
-        f"Encrypt=yes;"
-        f"TrustServerCertificate=no;"
-        f"Connection Timeout=30;"
-    )
-    return pyodbc.connect(conn_str)
+def session_credentials(database=None):
+    # Arguments for report_engine.get_connection_pool; database defaults to the logged-in one
+    return st.session_state['username'], st.session_state['password'], database or st.session_state['database']
 
-def calculate_date(trigger_date, formula):
-    if not formula or not isinstance(formula, str):
-        return None
-    
-    # Standardize formula text
-    formula = formula.strip().lower()
-    
-    # Extract number and unit from formula
-    pattern = r'add (\d+) (\w+)'
-    match = re.search(pattern, formula)
+def render_export(result):
+    export_format = st.selectbox("Export format", options=list(EXPORT_FORMATS), key="export_format")
     
-    if not match:
-        return None
-        
-    number = int(match.group(1))
-    unit = match.group(2).rstrip('s')  # Remove potential plural
-    
-    if unit == 'month':
-        # Handle month addition considering end of month cases
-        new_month = trigger_date.month + number
-        new_year = trigger_date.year + (new_month - 1) // 12
-        new_month = ((new_month - 1) % 12) + 1
-        
-        # Try to maintain the same day, but adjust for end of month cases
-        max_day = (trigger_date.replace(year=new_year, month=new_month + 1, day=1) - timedelta(days=1)).day
-        new_day = min(trigger_date.day, max_day)
-        
-        return trigger_date.replace(year=new_year, month=new_month, day=new_day)
-    elif unit == 'day':
-        return trigger_date + timedelta(days=number)
-    elif unit == 'week':
-        return trigger_date + timedelta(weeks=number)
+    # The file is only written when asked for, chunk by chunk, to a temporary file
+    if st.button("Prepare export", key="export_button"):
+        previous_export = st.session_state.pop('export_file', None)
+        if previous_export:
+            remove_export(previous_export['path'])
+        with st.spinner("Writing export..."):
+            path = export_to_file(result['export'], export_format)
+        st.session_state['export_file'] = {'path': path, 'format': export_format, 'result_id': result['id']}
     
-    return None
+    export_file = st.session_state.get('export_file')
+    if (export_file and export_file['result_id'] == result['id'] and export_file['format'] == export_format
+            and os.path.exists(export_file['path'])):
+        extension, mime = EXPORT_FORMATS[export_format]
+        with open(export_file['path'], 'rb') as f:
+            st.download_button(
+                label=f"Download {export_format}",
+                data=f,
+                file_name=f"{result['file_stem']}.{extension}",
+                mime=mime,
+                key="download_button"
+            )
 
-def get_calculated_rule_data(conn, rule_id=None, trigger_date=None):
-    results_df = pd.read_sql("EXEC dbo.RuleHierarchyReport", conn)
-    
-    if rule_id:
-        family_refs = get_family_references(results_df, rule_id=rule_id)
-        results_df = results_df[results_df['FamilyReference'].isin(family_refs)]
-    
-    if trigger_date:
-        # Convert trigger_date to datetime if it's not already
-        if isinstance(trigger_date, str):
-            trigger_date = pd.to_datetime(trigger_date).date()
-            
-        # Apply date calculations and store results in new columns
-        results_df['Calculated_Due_Date'] = results_df['DueDate'].apply(
-            lambda x: calculate_date(trigger_date, x) if pd.notnull(x) else None)
-        results_df['Calculated_Final_Due_Date'] = results_df['FinalDueDate'].apply(
-            lambda x: calculate_date(trigger_date, x) if pd.notnull(x) else None)
+def render_paged_dataframe(result):
+    pager = get_pager(result)
+    columns = list(result['display'].columns)
     
-    return results_df
-
-def get_dashboard_metrics_triggers(filtered_df):
-    return pd.DataFrame([{
-        'Jurisdictions': ', '.join(sorted(set([j.strip() for j in filtered_df['Jurisdictions'].str.split(',').explode().str.strip()]))),
-        'MatterTypes': ', '.join(sorted(set([m.strip() for m in filtered_df['MatterType'].str.split(',').explode().str.strip()]))),
-        'Actions': len(filtered_df[filtered_df['RuleType'] == 'Action']),
-        'Tasks': len(filtered_df[filtered_df['RuleType'] == 'Task'])
-    }])
-
-def get_dashboard_metrics_release(filtered_df, from_date, to_date):
-    return pd.DataFrame([{
-        'Jurisdictions': ', '.join(sorted(set([j.strip() for j in filtered_df['Country'].str.split(',').explode().str.strip()]))),
-        'From': from_date.strftime('%Y-%m-%d'),
-        'To': to_date.strftime('%Y-%m-%d'),
-        'Actions': len(filtered_df[filtered_df['Rule Type'] == 'Action']),
-        'Tasks': len(filtered_df[filtered_df['Rule Type'] == 'Task'])
-    }])
-
-def get_jurisdictions(conn):
-    query = """
-    SELECT DISTINCT Name,
-           CASE Name 
-               WHEN 'United States' THEN 1
-               WHEN 'European Patent Office' THEN 2
-               WHEN 'WIPO' THEN 3
-               ELSE 4 
-           END as SortOrder
-    FROM tblCountryMaster 
-    WHERE (isDirtyFlag = 0 OR isDirtyFlag IS NULL)
-    ORDER BY 2, 1
-    """
-    return pd.read_sql(query, conn)
-
-def get_filtered_options(conn, jurisdiction=None, matter_type=None):
-    conditions = []
-    if jurisdiction and jurisdiction != 'All':
-        conditions.append(f"c.Name = '{jurisdiction}'")
-    if matter_type:
-        conditions.append(f"m.MaterType = '{matter_type}'")
+    cols = st.columns([2, 1, 2, 2, 1])
+    sort_column = cols[0].selectbox("Sort by", options=[''] + columns, key="sort_column")
+    descending = cols[1].checkbox("Descending", key="sort_descending")
+    filter_column = cols[2].selectbox("Filter column", options=[''] + columns, key="filter_column")
+    filter_text = cols[3].text_input("Contains", key="filter_text")
+    page_size = cols[4].selectbox("Rows per page", options=PAGE_SIZES, index=1, key="page_size")
     
-    where_clause = f"WHERE rd.Active = 1 {' AND ' + ' AND '.join(conditions) if conditions else ''}"
+    positions = pager.positions(
+        sort_column=sort_column or None,
+        ascending=not descending,
+        filter_column=filter_column or None,
+        filter_text=filter_text.strip() or None
+    )
     
-    query = f"""
-    SELECT DISTINCT
-        rd.ID,
-        rd.Activity,
-        CONCAT('[', rd.ID, '] ', rd.Activity) as DisplayName,
-        o.Label AS Outcome
-    FROM tblRuleDefination rd
-    CROSS APPLY dbo.SplitStrings(rd.MatterType, ',') mt
-    CROSS APPLY dbo.SplitStrings(rd.Jurisdiction, ',') j
-    JOIN tblMatterTypeMaster m ON RTRIM(LTRIM(mt.Item)) = CAST(m.ID AS VARCHAR)
-    JOIN tblCountryMaster c ON RTRIM(LTRIM(j.Item)) = CAST(c.ID AS VARCHAR)
-    LEFT JOIN tblOutcomes o ON rd.ID = o.[Rule]
-    {where_clause}
-    """
-    return pd.read_sql(query, conn)
-def get_release_notes_data(conn, jurisdiction=None, matter_type=None, from_date=None, to_date=None):
-    conditions = []
-    if jurisdiction and jurisdiction != 'All':
-        conditions.append(f"c.Name = '{jurisdiction}'")
-    if matter_type:
-        conditions.append(f"m.MaterType = '{matter_type}'")
-    if from_date:
-        conditions.append(f"rd.ModifiedOn >= '{from_date}'")
-    if to_date:
-        conditions.append(f"rd.ModifiedOn <= '{to_date}'")
+    # Back to the first page whenever the result, sort, filter or page size changes
+    view = (result['id'], sort_column, descending, filter_column, filter_text, page_size)
+    if st.session_state.get('page_view') != view:
+        st.session_state['page_view'] = view
+        st.session_state['page_number'] = 1
+    pages = page_count(len(positions), page_size)
+    st.session_state['page_number'] = min(st.session_state.get('page_number', 1), pages)
     
-    where_clause = f"WHERE rd.Active = 1 {' AND ' + ' AND '.join(conditions) if conditions else ''}"
+    # Only the visible slice is sent to the browser
+    with stage('render') as record:
+        st.dataframe(
+            record.set_frame(pager.page(positions, st.session_state['page_number'], page_size)),
+            hide_index=True,
+            use_container_width=True,
+            height=600
+        )
     
-    query = f"""
-    SELECT DISTINCT
-        rd.ID as 'QA Rule ID',
-        rd.ProdId as 'Rule ID',
-        rd.Activity as 'Rule Name',
-        rt.RuleType as 'Rule Type',
-        STUFF((
-            SELECT DISTINCT ', ' + m2.MaterType
-            FROM dbo.SplitStrings(rd.MatterType, ',') mt2
-            JOIN tblMatterTypeMaster m2 ON RTRIM(LTRIM(mt2.Item)) = CAST(m2.ID AS VARCHAR)
-            FOR XML PATH(''), TYPE).value('.', 'varchar(max)'), 1, 2, '') as 'Matter Type',
-        STUFF((
-            SELECT DISTINCT ', ' + c2.Name
-            FROM dbo.SplitStrings(rd.Jurisdiction, ',') j2
-            JOIN tblCountryMaster c2 ON RTRIM(LTRIM(j2.Item)) = CAST(c2.ID AS VARCHAR)
-            FOR XML PATH(''), TYPE).value('.', 'varchar(max)'), 1, 2, '') as Country,
-        rd.versionType as 'Version Type',
-        rd.CalcCode as 'Calc Code',
-        rd.versionNotes as 'Version Notes',
-        rd.releaseVersion as 'Release Version',
-        rd.Reference as Reference,
-        rd.ModifiedOn as 'Modified On'
-    FROM tblRuleDefination rd
-    CROSS APPLY dbo.SplitStrings(rd.MatterType, ',') mt
-    CROSS APPLY dbo.SplitStrings(rd.Jurisdiction, ',') j
-    JOIN tblMatterTypeMaster m ON RTRIM(LTRIM(mt.Item)) = CAST(m.ID AS VARCHAR)
-    JOIN tblCountryMaster c ON RTRIM(LTRIM(j.Item)) = CAST(c.ID AS VARCHAR)
-    LEFT JOIN tblRuleTypeMaster rt ON rd.RuleType = rt.ID
-    {where_clause}
-    ORDER BY rd.ModifiedOn DESC
-    """
-    return pd.read_sql(query, conn)
+    cols = st.columns([1, 4])
+    page_number = cols[0].number_input("Page", min_value=1, max_value=pages, step=1, key="page_number")
+    first = (page_number - 1) * page_size
+    cols[1].caption(
+        f"Rows {min(first + 1, len(positions)):,}-{min(first + page_size, len(positions)):,} "
+        f"of {len(positions):,} (page {page_number} of {pages})"
+    )
 
-def get_family_references(df, rule_id=None, rule_name=None, outcome=None):
-    if rule_id:
-        return df[df['ChainPath'].apply(lambda x: str(rule_id) in x.split('->'))]['FamilyReference'].unique()
-    elif rule_name:
-        return df[df['RuleName'] == rule_name]['FamilyReference'].unique()
-    elif outcome:
-        return df[df['Outcome'].str.contains(outcome, case=False, na=False)]['FamilyReference'].unique()
-    return []
+def render_trace(trace):
+    if trace is None:
+        st.caption("No search traced yet.")
+        return
+    status = f" (failed: {trace.error})" if trace.error else ""
+    st.caption(f"{trace.name}: {trace.seconds:.2f}s total{status}")
+    st.dataframe(trace.stages_frame(), hide_index=True, use_container_width=True)
+    if trace.profile_text:
+        st.caption(f"cProfile, top functions by cumulative time ({trace.profile_path or 'not saved'})")
+        st.code(trace.profile_text, language=None)
+    st.caption(f"Trace log: {TRACE_LOG}")
 
-def get_calculated_rule_data(conn, rule_id=None, trigger_date=None):
-    results_df = pd.read_sql("EXEC dbo.RuleHierarchyReport", conn)
+def render_results(result):
+    if result['display'].empty:
+        st.write("No results found.")
+        return
     
-    if rule_id:
-        family_refs = get_family_references(results_df, rule_id=rule_id)
-        results_df = results_df[results_df['FamilyReference'].isin(family_refs)]
+    if result['metrics']:
+        cols = st.columns(result['column_widths'])
+        for col, (label, value) in zip(cols, result['metrics']):
+            col.metric(label, value)
+
+    st.markdown('<div class="spacer"></div>', unsafe_allow_html=True)
     
-    if trigger_date:
-        results_df['Calculated_Due_Date'] = results_df['DueDate'].apply(
-            lambda x: calculate_date(trigger_date, x))
-        results_df['Calculated_Final_Due_Date'] = results_df['FinalDueDate'].apply(
-            lambda x: calculate_date(trigger_date, x))
+    if result['caption']:
+        st.caption(result['caption'])
+    render_paged_dataframe(result)
     
-    return results_df
+    # Preliminary results have no export
+    if result['export'] is not None:
+        render_export(result)
 
 def main():
     css = '''
@@ -233,14 +156,21 @@ def main():
             username = st.text_input("Username", key="username_input")
             password = st.text_input("Password", type="password", key="password_input")
             database = st.selectbox("Database", 
-                options=["lumenip-IPRulesEngineQA1", "IPRulesEngine"],
+                options=[QA_DATABASE, PROD_DATABASE],
                 key="database_select")
             
             if st.button("Login", key="login_button"):
                 try:
-                    conn = get_db_connection(username, password, database)
-                    test_df = pd.read_sql("SELECT 1", conn)
-                    conn.close()
+                    # The login connection stays in the pool; the master data lookups
+                    # then run side by side on pooled connections
+                    pool = get_connection_pool(username, password, database)
+                    with pool.connection() as conn:
+                        read_sql("SELECT 1", conn, name='login check')
+                    try:
+                        master_data_cache.warm(database, pool.connection)
+                    except Exception:
+                        # The sidebar loads it on demand and reports the error there
+                        pass
                     st.session_state['authenticated'] = True
                     st.session_state['username'] = username
                     st.session_state['password'] = password
@@ -254,32 +184,29 @@ def main():
             st.header("Reports")
             report_type = st.selectbox(
                 "Select Report",
-                options=["What Triggers What", "Release Notes", "Calculate Rule"],
+                options=["What Triggers What", "Release Notes", "Calculate Rule", "QA vs Production"],
                 key="report_select"
             )
             
             st.header("Search Filters")
             
             try:
-                conn = get_db_connection(
-                    st.session_state['username'],
-                    st.session_state['password'],
-                    st.session_state['database']
-                )
+                # Served from memory, the database is only asked when a version check is due
+                master = master_data_cache.get(st.session_state['database'],
+                                               get_connection_pool(*session_credentials()).connection)
+                if master.missing:
+                    missing = ', '.join(name.replace('_', ' ') for name in master.missing)
+                    st.caption(f"Still loading {missing}; rerun to refresh." if master.pending
+                               else f"Could not load {missing}; retrying shortly.")
                 
-                jurisdictions = get_jurisdictions(conn)
+                jurisdictions = master.jurisdictions
                 jurisdiction = st.selectbox(
                     "Jurisdiction", 
                     options=['All'] + list(jurisdictions['Name']),
                     key="jurisdiction_select"
                 )
                 
-                matter_types = pd.read_sql("""
-                    SELECT DISTINCT MaterType
-                    FROM tblMatterTypeMaster 
-                    WHERE (isDirtyFlag = 0 OR isDirtyFlag IS NULL)
-                    ORDER BY MaterType
-                """, conn)
+                matter_types = master.matter_types
                 
                 matter_type = st.selectbox(
                     "Matter Type", 
@@ -288,199 +215,202 @@ def main():
                 )
                 
                 if report_type in ["What Triggers What", "Calculate Rule"]:
-                    filtered_options = get_filtered_options(conn, jurisdiction, matter_type)
-                    
-                    rule = st.selectbox(
+                    choices = master.choices(jurisdiction, matter_type)
+
+                    # Ranked on the server; only the best matches are sent to the browser
+                    rule_query = st.text_input(
                         "Search Rules",
-                        options=[''] + list(sorted(filtered_options['DisplayName'].unique())),
-                        key="rule_select"
+                        placeholder="Rule ID, activity or outcome",
+                        key="rule_query"
                     )
-                    
+                    rule = ''
+                    if rule_query.strip():
+                        matches = master.search_rules(rule_query, jurisdiction, matter_type)
+                        if matches.empty:
+                            st.caption("No matching rules.")
+                        else:
+                            rule = st.selectbox(
+                                "Matching rules",
+                                options=list(matches['DisplayName']),
+                                key="rule_select"
+                            )
+
                     if report_type == "What Triggers What":
                         outcomes = st.selectbox(
                             "Search Outcomes",
-                            options=[''] + list(sorted(filtered_options['Outcome'].dropna().unique())),
+                            options=[''] + choices['outcomes'],
                             key="outcome_select"
                         )
                     else:  # Calculate Rule
-                        trigger_date = st.date_input(
-                            "Trigger Date",
-                            value=datetime.now().date(),
-                            key="trigger_date"
+                        calc_mode = st.radio(
+                            "Mode",
+                            options=["Single", "Bulk upload"],
+                            horizontal=True,
+                            key="calc_mode"
                         )
+                        if calc_mode == "Single":
+                            trigger_date = st.date_input(
+                                "Trigger Date",
+                                value=datetime.now().date(),
+                                key="trigger_date"
+                            )
+                        else:
+                            bulk_file = st.file_uploader(
+                                "Matters (CSV/XLSX)",
+                                type=["csv", "xlsx"],
+                                help="Columns: Matter Ref, Rule ID, Trigger Date",
+                                key="bulk_file"
+                            )
+                        st.caption(describe_calendars(get_calendars()))
+                elif report_type == "QA vs Production":
+                    st.caption(f"Compares every rule in {QA_DATABASE} with {PROD_DATABASE}, "
+                               "including outcomes and conditions.")
                 else:  # Release Notes
                     from_date = st.date_input("From Date", key="from_date")
                     to_date = st.date_input("To Date", key="to_date")
+                    release_view = st.radio(
+                        "View",
+                        options=RELEASE_VIEWS,
+                        horizontal=True,
+                        key="release_view"
+                    )
                 
                 search_clicked = st.button("Search", type="primary", key="search_button")
             except Exception as e:
                 st.error(f"Error in filters: {str(e)}")
                 search_clicked = False
-            finally:
-                if 'conn' in locals() and conn:
-                    conn.close()
+
+            if MIRROR_ENABLED:
+                rule_mirror = get_mirror(st.session_state['database'])
+                if rule_mirror.sync_due():
+                    rule_mirror.sync_in_background(get_connection_pool(*session_credentials()).connection)
+                st.caption(describe_sync(rule_mirror.state()))
+                if rule_mirror.last_error:
+                    st.caption(f"Last sync failed: {rule_mirror.last_error}")
+                if st.button("Sync now", key="mirror_sync_button"):
+                    try:
+                        with get_connection_pool(*session_credentials()).connection() as sync_conn:
+                            rule_mirror.sync(sync_conn)
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"Sync failed: {str(e)}")
+
+            with st.expander("Hierarchy cache"):
+                cache_stats = hierarchy_cache.stats()
+                if cache_stats.empty:
+                    st.caption("No snapshot loaded yet.")
+                else:
+                    st.dataframe(cache_stats, hide_index=True, use_container_width=True)
+
+            # Filled in after the search below, so it shows the search that just ran
+            timings_panel = st.expander("Search timings")
+            if st.button("Profile next search", key="profile_button"):
+                st.session_state['profile_next_search'] = True
+            if st.session_state.get('profile_next_search') and not search_clicked:
+                st.caption("The next search runs under cProfile.")
+
+            with st.expander("Query timings"):
+                query_log = get_query_log()
+                if query_log.empty:
+                    st.caption("No queries run yet.")
+                else:
+                    st.dataframe(
+                        query_log.groupby('Statement')['Seconds'].agg(['count', 'mean', 'max']).round(3),
+                        use_container_width=True
+                    )
 
     # Main content area for results
+    trace = None
     if st.session_state['authenticated'] and search_clicked:
+        trace = start_trace(
+            report_type,
+            profile=st.session_state.pop('profile_next_search', False),
+            database=st.session_state['database'],
+            jurisdiction=jurisdiction,
+            matter_type=matter_type
+        )
         try:
-            conn = get_db_connection(
-                st.session_state['username'],
-                st.session_state['password'],
-                st.session_state['database']
-            )
+            pool = get_connection_pool(*session_credentials())
+            conn = pool.acquire()
+            database = st.session_state['database']
             
             if report_type == "What Triggers What":
-                results_df = pd.read_sql("EXEC dbo.RuleHierarchyReport", conn)
-                
-                rule_id = rule.split(']')[0][1:] if rule else None
-                
-                mask = pd.Series(True, index=results_df.index)
-                
-                if any([rule_id, outcomes]):
-                    family_refs = get_family_references(
-                        results_df,
-                        rule_id=rule_id,
-                        outcome=outcomes
-                    )
-                    mask &= results_df['FamilyReference'].isin(family_refs)
-                
-                if jurisdiction and jurisdiction != 'All':
-                    mask &= results_df['Jurisdictions'].str.contains(jurisdiction, case=False, na=False)
-                if matter_type:
-                    mask &= results_df['MatterType'].str.contains(matter_type, case=False, na=False)
-                
-                filtered_df = results_df[mask]
+                result = what_triggers_what_report(
+                    conn, database,
+                    rule_id=rule.split(']')[0][1:] if rule else None,
+                    outcome=outcomes,
+                    jurisdiction=jurisdiction,
+                    matter_type=matter_type,
+                    connection=pool.connection
+                )
+            
+            elif report_type == "Calculate Rule" and calc_mode == "Bulk upload":
+                if bulk_file is None:
+                    raise ValueError("Upload a CSV or XLSX file of matters first.")
                 
-                if filtered_df.empty:
-                    st.write("No results found.")
-                else:
-                    def truncate_text(text, max_length=30):
-                        return text[:max_length] + '...' if len(text) > max_length else text
-                    
-                    dashboard_df = get_dashboard_metrics_triggers(filtered_df)
-                    
-                    cols = st.columns([3, 1, 1, 1, 1])
-                    cols[0].metric("Jurisdictions", truncate_text(dashboard_df['Jurisdictions'].iloc[0], max_length=50))
-                    cols[1].metric("Matter Types", truncate_text(dashboard_df['MatterTypes'].iloc[0]))
-                    cols[2].metric("Actions", int(dashboard_df['Actions'].iloc[0]))
-                    cols[3].metric("Tasks", int(dashboard_df['Tasks'].iloc[0]))
-
-                    st.markdown('<div class="spacer"></div>', unsafe_allow_html=True)
-                    
-                    st.dataframe(
-                        filtered_df[[
-                            'FamilyReference', 'RuleID', 'ChainPath', 'RuleType', 'RuleName',
-                            'MatterType', 'Jurisdictions', 'TriggeredBy', 'TriggerCondition',
-                            'Output Type', 'Outcome', 'DueDate', 'FinalDueDate'
-                        ]],
-                        hide_index=True,
-                        use_container_width=True,
-                        height=600
-                    )
+                result = bulk_calculate_report(conn, database, read_bulk_input(bulk_file, bulk_file.name))
             
             elif report_type == "Calculate Rule":
-                rule_id = rule.split(']')[0][1:] if rule else None
-                filtered_df = get_calculated_rule_data(conn, rule_id, trigger_date)
-                
-                if jurisdiction and jurisdiction != 'All':
-                    filtered_df = filtered_df[filtered_df['Jurisdictions'].str.contains(
-                        jurisdiction, case=False, na=False)]
-                if matter_type:
-                    filtered_df = filtered_df[filtered_df['MatterType'].str.contains(
-                        matter_type, case=False, na=False)]
-                
-                if filtered_df.empty:
-                    st.write("No results found.")
-                else:
-                    def truncate_text(text, max_length=30):
-                        return text[:max_length] + '...' if len(text) > max_length else text
-                    
-                    dashboard_df = get_dashboard_metrics_triggers(filtered_df)
-                    
-                    cols = st.columns([3, 1, 1, 1, 1])
-                    cols[0].metric("Jurisdictions", 
-                        truncate_text(dashboard_df['Jurisdictions'].iloc[0], max_length=50))
-                    cols[1].metric("Matter Types", 
-                        truncate_text(dashboard_df['MatterTypes'].iloc[0]))
-                    cols[2].metric("Actions", int(dashboard_df['Actions'].iloc[0]))
-                    cols[3].metric("Tasks", int(dashboard_df['Tasks'].iloc[0]))
-
-                    st.markdown('<div class="spacer"></div>', unsafe_allow_html=True)
-                    
-# Create display dataframe with base date column
-                    display_df = filtered_df[[
-                        'FamilyReference', 'RuleID', 'RuleType', 'RuleName',
-                        'Output Type', 'Outcome'
-                    ]].copy()
-                    
-                    # Add Base Date before calculated dates
-                    display_df['Base Date'] = trigger_date.strftime('%Y-%m-%d')
-                    display_df['Calculated_Due_Date'] = filtered_df['Calculated_Due_Date']
-                    display_df['Calculated_Final_Due_Date'] = filtered_df['Calculated_Final_Due_Date']
-                    
-                    # Format dates for display
-                    for date_col in ['Calculated_Due_Date', 'Calculated_Final_Due_Date']:
-                        display_df[date_col] = pd.to_datetime(
-                            display_df[date_col]).dt.strftime('%Y-%m-%d')
-                        
-                    st.dataframe(
-                        display_df,
-                        hide_index=True,
-                        use_container_width=True,
-                        height=600
-                    )
+                result = calculate_rule_report(
+                    conn, database,
+                    rule_id=rule.split(']')[0][1:] if rule else None,
+                    trigger_date=trigger_date,
+                    jurisdiction=jurisdiction,
+                    matter_type=matter_type
+                )
             
-            else:  # Release Notes
-                filtered_df = get_release_notes_data(
-                    conn, 
-                    jurisdiction=jurisdiction if jurisdiction != 'All' else None,
-                    matter_type=matter_type if matter_type else None,
+            elif report_type == "QA vs Production":
+                # Same login on both databases; each side reads on its own pool
+                result = rule_diff_report(
+                    get_connection_pool(*session_credentials(QA_DATABASE)).connection,
+                    get_connection_pool(*session_credentials(PROD_DATABASE)).connection
+                )
+
+            elif release_view == CHANGED_RULES:
+                result = release_notes_report(
+                    conn, database,
+                    jurisdiction=jurisdiction,
+                    matter_type=matter_type,
                     from_date=from_date,
                     to_date=to_date
                 )
-                
-                if filtered_df.empty:
-                    st.write("No results found.")
-                else:
-                    def truncate_text(text, max_length=30):
-                        return text[:max_length] + '...' if len(text) > max_length else text
-                    
-                    dashboard_df = get_dashboard_metrics_release(filtered_df, from_date, to_date)
-                    
-                    cols = st.columns([3, 1, 1, 1, 1])
-                    cols[0].metric("Jurisdictions", truncate_text(dashboard_df['Jurisdictions'].iloc[0], max_length=50))
-                    cols[1].metric("From", dashboard_df['From'].iloc[0])
-                    cols[2].metric("To", dashboard_df['To'].iloc[0])
-                    cols[3].metric("Actions", int(dashboard_df['Actions'].iloc[0]))
-                    cols[4].metric("Tasks", int(dashboard_df['Tasks'].iloc[0]))
 
-                    st.markdown('<div class="spacer"></div>', unsafe_allow_html=True)
-                    
-                    st.dataframe(
-                        filtered_df[[
-                            'QA Rule ID', 'Rule ID', 'Rule Name', 'Rule Type', 'Matter Type',
-                            'Country', 'Version Type', 'Calc Code', 'Version Notes',
-                            'Release Version', 'Reference', 'Modified On'
-                        ]],
-                        hide_index=True,
-                        use_container_width=True,
-                        height=600
-                    )
+            else:  # Release Notes, traced down the affected families
+                result = release_impact_report(
+                    conn, database,
+                    jurisdiction=jurisdiction,
+                    matter_type=matter_type,
+                    from_date=from_date,
+                    to_date=to_date,
+                    view=release_view
+                )
             
-            # Common export functionality
-            csv = filtered_df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="Export to Excel",
-                data=csv,
-                file_name=f"{report_type.lower().replace(' ', '_')}.csv",
-                mime="text/csv"
-            )
+            # Results live in the session so reruns (e.g. preparing an export) keep showing them
+            previous_export = st.session_state.pop('export_file', None)
+            if previous_export:
+                remove_export(previous_export['path'])
+            result['id'] = uuid.uuid4().hex
+            st.session_state['last_result'] = result
 
         except Exception as e:
+            trace.error = str(e)
             st.error(f"Error loading results: {str(e)}")
+            st.session_state['last_result'] = None
         finally:
             if 'conn' in locals() and conn:
-                conn.close()
+                pool.release(conn)
+
+    last_result = st.session_state.get('last_result')
+    try:
+        if st.session_state['authenticated'] and last_result and last_result['report_type'] == report_type:
+            render_results(last_result)
+    finally:
+        if trace is not None:
+            st.session_state['last_trace'] = trace.finish()
+    
+    if st.session_state['authenticated']:
+        with timings_panel:
+            render_trace(st.session_state.get('last_trace'))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic_data import SyntheticRuleSet
+from exporter import EXPORT_FORMATS, export_to_file, remove_export
+
+
+def measure(label, func):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {seconds:8.2f}s  peak {peak / 2**20:8.1f} MiB")
+    return result
+
+
+def in_memory_csv(df):
+    # What the report page did before: the whole file as one bytes object
+    return len(df.to_csv(index=False).encode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak memory of report exports")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--formats', nargs='*', default=list(EXPORT_FORMATS))
+    args = parser.parse_args()
+
+    df = SyntheticRuleSet(rules=args.rows, families=max(1, args.rows // 50)).release_notes_frame()
+    print(f"{args.rows:,} rows, frame {df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+
+    measure('in-memory to_csv', lambda: in_memory_csv(df))
+    for export_format in args.formats:
+        path = measure(f"chunked {export_format}", lambda: export_to_file(df, export_format, tempfile.gettempdir()))
+        print(f"{'':<28} file {os.path.getsize(path) / 2**20:8.1f} MiB")
+        remove_export(path)
+
+
+if __name__ == '__main__':
+    main()
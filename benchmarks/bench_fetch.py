@@ -0,0 +1,81 @@
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic_data import SyntheticRuleSet
+from fast_fetch import CHUNK_ROWS, FETCH_BATCH_SIZE, fetch_chunks, fetch_frame
+
+QUERIES = {
+    'hierarchy': "SELECT * FROM RuleHierarchyReport",
+    'rules': "SELECT * FROM tblRuleDefination",
+}
+
+
+def streamed(conn, sql, batch_size, chunk_rows):
+    # What a consumer writing chunks elsewhere holds: one chunk at a time
+    rows = 0
+    for chunk in fetch_chunks(conn, sql, chunk_rows=chunk_rows, batch_size=batch_size):
+        rows += len(chunk)
+    return rows
+
+
+def readers(batch_size, chunk_rows):
+    return [
+        ('pd.read_sql', lambda conn, sql: pd.read_sql(sql, conn)),
+        ('fetch_frame', lambda conn, sql: fetch_frame(conn, sql, batch_size=batch_size)),
+        ('fetch_frame (categories)', lambda conn, sql: fetch_frame(conn, sql, categories=True,
+                                                                    batch_size=batch_size)),
+        ('fetch_chunks (streamed)', lambda conn, sql: streamed(conn, sql, batch_size, chunk_rows)),
+    ]
+
+
+def measure(fixture, sql, read, repeat):
+    conn = sqlite3.connect(fixture)
+    try:
+        seconds = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = read(conn, sql)
+            seconds.append(time.perf_counter() - started)
+        tracemalloc.start()
+        read(conn, sql)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        conn.close()
+    size = result.memory_usage(index=False, deep=True).sum() if isinstance(result, pd.DataFrame) else None
+    return min(seconds), peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and memory of pd.read_sql against the fetchmany path")
+    parser.add_argument('--rules', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--batch-size', type=int, default=FETCH_BATCH_SIZE)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--queries', nargs='*', choices=list(QUERIES), default=list(QUERIES))
+    args = parser.parse_args()
+
+    rule_set = SyntheticRuleSet(rules=args.rules, families=max(1, args.rules // 50), chain_depth=6)
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        fixture = rule_set.write_sqlite(os.path.join(fixture_dir, 'rules.sqlite'))
+        for query in args.queries:
+            sql = QUERIES[query]
+            conn = sqlite3.connect(fixture)
+            rows = conn.execute(f"SELECT COUNT(*) FROM ({sql})").fetchone()[0]
+            conn.close()
+            print(f"\n{query}: {rows:,} rows, batches of {args.batch_size:,}, chunks of {args.chunk_rows:,}")
+            for label, read in readers(args.batch_size, args.chunk_rows):
+                seconds, peak, size = measure(fixture, sql, read, args.repeat)
+                size_text = f"frame {size / 2**20:8.1f} MiB" if size is not None else ''
+                print(f"  {label:<26} {seconds:7.2f}s {rows / seconds:>12,.0f} rows/s  "
+                      f"peak {peak / 2**20:8.1f} MiB  {size_text}")
+
+
+if __name__ == '__main__':
+    main()
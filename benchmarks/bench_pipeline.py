@@ -0,0 +1,209 @@
+import argparse
+import datetime
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.synthetic_data import SyntheticRuleSet
+from business_calendars import BusinessCalendars
+from compact_snapshot import CompactHierarchy, memory_report
+from due_dates import add_calculated_dates
+from fast_fetch import fetch_frame
+from family_index import build_family_index
+from membership import build_membership_index
+from mirror import RuleMirror
+from report_engine import get_dashboard_metrics_release, get_dashboard_metrics_triggers, get_family_references
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+# Per-row Python paths are only timed up to this many rows
+MAX_SCALAR_ROWS = 100_000
+TRIGGER_DATE = datetime.date(2024, 3, 15)
+# Differences below these are timer and allocator noise, never regressions
+NOISE_FLOOR = {'seconds': 0.01, 'peak_mib': 0.5}
+
+
+def original_calculate_date(trigger_date, formula):
+    # The per-row calculate_date the app used before add_calculated_dates, kept as the baseline.
+    # It only reads the first "add N unit" term
+    if not formula or not isinstance(formula, str):
+        return None
+    match = re.search(r'add (\d+) (\w+)', formula.strip().lower())
+    if not match:
+        return None
+    number = int(match.group(1))
+    unit = match.group(2).rstrip('s')
+    if unit == 'month':
+        new_month = trigger_date.month + number
+        new_year = trigger_date.year + (new_month - 1) // 12
+        new_month = ((new_month - 1) % 12) + 1
+        max_day = (trigger_date.replace(year=new_year, month=new_month + 1, day=1) - datetime.timedelta(days=1)).day
+        return trigger_date.replace(year=new_year, month=new_month, day=min(trigger_date.day, max_day))
+    elif unit == 'day':
+        return trigger_date + datetime.timedelta(days=number)
+    elif unit == 'week':
+        return trigger_date + datetime.timedelta(weeks=number)
+    return None
+
+
+def measure(func, memory=True):
+    started = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - started
+    peak = None
+    if memory:
+        # Second run under tracemalloc, which slows the code down too much to time it
+        tracemalloc.start()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def pipeline_stages(rule_set, fixture_dir):
+    hierarchy = rule_set.hierarchy_frame()
+    release_notes = rule_set.release_notes_frame()
+    family_index = build_family_index(hierarchy)
+    membership = build_membership_index(hierarchy)
+    compact = CompactHierarchy(hierarchy)
+    rule_id = str(hierarchy['RuleID'].iloc[len(hierarchy) // 2])
+    jurisdiction = hierarchy['Jurisdictions'].iloc[0].split(', ')[0]
+    fixture = os.path.join(fixture_dir, f"rules_{len(hierarchy)}.sqlite")
+    calendars = BusinessCalendars(rule_set.write_calendars(os.path.join(fixture_dir, 'calendars')))
+    # One jurisdiction per row, like a bulk run spread over every country's calendar
+    single_jurisdiction = hierarchy.assign(Jurisdictions=hierarchy['Jurisdictions'].str.split(', ').str[0])
+
+    def wtw_filter():
+        # The snapshot branch of What Triggers What in main()
+        refs = get_family_references(hierarchy, rule_id=rule_id, index=family_index)
+        mask = hierarchy['FamilyReference'].isin(refs).to_numpy()
+        mask &= membership.filter_mask(jurisdiction=jurisdiction)
+        return hierarchy[mask]
+
+    def read_hierarchy(read):
+        conn = sqlite3.connect(fixture)
+        try:
+            return read(conn, "SELECT * FROM RuleHierarchyReport")
+        finally:
+            conn.close()
+
+    def mirror_sync():
+        mirror = RuleMirror(os.path.join(fixture_dir, f"mirror_{len(hierarchy)}.sqlite"))
+        if os.path.exists(mirror.path):
+            os.remove(mirror.path)
+        conn = sqlite3.connect(fixture)
+        try:
+            mirror.sync(conn)
+        finally:
+            conn.close()
+        return RuleMirror(mirror.path).tables()
+
+    rows = len(hierarchy)
+    scalar = rows <= MAX_SCALAR_ROWS
+    return [
+        ('build_family_index', lambda: build_family_index(hierarchy)),
+        ('build_membership_index', lambda: build_membership_index(hierarchy)),
+        ('compact snapshot', lambda: CompactHierarchy(hierarchy)),
+        ('compact view (all rows)', lambda: compact.view()),
+        ('build_family_index (compact)', lambda: build_family_index(compact.frame, compact.chains)),
+        ('build_membership_index (compact)', lambda: build_membership_index(compact.frame)),
+        ('get_family_references (scan)', lambda: get_family_references(hierarchy, rule_id=rule_id)),
+        ('get_family_references (index)', lambda: get_family_references(hierarchy, rule_id=rule_id,
+                                                                        index=family_index)),
+        ('wtw filter masks', wtw_filter),
+        ('calculate_date (per row)', (lambda: [original_calculate_date(TRIGGER_DATE, f) for f in hierarchy['DueDate']])
+         if scalar else None),
+        ('add_calculated_dates', lambda: add_calculated_dates(hierarchy, TRIGGER_DATE)),
+        ('add_calculated_dates (calendars)', lambda: add_calculated_dates(single_jurisdiction, TRIGGER_DATE,
+                                                                          calendars=calendars)),
+        ('dashboard triggers (split)', (lambda: get_dashboard_metrics_triggers(hierarchy)) if scalar else None),
+        ('dashboard triggers (index)', lambda: get_dashboard_metrics_triggers(hierarchy, membership)),
+        ('dashboard release', lambda: get_dashboard_metrics_release(release_notes, TRIGGER_DATE, TRIGGER_DATE)),
+        ('sqlite fixture write', lambda: rule_set.write_sqlite(fixture)),
+        ('read_sql hierarchy', lambda: read_hierarchy(lambda conn, sql: pd.read_sql(sql, conn))),
+        ('fast fetch hierarchy', lambda: read_hierarchy(
+            lambda conn, sql: fetch_frame(conn, sql, categories=True))),
+        ('mirror full sync + load', mirror_sync),
+    ]
+
+
+def print_memory(rule_set):
+    hierarchy = rule_set.hierarchy_frame()
+    report = memory_report(hierarchy, CompactHierarchy(hierarchy))
+    total = report.iloc[-1]
+    print(f"  {'snapshot memory':<32} {total['Before MB']:8.1f} MB -> {total['After MB']:.1f} MB")
+
+
+def run(sizes, families_ratio, chain_depth, jurisdictions_per_rule, memory, fixture_dir):
+    results = []
+    for rows in sizes:
+        rule_set = SyntheticRuleSet(rules=rows, families=max(1, int(rows * families_ratio)),
+                                    chain_depth=chain_depth, jurisdictions_per_rule=jurisdictions_per_rule)
+        print(f"\n{rows:,} rows")
+        print_memory(rule_set)
+        for stage, func in pipeline_stages(rule_set, fixture_dir):
+            if func is None:
+                print(f"  {stage:<32} skipped above {MAX_SCALAR_ROWS:,} rows")
+                continue
+            seconds, peak = measure(func, memory)
+            results.append({'stage': stage, 'rows': rows, 'seconds': seconds,
+                            'rows_per_second': rows / seconds if seconds else None,
+                            'peak_mib': peak / 2**20 if peak is not None else None})
+            peak_text = f"peak {peak / 2**20:8.1f} MiB" if peak is not None else ''
+            print(f"  {stage:<32} {seconds:8.3f}s {rows / max(seconds, 1e-9):>14,.0f} rows/s  {peak_text}")
+    return results
+
+
+def regressions(results, baseline, tolerance):
+    previous = {(r['stage'], r['rows']): r for r in baseline}
+    found = []
+    for result in results:
+        before = previous.get((result['stage'], result['rows']))
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_mib'):
+            if before.get(metric) is None or result.get(metric) is None:
+                continue
+            if (result[metric] > before[metric] * (1 + tolerance)
+                    and result[metric] - before[metric] > NOISE_FLOOR[metric]):
+                found.append(f"{result['stage']} @ {result['rows']:,} rows: {metric} "
+                             f"{before[metric]:.3f} -> {result[metric]:.3f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and peak memory of the report pipeline")
+    parser.add_argument('--sizes', type=int, nargs='*', default=SIZES)
+    parser.add_argument('--families-ratio', type=float, default=0.02, help="families per rule")
+    parser.add_argument('--chain-depth', type=int, default=6)
+    parser.add_argument('--jurisdictions-per-rule', type=int, default=3)
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="JSON results to compare against; exits 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fixture_dir:
+        results = run(args.sizes, args.families_ratio, args.chain_depth, args.jurisdictions_per_rule,
+                      not args.no_memory, fixture_dir)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
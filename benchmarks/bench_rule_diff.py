@@ -0,0 +1,100 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic_data import SyntheticRuleSet
+from rule_diff import ADDED, CHANGED, REMOVED, compare_databases
+
+# Production IDs of copied rules that no QA rule points at
+RETIRED_ID_OFFSET = 10_000_000
+
+
+def database_tables(rule_set, edits, seed=0):
+    # QA tables and a production copy of them that differs by a known number of rules
+    qa = rule_set.tables()
+    prod = {name: df.copy() for name, df in qa.items()}
+    rules = prod['tblRuleDefination']
+    rng = np.random.default_rng(seed)
+    renamed, recoded, relabelled, unpromoted = np.split(rng.choice(len(rules), edits * 4, replace=False), 4)
+
+    rules.loc[renamed, 'Activity'] = rules.loc[renamed, 'Activity'] + ' (old wording)'
+    rules.loc[recoded, 'CalcCode'] = 'add 1 day'
+    outcomes = prod['tblOutcomes']
+    old_labels = outcomes['Rule'].isin(rules.loc[relabelled, 'ID'])
+    outcomes.loc[old_labels, 'Label'] = outcomes.loc[old_labels, 'Label'] + ' (old)'
+
+    # Production rows carry production IDs
+    id_map = dict(zip(rules['ID'], rules['ProdId']))
+    for name in ('tblOutcomes', 'tblConditions'):
+        prod[name]['Rule'] = prod[name]['Rule'].map(id_map)
+    rules['ID'] = rules['ProdId']
+    retired = rules.iloc[:edits].assign(ID=lambda df: df['ID'] + RETIRED_ID_OFFSET)
+    prod['tblRuleDefination'] = pd.concat([rules.drop(index=unpromoted), retired], ignore_index=True)
+
+    expected = {ADDED: edits, REMOVED: edits, CHANGED: edits * 3}
+    return qa, prod, expected
+
+
+def write_database(tables, path):
+    conn = sqlite3.connect(path)
+    try:
+        for name, df in tables.items():
+            df.to_sql(name, conn, if_exists='replace', index=False)
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def connection_factory(path):
+    @contextmanager
+    def connection():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            conn.close()
+    return connection
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QA against production rule set diff, cold and with cached hashes")
+    parser.add_argument('--rules', type=int, default=200_000)
+    parser.add_argument('--edits', type=int, default=500, help="rules of each kind of difference")
+    args = parser.parse_args()
+
+    rule_set = SyntheticRuleSet(rules=args.rules, families=max(1, args.rules // 50))
+    qa, prod, expected = database_tables(rule_set, args.edits)
+    with tempfile.TemporaryDirectory() as directory:
+        qa_connection = connection_factory(write_database(qa, os.path.join(directory, 'qa.sqlite')))
+        prod_connection = connection_factory(write_database(prod, os.path.join(directory, 'prod.sqlite')))
+        compare = lambda: compare_databases(qa_connection, prod_connection, 'bench-qa', 'bench-prod')
+
+        diff_df, seconds = timed(compare)
+        print(f"{args.rules:,} rules: cold diff (load, hash, join) {seconds:.2f}s")
+        _, seconds = timed(compare)
+        print(f"cached hashes (version checks and join) {seconds:.3f}s")
+
+    found = diff_df['Change'].value_counts().to_dict()
+    print(f"found {found}")
+    print(diff_df.loc[diff_df['Change'] == CHANGED, 'Changed Fields'].value_counts().to_string())
+    if any(found.get(change, 0) != count for change, count in expected.items()):
+        print(f"MISMATCH, expected {expected}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
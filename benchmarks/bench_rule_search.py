@@ -0,0 +1,60 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic_data import SyntheticRuleSet
+from rule_search import RuleSearchIndex
+
+# What people type into "Search Rules": IDs, name prefixes, outcome words and typos
+QUERIES = ['12345', '1234', '7', 'office act', 'ofice acton', 'renewal fee 777', 'grant notified', 'pay annu',
+           'r', 'assignmnt 4242', 'respond to office action 4', 'zzzz']
+BUDGET_MS = 10.0
+
+
+def timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build time and lookup latency of the rule search index")
+    parser.add_argument('--rules', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--changed', type=int, default=500, help="rules edited for the incremental update")
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS, help="exit 1 if a p95 lookup exceeds this")
+    args = parser.parse_args()
+
+    rule_set = SyntheticRuleSet(rules=args.rules, families=max(1, args.rules // 50))
+    options = rule_set.rule_options_frame()
+    index, seconds = timed(lambda: RuleSearchIndex(options))
+    print(f"{args.rules:,} rules: full build {seconds:.2f}s")
+
+    edited = options.copy()
+    changed = edited['ID'].isin(rule_set.ids[:args.changed])
+    edited.loc[changed, 'Activity'] = edited.loc[changed, 'Activity'] + ' (amended)'
+    edited.loc[changed, 'DisplayName'] = edited.loc[changed, 'DisplayName'] + ' (amended)'
+    updated, seconds = timed(lambda: index.updated(edited))
+    delta = len(updated.delta) if updated.delta is not None else 0
+    print(f"incremental update of {args.changed:,} rules {seconds:.2f}s (delta segment {delta:,} rules)")
+
+    over = []
+    for query in QUERIES:
+        times = []
+        for _ in range(args.repeat):
+            results, seconds = timed(lambda: updated.search(query))
+            times.append(seconds * 1000)
+        p50, p95 = np.percentile(times, [50, 95])
+        print(f"  {query!r:30} p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  {len(results):3} results")
+        if p95 > args.budget_ms:
+            over.append(query)
+
+    if over:
+        print(f"OVER BUDGET ({args.budget_ms} ms): {', '.join(map(repr, over))}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
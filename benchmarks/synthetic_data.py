@@ -0,0 +1,220 @@
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from mirror import RELEASE_NOTES_COLUMNS
+from rule_graph import MATTER_TYPE_NAMES
+
+KNOWN_COUNTRIES = [
+    'United States', 'European Patent Office', 'WIPO', 'Germany', 'United Kingdom', 'France', 'China', 'Japan',
+    'Korea, Republic of', 'Canada', 'Australia', 'Brazil', 'India', 'Mexico', 'Switzerland', 'Unified Patent Court',
+]
+RULE_TYPES = {1: 'Action', 2: 'Task'}
+OUTPUT_TYPES = ['Deadline', 'Reminder', 'Information']
+OUTCOME_WORDS = ['Filing receipt issued', 'Office action received', 'Response filed', 'Grant notified',
+                 'Renewal paid', 'Opposition filed', 'Examination requested', 'Publication']
+ACTIVITY_VERBS = ['File', 'Pay', 'Respond to', 'Request', 'Record', 'Submit', 'Renew', 'Review', 'Docket',
+                  'Validate', 'Translate', 'Notify client of']
+ACTIVITY_OBJECTS = ['annuity', 'office action', 'examination request', 'priority document', 'opposition',
+                    'renewal fee', 'national phase entry', 'divisional application', 'appeal brief',
+                    'assignment', 'power of attorney', 'search report', 'grant fee', 'claims amendment']
+FORMULAS = ['add 2 months', 'add 3 months', 'add 1 year', 'add 30 days', 'add 1 year and 6 months',
+            'add 4 months - 1 day', 'subtract 7 days', 'add 2 weeks', None, 'per local practice',
+            'add 10 business days', 'add 1 month + 5 working days']
+
+HIERARCHY_COLUMNS = [
+    'FamilyReference', 'RuleID', 'ChainPath', 'Level', 'RuleType', 'RuleName', 'MatterType', 'Jurisdictions',
+    'TriggeredBy', 'TriggerCondition', 'Output Type', 'Outcome', 'DueDate', 'FinalDueDate',
+]
+
+
+def _join_rows(matrix, names, separator=', '):
+    # Distinct, sorted labels per row, like the FOR XML PATH('') concatenations in SQL
+    return [separator.join(sorted({names[code] for code in row})) for row in matrix.tolist()]
+
+
+class SyntheticRuleSet:
+    # Rule tables and report frames with the shape of the production data. Rules form
+    # trees of up to chain_depth levels; every child shares its root's first jurisdiction
+    # and matter type, so RuleGraphEngine finds exactly the generated connections.
+    def __init__(self, rules=1000, families=100, chain_depth=4, jurisdictions_per_rule=3, countries=150,
+                 seed=0):
+        families = max(1, min(families, rules))
+        self.rules = rules
+        self.families = families
+        rng = np.random.default_rng(seed)
+
+        self.ids = np.arange(1, rules + 1)
+        family = np.empty(rules, dtype=np.int64)
+        family[:families] = np.arange(families)
+        family[families:] = rng.integers(0, families, rules - families)
+        self.family = family
+
+        parent = np.full(rules, -1, dtype=np.int64)
+        depth = np.ones(rules, dtype=np.int64)
+        eligible = [[f] for f in range(families)]
+        draws = rng.random(rules)
+        for position in range(families, rules):
+            candidates = eligible[family[position]]
+            chosen = candidates[int(draws[position] * len(candidates))]
+            parent[position] = chosen
+            depth[position] = depth[chosen] + 1
+            if depth[position] < chain_depth:
+                candidates.append(position)
+        self.parent = parent
+        self.depth = depth
+
+        chains = [None] * rules
+        for position in range(rules):
+            own = str(position + 1)
+            chains[position] = own if parent[position] < 0 else f"{chains[parent[position]]} -> {own}"
+        self.chains = chains
+
+        self.country_names = (KNOWN_COUNTRIES + [f"Country {i:03d}" for i in range(countries)])[:max(countries, 1)]
+        k = max(1, min(jurisdictions_per_rule, len(self.country_names)))
+        jurisdictions = rng.integers(0, len(self.country_names), (rules, k))
+        jurisdictions[:, 0] = rng.integers(0, len(self.country_names), families)[family]
+        self.jurisdictions = jurisdictions
+
+        matter_codes = list(MATTER_TYPE_NAMES)
+        matter_types = rng.integers(0, len(matter_codes), (rules, 2))
+        matter_types[:, 0] = rng.integers(0, len(matter_codes), families)[family]
+        # Most rules have a single matter type
+        single = rng.random(rules) < 0.7
+        matter_types[single, 1] = matter_types[single, 0]
+        self.matter_types = matter_types
+
+        self.rule_type = rng.choice(list(RULE_TYPES), rules, p=[0.6, 0.4])
+        self.outcomes = [f"{word} #{rule_id}" for word, rule_id in
+                         zip(rng.choice(OUTCOME_WORDS, rules), self.ids)]
+        self.output_type = rng.choice(OUTPUT_TYPES, rules)
+        self.due_date = rng.choice(np.array(FORMULAS, dtype=object), rules)
+        self.final_due_date = rng.choice(np.array(FORMULAS, dtype=object), rules)
+        self.modified_on = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 600 * 24 * 60, rules),
+                                                                        unit='min')
+        self.release_version = rng.choice(['24.1', '24.2', '24.3', '25.1'], rules)
+        self.version_type = rng.choice(['New', 'Minor', 'Major'], rules)
+        self.version_notes = rng.choice(np.array(['Initial version', 'Updated deadline calculation', None],
+                                                 dtype=object), rules)
+        self.activities = [f"{verb} {noun} {rule_id}" for verb, noun, rule_id in
+                           zip(rng.choice(ACTIVITY_VERBS, rules), rng.choice(ACTIVITY_OBJECTS, rules), self.ids)]
+
+    def _parent_values(self, values):
+        values = np.asarray(values, dtype=object)
+        result = np.full(self.rules, None, dtype=object)
+        has_parent = self.parent >= 0
+        result[has_parent] = values[self.parent[has_parent]]
+        return result
+
+    def tables(self):
+        # Base tables as read by RuleGraphEngine, the rule mirror and the SQL reports
+        country_ids = np.arange(1, len(self.country_names) + 1)
+        matter_ids = np.array(list(MATTER_TYPE_NAMES), dtype=object)
+        child = self.parent >= 0
+        return {
+            'tblRuleDefination': pd.DataFrame({
+                'ID': self.ids,
+                'ProdId': self.ids + 100000,
+                'Activity': self.activities,
+                'RuleType': self.rule_type,
+                'Jurisdiction': _join_rows(self.jurisdictions, [str(i) for i in country_ids], ','),
+                'MatterType': _join_rows(self.matter_types, matter_ids, ','),
+                'Active': 1,
+                'versionType': self.version_type,
+                'CalcCode': self.due_date,
+                'versionNotes': self.version_notes,
+                'releaseVersion': self.release_version,
+                'Reference': [f"REF-{rule_id}" for rule_id in self.ids],
+                'ModifiedOn': self.modified_on,
+            }),
+            'tblOutcomes': pd.DataFrame({'Rule': self.ids, 'Label': self.outcomes}),
+            'tblConditions': pd.DataFrame({'Rule': self.ids[child],
+                                           'Value': self._parent_values(self.outcomes)[child]}),
+            'tblCountryMaster': pd.DataFrame({'ID': country_ids, 'Name': self.country_names, 'isDirtyFlag': 0}),
+            'tblMatterTypeMaster': pd.DataFrame({'ID': [int(code) for code in MATTER_TYPE_NAMES],
+                                                 'MaterType': list(MATTER_TYPE_NAMES.values()), 'isDirtyFlag': 0}),
+            'tblRuleTypeMaster': pd.DataFrame({'ID': list(RULE_TYPES), 'RuleType': list(RULE_TYPES.values())}),
+        }
+
+    def hierarchy_frame(self):
+        # Shaped like the output of EXEC dbo.RuleHierarchyReport, one row per rule
+        rule_names = np.array(self.activities, dtype=object)
+        df = pd.DataFrame({
+            'FamilyReference': [f"RF-{family + 1:05d}" for family in self.family],
+            'RuleID': self.ids,
+            'ChainPath': self.chains,
+            'Level': self.depth,
+            'RuleType': pd.Series(self.rule_type).map(RULE_TYPES).to_numpy(),
+            'RuleName': rule_names,
+            'MatterType': _join_rows(self.matter_types, list(MATTER_TYPE_NAMES.values())),
+            'Jurisdictions': _join_rows(self.jurisdictions, self.country_names),
+            'TriggeredBy': self._parent_values(rule_names),
+            'TriggerCondition': self._parent_values(self.outcomes),
+            'Output Type': self.output_type,
+            'Outcome': self.outcomes,
+            'DueDate': self.due_date,
+            'FinalDueDate': self.final_due_date,
+        })
+        return df.sort_values(['FamilyReference', 'Level'], kind='stable', ignore_index=True)[HIERARCHY_COLUMNS]
+
+    def release_notes_frame(self):
+        # Shaped like query_handler.get_release_notes_data
+        tables = self.tables()
+        rules = tables['tblRuleDefination']
+        df = pd.DataFrame({
+            'ID': rules['ID'],
+            'ProdId': rules['ProdId'],
+            'Activity': rules['Activity'],
+            'Rule Type': rules['RuleType'].map(RULE_TYPES),
+            'Matter Type': _join_rows(self.matter_types, list(MATTER_TYPE_NAMES.values())),
+            'Country': _join_rows(self.jurisdictions, self.country_names),
+            'versionType': rules['versionType'],
+            'CalcCode': rules['CalcCode'],
+            'versionNotes': rules['versionNotes'],
+            'releaseVersion': rules['releaseVersion'],
+            'Reference': rules['Reference'],
+            'ModifiedOn': rules['ModifiedOn'],
+        })
+        df = df.sort_values('ModifiedOn', ascending=False, ignore_index=True)
+        return df[list(RELEASE_NOTES_COLUMNS)].rename(columns=RELEASE_NOTES_COLUMNS)
+
+    def rule_options_frame(self):
+        # Shaped like query_handler.get_rule_options: one row per rule and outcome label
+        return pd.DataFrame({
+            'ID': self.ids,
+            'Activity': self.activities,
+            'DisplayName': [f"[{rule_id}] {activity}" for rule_id, activity in zip(self.ids, self.activities)],
+            'Outcome': self.outcomes,
+        })
+
+    def write_calendars(self, directory, holidays_per_year=12, years=range(2020, 2031), seed=0):
+        # A business_calendars directory with one random holiday table per country
+        os.makedirs(directory, exist_ok=True)
+        rng = np.random.default_rng(seed)
+        codes = [f"CAL{i:03d}" for i in range(len(self.country_names))]
+        pd.DataFrame({'Jurisdiction': self.country_names, 'Calendar': codes, 'Weekmask': 'Mon Tue Wed Thu Fri'}) \
+            .to_csv(os.path.join(directory, 'jurisdictions.csv'), index=False)
+        for code in codes:
+            days = np.concatenate([np.datetime64(f"{year}-01-01") + rng.choice(365, holidays_per_year, replace=False)
+                                   for year in years])
+            pd.DataFrame({'Date': np.sort(days), 'Name': 'Holiday'}) \
+                .to_csv(os.path.join(directory, f"{code}.csv"), index=False)
+        return directory
+
+    def write_sqlite(self, path):
+        # Base tables plus a RuleHierarchyReport table standing in for the stored procedure;
+        # point hierarchy_cache.query at "SELECT * FROM RuleHierarchyReport" to use it
+        conn = sqlite3.connect(path)
+        try:
+            for name, df in self.tables().items():
+                df.to_sql(name, conn, if_exists='replace', index=False)
+            self.hierarchy_frame().to_sql('RuleHierarchyReport', conn, if_exists='replace', index=False)
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rules_modified ON tblRuleDefination (ModifiedOn)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_outcomes_rule ON tblOutcomes ([Rule])')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_conditions_rule ON tblConditions ([Rule])')
+            conn.commit()
+        finally:
+            conn.close()
+        return path
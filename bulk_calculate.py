@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from due_dates import ISSUES_COLUMN, add_calculated_dates
+
+# Accepted spellings of the upload headers, compared lower-case without spaces/underscores
+INPUT_ALIASES = {
+    'MatterRef': ('matterref', 'matter', 'matterreference', 'reference'),
+    'RuleID': ('ruleid', 'rule', 'id'),
+    'TriggerDate': ('triggerdate', 'trigger', 'date', 'basedate'),
+}
+OUTPUT_COLUMNS = [
+    'MatterRef', 'InputRuleID', 'TriggerDate', 'FamilyReference', 'RuleID', 'RuleType',
+    'RuleName', 'Output Type', 'Outcome', 'Calculated_Due_Date', 'Calculated_Final_Due_Date',
+    ISSUES_COLUMN,
+]
+
+
+def read_bulk_input(file, filename):
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        raw = pd.read_excel(file, dtype=str, engine='openpyxl')
+    else:
+        raw = pd.read_csv(file, dtype=str)
+
+    normalized = {c: str(c).lower().replace(' ', '').replace('_', '') for c in raw.columns}
+    renames = {}
+    for target, aliases in INPUT_ALIASES.items():
+        for column, key in normalized.items():
+            if key in aliases and column not in renames:
+                renames[column] = target
+                break
+    missing = set(INPUT_ALIASES) - set(renames.values())
+    if missing:
+        raise ValueError(f"Upload is missing column(s): {', '.join(sorted(missing))}")
+
+    requests_df = raw.rename(columns=renames)[list(INPUT_ALIASES)]
+    # Accept both "12" and the "[12] Activity" display names from the rule selector
+    requests_df['RuleID'] = requests_df['RuleID'].astype(str).str.extract(r'^\s*\[?\s*(\d+)', expand=False)
+    requests_df['TriggerDate'] = pd.to_datetime(requests_df['TriggerDate'], errors='coerce')
+    return requests_df.reset_index(drop=True)
+
+
+def _group_positions(codes, n_groups):
+    # Positions of every group as one array plus [start, end) bounds per group code
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind='stable')]
+    counts = np.bincount(codes[valid], minlength=n_groups)
+    ends = np.cumsum(counts)
+    return order, ends - counts, ends
+
+
+def calculate_bulk(hierarchy_df, family_index, requests_df, calendars=None):
+    family_codes = family_index.family_codes
+    family_order, family_starts, family_ends = _group_positions(family_codes, len(family_index.references))
+
+    rule_codes, rule_ids = pd.factorize(requests_df['RuleID'])
+    request_order, request_starts, request_ends = _group_positions(rule_codes, len(rule_ids))
+
+    request_parts = []
+    hierarchy_parts = []
+    unmatched = [np.flatnonzero(rule_codes < 0)]
+    for code, rule_id in enumerate(rule_ids):
+        requests_for_rule = request_order[request_starts[code]:request_ends[code]]
+        families = family_index.codes_for_rule_id(rule_id)
+        if not len(families):
+            unmatched.append(requests_for_rule)
+            continue
+        rows = np.concatenate([family_order[family_starts[f]:family_ends[f]] for f in families])
+        request_parts.append(np.repeat(requests_for_rule, len(rows)))
+        hierarchy_parts.append(np.tile(rows, len(requests_for_rule)))
+
+    request_pos = np.concatenate(request_parts) if request_parts else np.empty(0, dtype=np.int64)
+    hierarchy_pos = np.concatenate(hierarchy_parts) if hierarchy_parts else np.empty(0, dtype=np.int64)
+    # Keep the output in upload order
+    by_request = np.argsort(request_pos, kind='stable')
+    request_pos = request_pos[by_request]
+    hierarchy_pos = hierarchy_pos[by_request]
+
+    result = hierarchy_df.iloc[hierarchy_pos].reset_index(drop=True)
+    result.insert(0, 'MatterRef', requests_df['MatterRef'].to_numpy()[request_pos])
+    result.insert(1, 'InputRuleID', requests_df['RuleID'].to_numpy()[request_pos])
+    result.insert(2, 'TriggerDate', requests_df['TriggerDate'].to_numpy()[request_pos])
+    result = add_calculated_dates(result, result['TriggerDate'], calendars=calendars)
+    missing_trigger = result['TriggerDate'].isna()
+    issues = result.loc[missing_trigger, ISSUES_COLUMN]
+    result.loc[missing_trigger, ISSUES_COLUMN] = (issues + '; ').fillna('') + 'Invalid or missing trigger date'
+
+    unmatched = np.sort(np.concatenate(unmatched))
+    if len(unmatched):
+        not_found = requests_df.iloc[unmatched].rename(columns={'RuleID': 'InputRuleID'})
+        not_found[ISSUES_COLUMN] = 'Rule not found in hierarchy'
+        result = pd.concat([result, not_found], ignore_index=True)
+        # Unmatched requests go back to their upload position
+        by_upload = np.argsort(np.concatenate([request_pos, unmatched]), kind='stable')
+        result = result.iloc[by_upload].reset_index(drop=True)
+        # Unmatched rows would otherwise turn integer ID columns into floats
+        for column in hierarchy_df.columns:
+            if pd.api.types.is_integer_dtype(hierarchy_df[column]):
+                result[column] = result[column].astype('Int64')
+
+    return result.reindex(columns=OUTPUT_COLUMNS)
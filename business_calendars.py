@@ -0,0 +1,141 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_DIR = os.environ.get('BUSINESS_CALENDAR_DIR',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calendars'))
+# Jurisdiction,Calendar,Weekmask; holidays for each calendar are in <Calendar>.csv (Date,Name)
+JURISDICTIONS_FILE = 'jurisdictions.csv'
+DEFAULT_WEEKMASK = 'Mon Tue Wed Thu Fri'
+# Code 0: weekends only, for jurisdictions without a holiday table or rows spanning several calendars
+DEFAULT_CALENDAR = 'Weekdays'
+# Due dates on a closed day move to the next business day
+ROLLOVER = os.environ.get('DUE_DATE_ROLLOVER', '1') != '0'
+
+
+class BusinessCalendars:
+    # One precomputed np.busdaycalendar per office; rows are mapped to integer calendar
+    # codes and every offset runs once per calendar over all of its rows
+    def __init__(self, directory=CALENDAR_DIR):
+        self.directory = directory
+        self.names = [DEFAULT_CALENDAR]
+        self.calendars = [np.busdaycalendar(weekmask=DEFAULT_WEEKMASK)]
+        self.holidays = [pd.DataFrame(columns=['Date', 'Name'])]
+        # Listed in jurisdictions.csv but without a readable holiday file
+        self.missing = []
+        self._by_jurisdiction = {}
+
+        path = os.path.join(directory, JURISDICTIONS_FILE)
+        mapping = pd.read_csv(path, dtype=str).fillna('') if os.path.exists(path) else pd.DataFrame(
+            columns=['Jurisdiction', 'Calendar', 'Weekmask'])
+        codes = {}
+        for row in mapping.itertuples(index=False):
+            name = row.Calendar.strip()
+            if name not in codes and name not in self.missing:
+                holidays = self._read_holidays(name)
+                if holidays is None:
+                    self.missing.append(name)
+                    continue
+                codes[name] = len(self.names)
+                self.names.append(name)
+                self.holidays.append(holidays)
+                self.calendars.append(np.busdaycalendar(
+                    weekmask=row.Weekmask.strip() or DEFAULT_WEEKMASK,
+                    holidays=holidays['Date'].to_numpy().astype('datetime64[D]')))
+            if name in codes:
+                self._by_jurisdiction[row.Jurisdiction.strip().lower()] = codes[name]
+
+    def _read_holidays(self, name):
+        path = os.path.join(self.directory, f"{name}.csv")
+        try:
+            holidays = pd.read_csv(path, dtype=str)
+        except (OSError, ValueError):
+            return None
+        holidays['Date'] = pd.to_datetime(holidays['Date'], errors='coerce')
+        return holidays.dropna(subset=['Date']).sort_values('Date', ignore_index=True)
+
+    def code_for(self, jurisdiction):
+        return self._by_jurisdiction.get(str(jurisdiction).strip().lower(), 0)
+
+    def _code_for_joined(self, value):
+        # "United States, WIPO": one calendar only if every listed office shares it
+        if not isinstance(value, str) or not value.strip():
+            return 0
+        if value.strip().lower() in self._by_jurisdiction:
+            return self.code_for(value)
+        codes = {self.code_for(name) for name in value.split(',') if name.strip()}
+        return codes.pop() if len(codes) == 1 else 0
+
+    def codes(self, length, jurisdictions=None, selected=None):
+        # Calendar code per row: the selected jurisdiction, else each row's own Jurisdictions
+        if selected and selected != 'All':
+            return np.full(length, self.code_for(selected), dtype=np.int64)
+        if jurisdictions is None:
+            return np.zeros(length, dtype=np.int64)
+        value_codes, values = pd.factorize(pd.Series(jurisdictions))
+        lookup = np.array([self._code_for_joined(value) for value in values] + [0], dtype=np.int64)
+        return lookup[value_codes]
+
+    def _each_calendar(self, codes):
+        # Row positions per calendar from one sort, rather than a mask per calendar
+        if not len(codes):
+            return
+        order = np.argsort(codes, kind='stable')
+        for rows in np.split(order, np.flatnonzero(np.diff(codes[order])) + 1):
+            yield self.calendars[codes[rows[0]]], rows
+
+    def offset(self, dates, busdays, codes):
+        # dates: datetime64[D]; start days that are closed roll forward (backward when subtracting)
+        result = np.empty_like(dates)
+        for calendar, rows in self._each_calendar(codes):
+            for roll, part in (('forward', rows[busdays[rows] >= 0]), ('backward', rows[busdays[rows] < 0])):
+                if len(part):
+                    result[part] = np.busday_offset(dates[part], busdays[part], roll=roll, busdaycal=calendar)
+        return result
+
+    def roll_forward(self, dates, codes):
+        result = np.empty_like(dates)
+        for calendar, rows in self._each_calendar(codes):
+            result[rows] = np.busday_offset(dates[rows], 0, roll='forward', busdaycal=calendar)
+        return result
+
+    def summary(self):
+        return pd.DataFrame({
+            'Calendar': self.names,
+            'Holidays': [len(holidays) for holidays in self.holidays],
+            'Through': [holidays['Date'].max().date() if len(holidays) else None for holidays in self.holidays],
+        })
+
+
+def describe_calendars(calendars):
+    loaded = [f"{name} (through {holidays['Date'].max():%Y-%m-%d})" if len(holidays) else name
+              for name, holidays in zip(calendars.names[1:], calendars.holidays[1:])]
+    text = f"Business days: {', '.join(loaded)} holidays; weekends only elsewhere." if loaded \
+        else "Business days: weekends only, no holiday tables found."
+    if calendars.missing:
+        text += f" No holiday table for {', '.join(calendars.missing)}."
+    return text
+
+
+_calendars = {}
+_calendars_lock = threading.Lock()
+
+
+def _stamp(directory):
+    # Edited or added holiday files are picked up on the next calculation
+    try:
+        return tuple(sorted((entry.name, entry.stat().st_mtime) for entry in os.scandir(directory)
+                            if entry.name.endswith('.csv')))
+    except OSError:
+        return ()
+
+
+def get_calendars(directory=CALENDAR_DIR):
+    stamp = _stamp(directory)
+    with _calendars_lock:
+        cached = _calendars.get(directory)
+        if cached is None or cached[0] != stamp:
+            cached = _calendars[directory] = (stamp, BusinessCalendars(directory))
+        return cached[1]
@@ -0,0 +1,158 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+COMPACT_ENABLED = os.environ.get('RULE_HIERARCHY_COMPACT', '1') != '0'
+CHAIN_COLUMN = 'ChainPath'
+CHAIN_SEPARATOR = ' -> '
+ID_COLUMNS = ('RuleID', 'Level')
+# Text columns with at most this share of distinct values become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+class ChainArray:
+    # Every chain path as a run of rule IDs in one shared int32 array;
+    # row i's chain is values[offsets[i]:offsets[i + 1]]
+    def __init__(self, offsets, values):
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_strings(cls, paths):
+        # None when a chain holds anything but integer IDs; callers keep the text column then
+        paths = ['' if not isinstance(path, str) else path for path in paths]
+        lengths = np.array([path.count('->') + 1 if path.strip() else 0 for path in paths], dtype=np.int64)
+        try:
+            values = np.array(' '.join(paths).replace('->', ' ').split(), dtype=np.int64)
+        except ValueError:
+            return None
+        if len(values) != lengths.sum() or (len(values) and np.abs(values).max() > np.iinfo(np.int32).max):
+            return None
+        offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(offsets, values.astype(np.int32))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.values.nbytes
+
+    def token_rows(self):
+        # Row position of every entry in values
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def strings(self, positions=None):
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions, dtype=np.int64)
+        starts = self.offsets[positions]
+        lengths = self.offsets[positions + 1] - starts
+        # Only the tokens of the requested rows are turned into text
+        out = np.zeros(len(positions) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=out[1:])
+        flat = np.arange(out[-1]) - np.repeat(out[:-1] - starts, lengths)
+        text = self.values[flat].astype(str).tolist()
+        return [CHAIN_SEPARATOR.join(text[start:end]) for start, end in zip(out[:-1].tolist(), out[1:].tolist())]
+
+
+def _int32(values):
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iu':
+        if len(values) == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max):
+            return values.astype(np.int32)
+    return values
+
+
+class CompactHierarchy:
+    # RuleHierarchyReport rows with categorical text columns, int32 IDs and ChainPath as a
+    # ChainArray. frame has every column except ChainPath; view() rebuilds the original columns
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self.index = df.index
+        self.chains = ChainArray.from_strings(df[CHAIN_COLUMN].to_numpy()) if CHAIN_COLUMN in df else None
+
+        frame = {}
+        for column in df.columns:
+            values = df[column]
+            if column == CHAIN_COLUMN and self.chains is not None:
+                continue
+            if column in ID_COLUMNS:
+                values = _int32(values)
+            elif values.dtype == object and column != CHAIN_COLUMN:
+                codes, uniques = pd.factorize(values)
+                if len(uniques) <= CATEGORY_MAX_RATIO * max(len(values), 1):
+                    values = pd.Series(pd.Categorical.from_codes(codes, categories=uniques), index=values.index)
+            frame[column] = values
+        self.frame = pd.DataFrame(frame, index=df.index)
+
+    def view(self, rows=None, columns=None):
+        # rows: index labels, a boolean mask or None for all rows
+        if rows is None:
+            positions = np.arange(len(self.frame))
+        elif isinstance(rows, (pd.Series, np.ndarray)) and rows.dtype == bool:
+            positions = np.flatnonzero(np.asarray(rows))
+        else:
+            positions = self.index.get_indexer(rows)
+        columns = self.columns if columns is None else [column for column in columns if column in self.columns]
+
+        view = {}
+        for column in columns:
+            if column == CHAIN_COLUMN and self.chains is not None:
+                view[column] = self.chains.strings(positions)
+                continue
+            values = self.frame[column].iloc[positions]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(object)
+            view[column] = values.to_numpy()
+        return pd.DataFrame(view, index=self.index[positions], columns=columns)
+
+    def nbytes(self):
+        chain_bytes = self.chains.nbytes if self.chains is not None else 0
+        return int(self.frame.memory_usage(index=False, deep=True).sum()) + chain_bytes
+
+
+def expand_categories(df):
+    # Categorical columns back to plain object columns, e.g. for rows taken straight from a compact frame
+    categorical = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if not categorical:
+        return df
+    return df.astype({column: object for column in categorical})
+
+
+def _object_bytes(values):
+    # Deep size the column would have as the object-dtype strings the driver returns: a
+    # pointer and a string object per row, NULLs pointing at the shared None
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        return values.memory_usage(index=False, deep=True)
+    sizes = np.append([sys.getsizeof(value) for value in values.cat.categories], 0)
+    return 8 * len(values) + int(sizes[values.cat.codes.to_numpy()].sum())
+
+
+def memory_report(df, compact):
+    # Before is the frame as plain pandas would load it, even if it was fetched as categoricals
+    before = {column: _object_bytes(df[column]) for column in df.columns}
+    after = compact.frame.memory_usage(index=False, deep=True)
+    if compact.chains is not None:
+        after[CHAIN_COLUMN] = compact.chains.nbytes
+    report = pd.DataFrame({
+        'Column': compact.columns,
+        'Before MB': [before[column] / 2**20 for column in compact.columns],
+        'After MB': [after.get(column, 0) / 2**20 for column in compact.columns],
+        'dtype': [str(compact.frame[column].dtype) if column in compact.frame else 'chain offsets'
+                  for column in compact.columns],
+    })
+    return _with_total(report)
+
+
+def _with_total(report):
+    total = pd.DataFrame([{'Column': 'Total', 'Before MB': report['Before MB'].sum(),
+                           'After MB': report['After MB'].sum(), 'dtype': ''}])
+    return pd.concat([report, total], ignore_index=True).round({'Before MB': 2, 'After MB': 2})
+
+
+def add_index_memory(report, name, nbytes):
+    # A derived index is built for compact and plain snapshots alike, so it counts on both sides
+    row = pd.DataFrame([{'Column': name, 'Before MB': nbytes / 2**20, 'After MB': nbytes / 2**20,
+                         'dtype': 'index'}])
+    return _with_total(pd.concat([report.iloc[:-1], row], ignore_index=True))
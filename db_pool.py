@@ -0,0 +1,208 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 4))
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))
+DEFAULT_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800))
+DEFAULT_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 30))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _PoolEntry:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.statements = {}
+
+    def close(self):
+        for cursor in self.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.statements.clear()
+        self.conn.close()
+
+
+class ConnectionPool:
+    def __init__(self, factory, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_lifetime=DEFAULT_MAX_LIFETIME, checkout_timeout=DEFAULT_CHECKOUT_TIMEOUT,
+                 health_query="SELECT 1", validate_after=0.0):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.checkout_timeout = checkout_timeout
+        self.health_query = health_query
+        self.validate_after = validate_after
+        self._cond = threading.Condition()
+        self._idle = []
+        self._in_use = {}
+        self._size = 0
+        self._closed = False
+        self.created_count = 0
+        self.recycled_count = 0
+
+    def _expired(self, entry, now):
+        return (now - entry.last_used > self.idle_timeout
+                or now - entry.created > self.max_lifetime)
+
+    def _healthy(self, entry):
+        if time.monotonic() - entry.last_used < self.validate_after:
+            return True
+        try:
+            cursor = entry.conn.cursor()
+            try:
+                cursor.execute(self.health_query).fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, entry):
+        try:
+            entry.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self.recycled_count += 1
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = None
+            create = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed")
+                now = time.monotonic()
+                if self._idle:
+                    entry = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No connection available within {timeout}s")
+                    self._cond.wait(remaining)
+                    continue
+
+            if create:
+                try:
+                    entry = _PoolEntry(self.factory())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.created_count += 1
+            elif self._expired(entry, now) or not self._healthy(entry):
+                self._discard(entry)
+                continue
+
+            with self._cond:
+                self._in_use[id(entry.conn)] = entry
+            return entry.conn
+
+    def statement_cache(self, conn):
+        with self._cond:
+            entry = self._in_use.get(id(conn))
+        return entry.statements if entry is not None else None
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            entry = self._in_use.pop(id(conn), None)
+        if entry is None:
+            return
+        now = time.monotonic()
+        if discard or self._closed or now - entry.created > self.max_lifetime:
+            self._discard(entry)
+            return
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.release(conn, discard=broken)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for entry in idle:
+            self._discard(entry)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'max_size': self.max_size,
+                'created': self.created_count,
+                'recycled': self.recycled_count,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_key(username, password, database):
+    # Keep plain passwords out of the registry keys
+    secret = hashlib.sha256(f"{username}\0{password}".encode('utf-8')).hexdigest()
+    return (username, secret, database)
+
+
+def get_pool(username, password, database, factory, **kwargs):
+    key = _pool_key(username, password, database)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(factory, **kwargs)
+        return pool
+
+
+def statement_cache(conn):
+    # Prepared cursors of a checked-out pooled connection, None for unpooled connections
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        cache = pool.statement_cache(conn)
+        if cache is not None:
+            return cache
+    return None
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,170 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from business_calendars import ROLLOVER
+
+DATE_COLUMNS = {
+    'DueDate': 'Calculated_Due_Date',
+    'FinalDueDate': 'Calculated_Final_Due_Date',
+}
+ISSUES_COLUMN = 'Date_Calculation_Issues'
+
+UNIT_MONTHS = {'month': 1, 'year': 12}
+UNIT_DAYS = {'day': 1, 'week': 7}
+UNIT_BUSDAYS = {'business day': 1, 'working day': 1}
+
+# "add 2 months", "add 1 year and 6 months", "add 1 month + 10 days", "add 4 months - 1 day",
+# "subtract 3 days", "add 10 business days", "add 2 month(s)"
+TERM_PATTERN = re.compile(r'(\d+)\s*((?:business|working)\s+)?([a-z]+)\b(?:\(s\))?')
+SIGN_WORDS = {'add': 1, 'plus': 1, '+': 1, 'subtract': -1, 'minus': -1, 'less': -1, '-': -1}
+# Join terms and keep the sign in force: "subtract 1 month and 2 days" subtracts both
+JOIN_WORDS = ('and', ',')
+# Alternatives the calculator can't choose between: "30 days or 2 months whichever later"
+AMBIGUOUS_WORDS = ('or', 'whichever')
+TOKEN_PATTERN = re.compile(r'\s*(?:(?P<term>' + TERM_PATTERN.pattern + r')|(?P<word>[a-z]+|[+,-])|(?P<other>\S+))')
+
+
+class CompiledFormula:
+    __slots__ = ('terms', 'steps', 'error')
+
+    def __init__(self, terms=(), error=None):
+        self.terms = tuple(terms)
+        # Terms apply in written order; neighbouring terms of the same kind are merged
+        steps = []
+        for count, unit in self.terms:
+            if unit in UNIT_MONTHS:
+                step = ('months', count * UNIT_MONTHS[unit])
+            elif unit in UNIT_DAYS:
+                step = ('days', count * UNIT_DAYS[unit])
+            else:
+                step = ('busdays', count * UNIT_BUSDAYS[unit])
+            if steps and steps[-1][0] == step[0]:
+                steps[-1] = (step[0], steps[-1][1] + step[1])
+            else:
+                steps.append(step)
+        self.steps = tuple(steps)
+        self.error = error
+
+    @property
+    def valid(self):
+        return self.error is None
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(formula):
+    # Text before the first term and after the last is ignored ("add 30 days after grant.");
+    # a stray number, text between terms or an alternative ("add 1.5 months", "30 days or
+    # 2 months whichever later") means a rule this calculator can't express
+    text = formula.strip().lower()
+    terms = []
+    sign = 1
+    skipped = None
+    for token in TOKEN_PATTERN.finditer(text):
+        word = token['word'] or token['other']
+        if token['term']:
+            if terms and skipped:
+                return CompiledFormula(error=f"unexpected '{skipped}' in '{formula}'")
+            count, qualifier, unit = TERM_PATTERN.fullmatch(token['term']).groups()
+            unit = unit.rstrip('s')
+            if qualifier:
+                unit = f"{qualifier.strip()} {unit}"
+            if unit not in UNIT_MONTHS and unit not in UNIT_DAYS and unit not in UNIT_BUSDAYS:
+                return CompiledFormula(error=f"unsupported unit '{unit}' in '{formula}'")
+            terms.append((sign * int(count), unit))
+            skipped = None
+        elif word in SIGN_WORDS:
+            sign = SIGN_WORDS[word]
+        elif word in AMBIGUOUS_WORDS or any(ch.isdigit() for ch in word):
+            return CompiledFormula(error=f"unexpected '{word}' in '{formula}'")
+        elif word not in JOIN_WORDS:
+            skipped = skipped or word
+    if not terms:
+        return CompiledFormula(error=f"unrecognised formula '{formula}'")
+    return CompiledFormula(terms)
+
+
+def add_months(dates, months):
+    # dates: datetime64[D] array; the day of month is clamped to the target month's length
+    month_start = dates.astype('datetime64[M]')
+    day_offset = (dates - month_start.astype('datetime64[D]')).astype(np.int64)
+    target = month_start + months.astype('timedelta64[M]')
+    month_length = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day_offset, month_length - 1).astype('timedelta64[D]')
+
+
+def _trigger_array(trigger_dates, length):
+    if np.ndim(trigger_dates) == 0:
+        trigger = np.datetime64(pd.Timestamp(trigger_dates).date(), 'D')
+        return np.full(length, trigger, dtype='datetime64[D]')
+    return pd.to_datetime(pd.Series(trigger_dates)).to_numpy().astype('datetime64[D]')
+
+
+def compute_due_dates(trigger_dates, formulas, calendars=None, calendar_codes=None):
+    # calendars: BusinessCalendars with a calendar code per row; without them business days
+    # skip weekends only and dates are not rolled
+    formulas = pd.Series(formulas)
+    codes, uniques = pd.factorize(formulas)
+    compiled = [compile_formula(f) if isinstance(f, str) and f.strip() else None for f in uniques]
+
+    # One slot past the end stands in for missing formulas (code -1)
+    usable = [c if c is not None and c.valid else None for c in compiled] + [None]
+    width = max([len(c.steps) for c in usable if c is not None], default=0)
+    kinds_u = np.full((len(usable), width), '', dtype=object)
+    amounts_u = np.zeros((len(usable), width), dtype=np.int64)
+    for i, c in enumerate(usable):
+        for j, (kind, amount) in enumerate(c.steps if c is not None else ()):
+            kinds_u[i, j] = kind
+            amounts_u[i, j] = amount
+    valid_u = np.array([c is not None for c in usable])
+    errors_u = np.array([c.error if c is not None else None for c in compiled] + [None], dtype=object)
+
+    codes = np.where(codes < 0, len(compiled), codes)
+    trigger = _trigger_array(trigger_dates, len(formulas))
+    valid = valid_u[codes] & ~np.isnat(trigger)
+
+    result = np.full(len(formulas), np.datetime64('NaT'), dtype='datetime64[D]')
+    if valid.any():
+        shifted = trigger[valid]
+        row_codes = codes[valid]
+        row_calendars = calendar_codes[valid] if calendars is not None else None
+        for j in range(width):
+            kinds = kinds_u[row_codes, j]
+            amounts = amounts_u[row_codes, j]
+            step = kinds == 'months'
+            if step.any():
+                shifted[step] = add_months(shifted[step], amounts[step])
+            step = kinds == 'days'
+            if step.any():
+                shifted[step] = shifted[step] + amounts[step].astype('timedelta64[D]')
+            step = (kinds == 'busdays') & (amounts != 0)
+            if step.any() and calendars is not None:
+                shifted[step] = calendars.offset(shifted[step], amounts[step], row_calendars[step])
+            elif step.any():
+                shifted[step] = np.busday_offset(shifted[step], amounts[step], roll='forward')
+        if calendars is not None and ROLLOVER:
+            shifted = calendars.roll_forward(shifted, row_calendars)
+        result[valid] = shifted
+
+    dates = pd.Series(result.astype('datetime64[ns]'), index=formulas.index)
+    errors = pd.Series(errors_u[codes], index=formulas.index)
+    return dates, errors
+
+
+def add_calculated_dates(df, trigger_dates, columns=DATE_COLUMNS, calendars=None, jurisdiction=None):
+    # calendars: BusinessCalendars; each row uses the selected jurisdiction's calendar, else its own
+    calendar_codes = None
+    if calendars is not None:
+        jurisdictions = df['Jurisdictions'] if 'Jurisdictions' in df else None
+        calendar_codes = calendars.codes(len(df), jurisdictions, jurisdiction)
+    issues = pd.Series('', index=df.index, dtype=object)
+    for source, target in columns.items():
+        dates, errors = compute_due_dates(trigger_dates, df[source], calendars, calendar_codes)
+        df[target] = dates
+        has_error = errors.notna()
+        issues[has_error] = issues[has_error] + np.where(issues[has_error] == '', '', '; ') \
+            + source + ': ' + errors[has_error].astype(str)
+    df[ISSUES_COLUMN] = issues.where(issues != '')
+    return df
@@ -0,0 +1,104 @@
+import csv
+import os
+import tempfile
+
+from openpyxl import Workbook
+
+CHUNK_ROWS = int(os.environ.get('EXPORT_CHUNK_ROWS', 50000))
+EXPORT_DIR = os.environ.get('EXPORT_DIR') or None
+# Excel's row limit per sheet, header row included
+XLSX_MAX_ROWS = 1_048_576
+
+EXPORT_FORMATS = {
+    'Excel (XLSX)': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _plain_rows(chunk):
+    # openpyxl wants None for missing values and plain Python objects; tolist() converts a
+    # whole column at once and only columns with missing values are touched again
+    columns = []
+    for _, values in chunk.items():
+        missing = values.isna()
+        if missing.any():
+            columns.append(values.astype(object).where(~missing, None).tolist())
+        else:
+            columns.append(values.tolist())
+    return zip(*columns)
+
+
+def write_csv(df, path, chunk_rows=CHUNK_ROWS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(df.columns)
+        for chunk in iter_chunks(df, chunk_rows):
+            chunk.to_csv(f, header=False, index=False)
+
+
+def write_xlsx(df, path, chunk_rows=CHUNK_ROWS, sheet_title='Report', max_rows=XLSX_MAX_ROWS):
+    # write_only streams rows to disk instead of building the whole sheet in memory. Rows past
+    # a sheet's limit continue on "Report (2)", "Report (3)", ..., each with the header row
+    workbook = Workbook(write_only=True)
+    header = [str(column) for column in df.columns]
+    sheet_rows = max_rows - 1
+    for sheet_number, start in enumerate(range(0, max(len(df), 1), sheet_rows), start=1):
+        title = sheet_title if sheet_number == 1 else f"{sheet_title} ({sheet_number})"
+        sheet = workbook.create_sheet(title=title)
+        sheet.append(header)
+        for chunk in iter_chunks(df.iloc[start:start + sheet_rows], chunk_rows):
+            for row in _plain_rows(chunk):
+                sheet.append(row)
+    workbook.save(path)
+
+
+def write_parquet(df, path, chunk_rows=CHUNK_ROWS):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow installed")
+
+    # The schema comes from the whole frame: a chunk whose column is all None would type it
+    # as null and later chunks with values couldn't be written under that schema
+    schema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    for position, field in enumerate(schema):
+        values = df[field.name]
+        if values.dtype == object:
+            present = values.dropna().to_numpy()
+            schema = schema.set(position, field.with_type(
+                pa.infer_type(present) if len(present) else pa.string()))
+
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+WRITERS = {
+    'csv': write_csv,
+    'xlsx': write_xlsx,
+    'parquet': write_parquet,
+}
+
+
+def export_to_file(df, export_format, directory=EXPORT_DIR, chunk_rows=CHUNK_ROWS):
+    extension, _ = EXPORT_FORMATS[export_format]
+    fd, path = tempfile.mkstemp(suffix=f".{extension}", prefix='export_', dir=directory)
+    os.close(fd)
+    try:
+        WRITERS[extension](df, path, chunk_rows=chunk_rows)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def remove_export(path):
+    if path and os.path.exists(path):
+        os.remove(path)
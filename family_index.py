@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+EMPTY_CODES = np.empty(0, dtype=np.int32)
+
+
+def _group_codes(keys, codes):
+    pairs = pd.DataFrame({'key': keys, 'code': codes}).dropna().drop_duplicates()
+    key_codes, unique_keys = pd.factorize(pairs['key'])
+    pair_codes = pairs['code'].to_numpy(dtype=np.int32)
+    # One sort by (key, code), then split at every key boundary
+    order = np.lexsort((pair_codes, key_codes))
+    sorted_codes = pair_codes[order]
+    bounds = [0] + (np.flatnonzero(np.diff(key_codes[order])) + 1).tolist() + [len(order)]
+    return {key: sorted_codes[start:end] for key, start, end in zip(unique_keys.tolist(), bounds[:-1], bounds[1:])}
+
+
+class FamilyIndex:
+    # Reverse index from rule ID / rule name / outcome label to family codes,
+    # built once per hierarchy snapshot. chains: the snapshot's ChainArray, used instead
+    # of splitting ChainPath strings when the snapshot is compact
+    def __init__(self, df, chains=None):
+        codes, references = pd.factorize(df['FamilyReference'])
+        self.family_codes = codes.astype(np.int32)
+        self.references = np.asarray(references)
+
+        if chains is not None:
+            by_rule_id = _group_codes(chains.values, self.family_codes[chains.token_rows()])
+            self.by_rule_id = {str(rule_id): codes for rule_id, codes in by_rule_id.items()}
+        else:
+            chain = df['ChainPath'].fillna('').astype(str).str.split('->').explode().str.strip()
+            chain = chain[chain != '']
+            chain_codes = self.family_codes[df.index.get_indexer(chain.index)]
+            self.by_rule_id = _group_codes(chain.to_numpy(), chain_codes)
+
+        self.by_rule_name = _group_codes(df['RuleName'].to_numpy(), self.family_codes)
+
+        self.by_outcome = _group_codes(df['Outcome'].to_numpy(), self.family_codes)
+        self._outcome_labels = [(str(label).lower(), label) for label in self.by_outcome]
+
+    def codes_for_rule_id(self, rule_id):
+        return self.by_rule_id.get(str(rule_id).strip(), EMPTY_CODES)
+
+    def codes_for_rule_name(self, rule_name):
+        return self.by_rule_name.get(rule_name, EMPTY_CODES)
+
+    def codes_for_outcome(self, outcome):
+        # Case-insensitive substring match like str.contains, but only over distinct labels
+        needle = str(outcome).lower()
+        matches = [self.by_outcome[label] for lowered, label in self._outcome_labels if needle in lowered]
+        if not matches:
+            return EMPTY_CODES
+        return np.unique(np.concatenate(matches))
+
+    def references_for(self, codes):
+        return self.references[codes]
+
+    def mask_for(self, codes):
+        return np.isin(self.family_codes, codes)
+
+
+def build_family_index(df, chains=None):
+    return FamilyIndex(df, chains)
@@ -0,0 +1,189 @@
+import datetime
+import decimal
+import os
+
+import numpy as np
+import pandas as pd
+
+from compact_snapshot import CATEGORY_MAX_RATIO
+
+FAST_FETCH_ENABLED = os.environ.get('FAST_FETCH', '1') != '0'
+# Rows per cursor.fetchmany call; small enough that a batch's columns stay in cache
+FETCH_BATCH_SIZE = int(os.environ.get('FETCH_BATCH_SIZE', 2_000))
+# Rows per DataFrame yielded by fetch_chunks
+CHUNK_ROWS = int(os.environ.get('FETCH_CHUNK_ROWS', 100_000))
+
+TEXT = 'text'
+INTEGER = 'integer'
+FLOAT = 'float'
+DATETIME = 'datetime'
+OTHER = 'other'
+
+
+def _kind(type_code, values):
+    # pyodbc reports each column's Python type; sqlite3 doesn't, so the first value decides
+    if not isinstance(type_code, type):
+        type_code = next((type(value) for value in values if value is not None), None)
+    if type_code is None:
+        return None
+    if issubclass(type_code, str):
+        return TEXT
+    if issubclass(type_code, bool):
+        return OTHER
+    if issubclass(type_code, int):
+        return INTEGER
+    if issubclass(type_code, (float, decimal.Decimal)):
+        return FLOAT
+    if issubclass(type_code, datetime.datetime):
+        return DATETIME
+    return OTHER
+
+
+def _convert(values, kind, categorize):
+    # One column of one batch to a typed array; NULLs follow pd.read_sql (NaN, NaT, None)
+    try:
+        if kind == INTEGER:
+            try:
+                return np.array(values, dtype=np.int64)
+            except TypeError:
+                return np.array(values, dtype=np.float64)
+        if kind == FLOAT:
+            return np.array(values, dtype=np.float64)
+        if kind == DATETIME:
+            return pd.to_datetime(np.array(values, dtype=object)).to_numpy()
+    except (TypeError, ValueError, OverflowError):
+        # A value of another type in a loosely typed (sqlite) column
+        kind = OTHER
+    array = np.array(values, dtype=object)
+    if kind == TEXT and categorize:
+        # (codes, uniques) per batch; _combine merges them into one categorical
+        return pd.factorize(array)
+    if kind == TEXT:
+        return array
+    return pd.Series(array).infer_objects().to_numpy()
+
+
+def _categorical(pieces):
+    # One factorize over every batch's uniques maps the batch codes to shared categories
+    mapping, categories = pd.factorize(np.concatenate([np.asarray(uniques, dtype=object) for _, uniques in pieces]))
+    codes = []
+    start = 0
+    for batch_codes, uniques in pieces:
+        # NULLs are code -1 and stay -1
+        lookup = np.append(mapping[start:start + len(uniques)], -1)
+        codes.append(lookup[batch_codes])
+        start += len(uniques)
+    codes = np.concatenate(codes)
+    if len(categories) > CATEGORY_MAX_RATIO * max(len(codes), 1):
+        return np.append(np.asarray(categories, dtype=object), None)[codes]
+    return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories))
+
+
+def _combine(pieces):
+    if all(isinstance(piece, tuple) for piece in pieces):
+        return _categorical(pieces)
+    # Never expected, the builder converts a column's pieces alike; decode rather than lose values
+    pieces = [np.append(np.asarray(piece[1], dtype=object), None)[piece[0]] if isinstance(piece, tuple) else piece
+              for piece in pieces]
+    if len(pieces) == 1:
+        return pieces[0]
+    if all(isinstance(piece, np.ndarray) and piece.dtype == pieces[0].dtype for piece in pieces):
+        return np.concatenate(pieces)
+    return pd.concat([pd.Series(piece) for piece in pieces], ignore_index=True).infer_objects()
+
+
+class _ColumnBuilder:
+    # Typed column arrays built batch by batch straight from fetchmany rows, so the
+    # rows of only one batch are alive at a time
+    def __init__(self, description, categories):
+        self.columns = [column[0] for column in description]
+        self.type_codes = [column[1] for column in description]
+        self.categories = categories
+        self.kinds = [None] * len(self.columns)
+        # Text columns become categoricals only if the first batch shows repeated values
+        self.categorize = [False] * len(self.columns)
+        self.pieces = [[] for _ in self.columns]
+        self.rows = 0
+
+    def add(self, rows):
+        for position, values in enumerate(zip(*rows)):
+            kind = self.kinds[position]
+            if kind is None:
+                # Decided once, from the first batch with a value; until then the batches
+                # are all NULL and are converted to match once the kind is known
+                kind = self.kinds[position] = _kind(self.type_codes[position], values)
+                self.categorize[position] = bool(
+                    self.categories and kind == TEXT
+                    and len(set(values)) <= CATEGORY_MAX_RATIO * len(values))
+                if kind is not None:
+                    self.pieces[position] = [_convert(piece.tolist(), kind, self.categorize[position])
+                                             for piece in self.pieces[position]]
+            self.pieces[position].append(_convert(values, kind, self.categorize[position]))
+        self.rows += len(rows)
+
+    def frame(self):
+        if not self.rows:
+            return pd.DataFrame(columns=self.columns)
+        # One block per column: consolidating them into 2D blocks would copy every column again
+        df = pd.concat([pd.Series(_combine(pieces), name=column, copy=False)
+                        for column, pieces in zip(self.columns, self.pieces)], axis=1, copy=False)
+        self.pieces = [[] for _ in self.columns]
+        self.rows = 0
+        return df
+
+
+def cursor_frames(cursor, chunk_rows=None, categories=False, batch_size=FETCH_BATCH_SIZE):
+    # DataFrames of up to chunk_rows rows (all rows when None) from an executed cursor;
+    # always yields at least one frame, empty if the query returned no rows.
+    # categories: text columns with repeated values come back as categoricals
+    if cursor.description is None:
+        yield pd.DataFrame()
+        return
+    builder = _ColumnBuilder(cursor.description, categories)
+    yielded = False
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        builder.add(rows)
+        if chunk_rows and builder.rows >= chunk_rows:
+            yield builder.frame()
+            yielded = True
+    if builder.rows or not yielded:
+        yield builder.frame()
+
+
+def cursor_frame(cursor, categories=False, batch_size=FETCH_BATCH_SIZE):
+    return next(cursor_frames(cursor, categories=categories, batch_size=batch_size))
+
+
+def _execute(conn, sql, params, batch_size):
+    cursor = conn.cursor()
+    cursor.arraysize = batch_size
+    try:
+        if params is None:
+            cursor.execute(sql)
+        else:
+            cursor.execute(sql, list(params))
+    except Exception:
+        cursor.close()
+        raise
+    return cursor
+
+
+def fetch_frame(conn, sql, params=None, categories=False, batch_size=FETCH_BATCH_SIZE):
+    # pd.read_sql for a raw DB-API connection (pyodbc, sqlite3) without the row-tuple detour
+    cursor = _execute(conn, sql, params, batch_size)
+    try:
+        return cursor_frame(cursor, categories=categories, batch_size=batch_size)
+    finally:
+        cursor.close()
+
+
+def fetch_chunks(conn, sql, params=None, chunk_rows=CHUNK_ROWS, categories=False, batch_size=FETCH_BATCH_SIZE):
+    # Streams the result as DataFrames of chunk_rows rows; categories are per chunk
+    cursor = _execute(conn, sql, params, batch_size)
+    try:
+        yield from cursor_frames(cursor, chunk_rows=chunk_rows, categories=categories, batch_size=batch_size)
+    finally:
+        cursor.close()
@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from compact_snapshot import CHAIN_COLUMN, ChainArray
+from instrumentation import stage
+from query_handler import get_rule_set_version
+from rule_graph import RuleGraphEngine
+
+_impacts = {}
+_impacts_lock = threading.Lock()
+# Engines are updated in place, one update at a time
+_update_lock = threading.Lock()
+
+
+def _ranges(starts, ends):
+    # Positions start..end-1 of every range, concatenated, with the range each came from
+    lengths = ends - starts
+    owners = np.repeat(np.arange(len(starts)), lengths)
+    bounds = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=bounds[1:])
+    return np.arange(bounds[-1]) - np.repeat(bounds[:-1] - starts, lengths), owners
+
+
+class ImpactIndex:
+    # Descendant closure of the ValidConnections graph as enumerated in the family chains:
+    # every rule maps to each chain it appears in and its position there, so the chains below
+    # a set of changed rules are found with a few sorted lookups, whatever their depth
+    def __init__(self, df, chains=None):
+        if chains is None:
+            chains = ChainArray.from_strings(df[CHAIN_COLUMN].to_numpy())
+        if chains is None:
+            raise ValueError("ChainPath holds non-numeric rule IDs")
+        self.index = df.index
+        self.chain_lengths = np.diff(chains.offsets)
+
+        rows = chains.token_rows()
+        positions = np.arange(len(chains.values)) - chains.offsets[rows]
+        order = np.argsort(chains.values, kind='stable')
+        self.rule_ids = chains.values[order].astype(np.int64)
+        self.rows = rows[order]
+        self.positions = positions[order]
+
+    def affected(self, rule_ids):
+        # One entry per affected chain, by index label, attributed to the nearest changed rule
+        # above it. Depth 0 is the changed rule's own chain, 1 its direct dependants, and so on
+        rule_ids = np.unique(pd.to_numeric(pd.Series(list(rule_ids), dtype=object), errors='coerce')
+                             .dropna().astype(np.int64).to_numpy())
+        starts = np.searchsorted(self.rule_ids, rule_ids, side='left')
+        ends = np.searchsorted(self.rule_ids, rule_ids, side='right')
+        hits, owners = _ranges(starts, ends)
+
+        rows = self.rows[hits]
+        depths = self.chain_lengths[rows] - 1 - self.positions[hits]
+        nearest = np.lexsort((depths, rows))
+        first = np.ones(len(nearest), dtype=bool)
+        first[1:] = rows[nearest][1:] != rows[nearest][:-1]
+        nearest = nearest[first]
+        return pd.DataFrame({
+            'Row': self.index[rows[nearest]],
+            'ChangedRuleID': rule_ids[owners[nearest]],
+            'Depth': depths[nearest],
+        })
+
+
+class GraphImpact:
+    # Impact index over the families of RuleGraphEngine's ValidConnections graph, which unlike
+    # the hierarchy report has no level limit, for the rule set version it was built from
+    def __init__(self, engine, version=None):
+        self.engine = engine
+        self.version = version
+        self.families = engine.families()
+        self.index = ImpactIndex(self.families)
+
+    def affected_rows(self, rule_ids):
+        # The family rows of affected(), with the nearest changed rule and its depth
+        affected = self.index.affected(rule_ids)
+        impact_df = self.families.loc[affected['Row']].reset_index(drop=True)
+        impact_df['ChangedRuleID'] = affected['ChangedRuleID'].to_numpy()
+        impact_df['Depth'] = affected['Depth'].to_numpy()
+        return impact_df
+
+
+def get_graph_impact(conn, database):
+    # Loaded once per database. When the rule set version changes the cached engine re-reads
+    # only the rules changed since its watermark and re-enumerates only their families; the new
+    # GraphImpact leaves the one other searches may still hold untouched
+    version = get_rule_set_version(conn)
+    with _impacts_lock:
+        impact = _impacts.get(database)
+    if impact is not None and impact.version == version:
+        return impact
+    with _update_lock:
+        with _impacts_lock:
+            impact = _impacts.get(database)
+        if impact is None or impact.version[0] is None:
+            with stage('load rule graph'):
+                impact = GraphImpact(RuleGraphEngine.load(conn), version)
+        elif impact.version != version:
+            with stage('update rule graph'):
+                impact.engine.refresh_since(conn, impact.version[0])
+                impact = GraphImpact(impact.engine, version)
+        with _impacts_lock:
+            _impacts[database] = impact
+    return impact
+
+
+def family_summary(impact_df):
+    # One row per affected family, from the report rows of affected()
+    families = impact_df.groupby('FamilyReference', sort=True)
+    summary = families.agg(
+        ChangedRules=('ChangedRuleID', 'nunique'),
+        AffectedChains=('RuleID', 'size'),
+        MaxDepth=('Depth', 'max'),
+    )
+    dependants = impact_df[impact_df['Depth'] > 0].groupby('FamilyReference')['RuleID'].nunique()
+    summary.insert(2, 'DependentRules', dependants.reindex(summary.index, fill_value=0))
+    return summary.reset_index()
@@ -0,0 +1,196 @@
+import cProfile
+import contextvars
+import functools
+import io
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from fast_fetch import FAST_FETCH_ENABLED, fetch_frame
+
+TRACE_LOG = os.environ.get('SEARCH_TRACE_LOG',
+                           os.path.join(tempfile.gettempdir(), 'countryrules_search_traces.jsonl'))
+PROFILE_DIR = os.environ.get('SEARCH_PROFILE_DIR') or os.path.dirname(TRACE_LOG) or '.'
+PROFILE_LINES = 40
+# Most recent finished searches, newest last
+RECENT_TRACES = deque(maxlen=50)
+
+_current = contextvars.ContextVar('search_trace', default=None)
+_log_lock = threading.Lock()
+
+
+def frame_size(df):
+    # Shallow size: object columns count their pointers, not the strings behind them
+    if isinstance(df, pd.DataFrame):
+        return len(df), int(df.memory_usage(index=False).sum())
+    return None, None
+
+
+class StageRecord:
+    def __init__(self):
+        self.rows = None
+        self.bytes = None
+
+    def set_frame(self, df):
+        self.rows, self.bytes = frame_size(df)
+        return df
+
+
+class SearchTrace:
+    # Wall time, rows and bytes for each stage of one search
+    def __init__(self, name, profile=False, **context):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.context = context
+        self.started_at = datetime.now()
+        self.stages = []
+        self.seconds = None
+        self.error = None
+        self.profile_text = None
+        self.profile_path = None
+        self._profiler = cProfile.Profile() if profile else None
+        self._started = None
+        self._token = None
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds, rows=None, nbytes=None):
+        with self._lock:
+            self.stages.append({'stage': stage, 'seconds': round(seconds, 4), 'rows': rows, 'bytes': nbytes})
+
+    def start(self):
+        self._token = _current.set(self)
+        self._started = time.perf_counter()
+        if self._profiler is not None:
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # Only one profiler can run at a time; another session is profiling
+                self._profiler = None
+        return self
+
+    def finish(self, log_path=TRACE_LOG):
+        if self._started is None or self.seconds is not None:
+            return self
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._save_profile()
+        self.seconds = round(time.perf_counter() - self._started, 4)
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Finished from another thread or context than the one that started it
+            pass
+        RECENT_TRACES.append(self)
+        if log_path:
+            write_trace(self, log_path)
+        return self
+
+    def _save_profile(self):
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=stream)
+        stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+        self.profile_text = stream.getvalue()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self.profile_path = os.path.join(PROFILE_DIR, f"search_{self.id}.prof")
+            stats.dump_stats(self.profile_path)
+        except OSError:
+            self.profile_path = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'search': self.name,
+            'started_at': self.started_at.isoformat(),
+            'seconds': self.seconds,
+            'error': self.error,
+            'context': {key: str(value) if value is not None else None for key, value in self.context.items()},
+            'stages': list(self.stages),
+            'profile': self.profile_path,
+        }
+
+    def stages_frame(self):
+        df = pd.DataFrame(self.stages, columns=['stage', 'seconds', 'rows', 'bytes'])
+        df['MB'] = (df['bytes'] / 2**20).round(2)
+        return df.drop(columns='bytes').rename(columns={
+            'stage': 'Stage', 'seconds': 'Seconds', 'rows': 'Rows'})
+
+
+def start_trace(name, profile=False, **context):
+    # Any trace left open by an earlier run on this thread is closed first
+    previous = _current.get()
+    if previous is not None:
+        previous.finish()
+    return SearchTrace(name, profile=profile, **context).start()
+
+
+@contextmanager
+def trace_search(name, profile=False, **context):
+    trace = start_trace(name, profile=profile, **context)
+    try:
+        yield trace
+    except Exception as e:
+        trace.error = str(e)
+        raise
+    finally:
+        trace.finish()
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def stage(name):
+    # Records into the search running on this thread; a no-op outside a search
+    record = StageRecord()
+    trace = _current.get()
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - started, record.rows, record.bytes)
+
+
+def timed(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                result = func(*args, **kwargs)
+                record.set_frame(result)
+                if record.rows is None and hasattr(result, '__len__') and not isinstance(result, str):
+                    record.rows = len(result)
+                return result
+        return wrapper
+    return decorate
+
+
+def read_sql(sql, conn, params=None, name=None, categories=False):
+    # One query timed as one stage: server execution plus transfer.
+    # categories: repeated text values come back as categoricals (fast fetch only)
+    with stage(name or f"read_sql {' '.join(sql.split())[:60]}") as record:
+        if FAST_FETCH_ENABLED:
+            return record.set_frame(fetch_frame(conn, sql, params=params, categories=categories))
+        return record.set_frame(pd.read_sql(sql, conn, params=params))
+
+
+def write_trace(trace, path=TRACE_LOG):
+    line = json.dumps(trace.to_dict(), default=str)
+    try:
+        with _log_lock:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except OSError:
+        # Tracing must never break a search
+        pass
@@ -0,0 +1,205 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from query_handler import (get_jurisdictions, get_master_data_version, get_matter_types, get_rule_memberships,
+                           get_rule_options)
+from rule_search import SEARCH_LIMIT, build_rule_search
+
+# Seconds between version checks; master data changes a few times a month
+DEFAULT_CHECK_INTERVAL = float(os.environ.get('MASTER_DATA_CHECK_INTERVAL', 60))
+# Seconds the sidebar waits for the lookups; slower ones finish in the background
+DEFAULT_LOOKUP_TIMEOUT = float(os.environ.get('MASTER_DATA_LOOKUP_TIMEOUT', 5))
+# Seconds before lookups that failed are tried again
+MISSING_RETRY_INTERVAL = 15
+
+# The lookups are independent, each runs on its own pooled connection
+LOOKUPS = {
+    'jurisdictions': get_jurisdictions,
+    'matter_types': get_matter_types,
+    'rule_options': get_rule_options,
+    'rule_memberships': get_rule_memberships,
+}
+EMPTY_LOOKUPS = {
+    'jurisdictions': ['Name', 'SortOrder'],
+    'matter_types': ['MaterType'],
+    'rule_options': ['ID', 'Activity', 'DisplayName', 'Outcome'],
+    'rule_memberships': ['ID', 'Jurisdiction', 'MaterType'],
+}
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='master-data')
+
+
+def _run_lookup(connection, lookup):
+    with connection() as conn:
+        return lookup(conn)
+
+
+class MasterData:
+    def __init__(self, version, jurisdictions, matter_types, rule_options, rule_memberships, missing=(),
+                 previous_search=None):
+        self.version = version
+        # Lookups that timed out or failed; they hold the previous or an empty result
+        self.missing = tuple(missing)
+        self.pending = False
+        self.jurisdictions = jurisdictions
+        self.matter_types = matter_types
+        self.rule_options = rule_options
+        self.rule_memberships = rule_memberships.astype({'Jurisdiction': 'category', 'MaterType': 'category'})
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        self._choices = {}
+        self._lock = threading.Lock()
+        # The search index is updated from the previous master data's index on first use
+        self._search = None
+        self._previous_search = previous_search
+        self._search_lock = threading.Lock()
+
+    def options(self, jurisdiction=None, matter_type=None):
+        # Same rows as query_handler.get_filtered_options, computed from the cached base tables
+        memberships = self.rule_memberships
+        mask = pd.Series(True, index=memberships.index)
+        if jurisdiction and jurisdiction != 'All':
+            mask &= memberships['Jurisdiction'] == jurisdiction
+        if matter_type:
+            mask &= memberships['MaterType'] == matter_type
+        rule_ids = memberships.loc[mask, 'ID'].unique()
+        return self.rule_options[self.rule_options['ID'].isin(rule_ids)]
+
+    def choices(self, jurisdiction=None, matter_type=None):
+        key = (jurisdiction if jurisdiction and jurisdiction != 'All' else None, matter_type or None)
+        with self._lock:
+            cached = self._choices.get(key)
+        if cached is None:
+            options = self.options(*key)
+            cached = {
+                'options': options,
+                'outcomes': sorted(options['Outcome'].dropna().unique()),
+            }
+            with self._lock:
+                self._choices[key] = cached
+        return cached
+
+    def rule_search(self):
+        with self._search_lock:
+            if self._search is None:
+                self._search = build_rule_search(self.rule_options, self._previous_search)
+                self._previous_search = None
+            return self._search
+
+    def latest_search(self):
+        # The index to update from next, without building one
+        return self._search if self._search is not None else self._previous_search
+
+    def search_rules(self, query, jurisdiction=None, matter_type=None, limit=SEARCH_LIMIT):
+        # Ranked rules for the sidebar's search box, limited to the selected filters
+        index = self.rule_search()
+        choices = self.choices(jurisdiction, matter_type)
+        allowed = None
+        if (jurisdiction and jurisdiction != 'All') or matter_type:
+            with self._lock:
+                allowed = choices.get('allowed')
+            if allowed is None:
+                allowed = index.allowed(choices['options']['ID'].unique())
+                with self._lock:
+                    choices['allowed'] = allowed
+        return index.search(query, limit=limit, allowed=allowed)
+
+
+class MasterDataCache:
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL, lookup_timeout=DEFAULT_LOOKUP_TIMEOUT):
+        self.check_interval = check_interval
+        self.lookup_timeout = lookup_timeout
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._data = {}
+
+    def _load_lock(self, database):
+        with self._lock:
+            return self._load_locks.setdefault(database, threading.Lock())
+
+    def get(self, database, connection):
+        # connection: context manager factory, only used when a version check or reload is due
+        with self._lock:
+            data = self._data.get(database)
+        if data is not None:
+            failed = data.missing and not data.pending
+            if time.time() - data.checked_at < (MISSING_RETRY_INTERVAL if failed else self.check_interval):
+                return data
+
+        with self._load_lock(database):
+            with self._lock:
+                current = self._data.get(database)
+            if current is not data and current is not None:
+                return current
+            with connection() as conn:
+                version = get_master_data_version(conn)
+            if data is not None and version == data.version and not data.missing:
+                data.checked_at = time.time()
+                return data
+            data = self._load(database, version, connection, previous=data)
+            with self._lock:
+                self._data[database] = data
+            return data
+
+    def _load(self, database, version, connection, previous=None):
+        futures = {name: _executor.submit(_run_lookup, connection, lookup) for name, lookup in LOOKUPS.items()}
+        wait(futures.values(), timeout=self.lookup_timeout)
+
+        values = {}
+        missing = []
+        for name, future in futures.items():
+            if future.done() and future.exception() is None:
+                values[name] = future.result()
+            else:
+                # Keep the form usable: last known values, or an empty list until the lookup lands
+                missing.append(name)
+                if previous is not None and name not in previous.missing:
+                    values[name] = getattr(previous, name)
+                else:
+                    values[name] = pd.DataFrame(columns=EMPTY_LOOKUPS[name])
+        data = MasterData(version, missing=missing, previous_search=previous.latest_search() if previous else None,
+                          **values)
+
+        slow = [futures[name] for name in missing if not futures[name].done()]
+        if slow:
+            data.pending = True
+            threading.Thread(target=self._complete, args=(database, data, futures, slow),
+                             name=f"master-data-{database}", daemon=True).start()
+        return data
+
+    def _complete(self, database, data, futures, slow):
+        # Swap in the full master data once the slow lookups return
+        wait(slow)
+        values = {}
+        for name, future in futures.items():
+            if future.exception() is None:
+                values[name] = future.result()
+            else:
+                values[name] = getattr(data, name)
+        missing = [name for name in data.missing if futures[name].exception() is not None]
+        complete = MasterData(data.version, missing=missing, previous_search=data.latest_search(),
+                              **values)
+        with self._lock:
+            if self._data.get(database) is data:
+                self._data[database] = complete
+        data.pending = False
+
+    def warm(self, database, connection):
+        # Called right after login; connection is the pool's context manager factory
+        data = self.get(database, connection)
+        data.choices()
+        data.rule_search()
+        return data
+
+    def invalidate(self, database=None):
+        with self._lock:
+            if database is None:
+                self._data.clear()
+            else:
+                self._data.pop(database, None)
+
+
+master_data_cache = MasterDataCache()
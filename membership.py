@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+MEMBERSHIP_COLUMNS = ('Jurisdictions', 'MatterType')
+
+
+class ListSplitter:
+    # Items of a comma-joined list of names. Known names that contain the separator themselves
+    # ("Korea, Republic of") are kept whole, everything else is split on the commas
+    def __init__(self, names=()):
+        pieces = [tuple(piece.strip().lower() for piece in str(name).split(','))
+                  for name in names if isinstance(name, str)]
+        self.joined = {name for name in pieces if len(name) > 1}
+        self.longest = max((len(name) for name in self.joined), default=1)
+
+    def __call__(self, value):
+        if not isinstance(value, str):
+            return []
+        pieces = [piece.strip() for piece in value.split(',')]
+        items = []
+        start = 0
+        while start < len(pieces):
+            size = min(self.longest, len(pieces) - start)
+            while size > 1 and tuple(piece.lower() for piece in pieces[start:start + size]) not in self.joined:
+                size -= 1
+            items.append(', '.join(pieces[start:start + size]))
+            start += size
+        return [item for item in items if item]
+
+
+class MembershipMatrix:
+    # distinct values x labels bit matrix (8 labels a byte) for one comma-joined column, with
+    # each row's value code; rows share the matrix row of their value instead of holding a copy.
+    # names: the column's known labels, see ListSplitter
+    def __init__(self, values, names=()):
+        if isinstance(getattr(values, 'dtype', None), pd.CategoricalDtype):
+            codes, distinct = values.cat.codes.to_numpy(), np.asarray(values.cat.categories, dtype=object)
+        else:
+            codes, distinct = pd.factorize(np.asarray(values, dtype=object))
+            distinct = np.asarray(distinct, dtype=object)
+        # Missing values (code -1) read the all-False row past the end
+        self.row_codes = np.where(codes < 0, len(distinct), codes).astype(np.int32)
+
+        split = ListSplitter(names)
+        items = [(position, item) for position, value in enumerate(distinct) for item in split(value)]
+        positions = np.array([position for position, _ in items], dtype=np.int64)
+        label_codes, labels = pd.factorize(pd.Series([item for _, item in items], dtype=object))
+        self.labels = np.asarray(labels, dtype=object)
+        matrix = np.zeros((len(distinct) + 1, len(self.labels)), dtype=bool)
+        matrix[positions, label_codes] = True
+        self.matrix = np.packbits(matrix, axis=1)
+        self._codes = {}
+        for code, label in enumerate(self.labels):
+            self._codes.setdefault(label.lower(), []).append(code)
+
+    def __len__(self):
+        return len(self.row_codes)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self.row_codes.nbytes
+
+    def mask(self, label):
+        codes = self._codes.get(str(label).strip().lower())
+        values = np.zeros(len(self.matrix), dtype=bool)
+        for code in codes or ():
+            values |= (self.matrix[:, code >> 3] & (0x80 >> (code & 7))) != 0
+        return values[self.row_codes]
+
+    def labels_present(self, positions=None):
+        row_codes = self.row_codes if positions is None else self.row_codes[positions]
+        present = np.bitwise_or.reduce(self.matrix[np.unique(row_codes)], axis=0)
+        return sorted(self.labels[np.unpackbits(present, count=len(self.labels)).astype(bool)])
+
+
+class MembershipIndex:
+    # Exact jurisdiction/matter type membership for every row of a hierarchy snapshot;
+    # names: known labels per column, e.g. the master data's jurisdiction names
+    def __init__(self, df, columns=MEMBERSHIP_COLUMNS, names=None):
+        names = names or {}
+        self.index = df.index
+        self.columns = {column: MembershipMatrix(df[column], names.get(column, ())) for column in columns}
+
+    @property
+    def nbytes(self):
+        return sum(matrix.nbytes for matrix in self.columns.values())
+
+    def positions(self, index):
+        return self.index.get_indexer(index)
+
+    def filter_mask(self, index=None, jurisdiction=None, matter_type=None):
+        positions = None if index is None else self.positions(index)
+        mask = np.ones(len(self.index) if positions is None else len(positions), dtype=bool)
+        for column, value in (('Jurisdictions', jurisdiction), ('MatterType', matter_type)):
+            if value and value != 'All':
+                column_mask = self.columns[column].mask(value)
+                mask &= column_mask if positions is None else column_mask[positions]
+        return mask
+
+    def labels_present(self, column, index=None):
+        positions = None if index is None else self.positions(index)
+        return self.columns[column].labels_present(positions)
+
+
+def build_membership_index(df, names=None):
+    return MembershipIndex(df, names=names)
@@ -0,0 +1,292 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fast_fetch import fetch_chunks
+from instrumentation import read_sql, stage
+from membership import MembershipMatrix
+from query_handler import fetch_for_ids
+
+MIRROR_ENABLED = os.environ.get('RULE_MIRROR_ENABLED', '1') != '0'
+MIRROR_DIR = os.environ.get('RULE_MIRROR_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'countryrules'))
+# Seconds between background syncs while the app is in use
+SYNC_INTERVAL = float(os.environ.get('RULE_MIRROR_SYNC_INTERVAL', 300))
+
+RULES_TABLE = 'tblRuleDefination'
+# Child rows are keyed by [Rule] and re-pulled for every changed rule
+CHILD_TABLES = ('tblOutcomes', 'tblConditions')
+# Small lookup tables are copied whole on every sync
+MASTER_TABLES = ('tblCountryMaster', 'tblMatterTypeMaster', 'tblRuleTypeMaster')
+MIRRORED_TABLES = (RULES_TABLE,) + CHILD_TABLES + MASTER_TABLES
+
+RELEASE_NOTES_COLUMNS = {
+    'ID': 'QA Rule ID',
+    'ProdId': 'Rule ID',
+    'Activity': 'Rule Name',
+    'Rule Type': 'Rule Type',
+    'Matter Type': 'Matter Type',
+    'Country': 'Country',
+    'versionType': 'Version Type',
+    'CalcCode': 'Calc Code',
+    'versionNotes': 'Version Notes',
+    'releaseVersion': 'Release Version',
+    'Reference': 'Reference',
+    'ModifiedOn': 'Modified On',
+}
+
+
+def _local_delete(local, table, column, ids):
+    local.executemany(f'DELETE FROM "{table}" WHERE "{column}" = ?', [(i,) for i in ids])
+
+
+def _copy_table(conn, local, table):
+    # Streamed chunk by chunk, so a full sync never holds a whole table in memory
+    with stage(f"mirror {table}") as record:
+        record.rows = 0
+        if_exists = 'replace'
+        for chunk in fetch_chunks(conn, f"SELECT * FROM {table}"):
+            chunk.to_sql(table, local, if_exists=if_exists, index=False)
+            if_exists = 'append'
+            record.rows += len(chunk)
+
+
+class RuleMirror:
+    # Local SQLite copy of the rule tables, kept current with a ModifiedOn watermark
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._syncing = False
+        self._tables = None
+        self._release_notes = None
+        self._attempted_at = None
+        self.last_error = None
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        local = sqlite3.connect(self.path)
+        local.execute("""
+            CREATE TABLE IF NOT EXISTS _sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                watermark TEXT,
+                synced_at TEXT,
+                rules INTEGER,
+                changed INTEGER
+            )
+        """)
+        return local
+
+    def state(self):
+        if not os.path.exists(self.path):
+            return None
+        local = self._connect()
+        try:
+            row = local.execute("SELECT watermark, synced_at, rules, changed FROM _sync_state").fetchone()
+        finally:
+            local.close()
+        if row is None:
+            return None
+        return {
+            'watermark': pd.Timestamp(row[0]) if row[0] else None,
+            'synced_at': datetime.fromisoformat(row[1]),
+            'rules': row[2],
+            'changed': row[3],
+        }
+
+    def sync(self, conn):
+        with self._lock:
+            local = self._connect()
+            try:
+                state = self.state()
+                if state is None or state['watermark'] is None:
+                    changed = self._full_sync(conn, local)
+                else:
+                    changed = self._incremental_sync(conn, local, state['watermark'])
+                watermark = pd.read_sql(f'SELECT MAX(ModifiedOn) AS w FROM "{RULES_TABLE}"', local)['w'].iloc[0]
+                rules = local.execute(f'SELECT COUNT(*) FROM "{RULES_TABLE}"').fetchone()[0]
+                local.execute("""
+                    INSERT OR REPLACE INTO _sync_state (id, watermark, synced_at, rules, changed)
+                    VALUES (1, ?, ?, ?, ?)
+                """, (str(watermark) if watermark is not None else None, datetime.now().isoformat(), rules, changed))
+                local.commit()
+            except Exception:
+                local.rollback()
+                raise
+            finally:
+                local.close()
+            self._tables = None
+            self._release_notes = None
+            return changed
+
+    def _full_sync(self, conn, local):
+        for table in MIRRORED_TABLES:
+            _copy_table(conn, local, table)
+        return local.execute(f'SELECT COUNT(*) FROM "{RULES_TABLE}"').fetchone()[0]
+
+    def _incremental_sync(self, conn, local, watermark):
+        # >= re-pulls rows stamped exactly at the watermark; replacing them is idempotent
+        changed = read_sql(f"SELECT * FROM {RULES_TABLE} WHERE ModifiedOn >= ?", conn,
+                           params=[watermark.to_pydatetime()], name='mirror changed rules')
+        source_ids = set(read_sql(f"SELECT ID FROM {RULES_TABLE}", conn, name='mirror rule IDs')['ID'])
+        local_ids = {row[0] for row in local.execute(f'SELECT ID FROM "{RULES_TABLE}"')}
+        deleted = local_ids - source_ids
+        changed_ids = list(changed['ID'])
+
+        _local_delete(local, RULES_TABLE, 'ID', changed_ids + list(deleted))
+        changed.to_sql(RULES_TABLE, local, if_exists='append', index=False)
+        for table in CHILD_TABLES:
+            _local_delete(local, table, 'Rule', changed_ids + list(deleted))
+            fetch_for_ids(conn, f"SELECT * FROM {table}", '[Rule]', changed_ids).to_sql(
+                table, local, if_exists='append', index=False)
+        for table in MASTER_TABLES:
+            _copy_table(conn, local, table)
+        return len(changed_ids) + len(deleted)
+
+    def sync_due(self):
+        # Failed attempts count too, so an unreachable server isn't retried on every rerun
+        if self._attempted_at and (datetime.now() - self._attempted_at).total_seconds() < SYNC_INTERVAL:
+            return False
+        state = self.state()
+        return state is None or (datetime.now() - state['synced_at']).total_seconds() >= SYNC_INTERVAL
+
+    def sync_in_background(self, connection):
+        # connection: a context manager factory such as ConnectionPool.connection
+        with self._lock:
+            if self._syncing:
+                return
+            self._syncing = True
+            self._attempted_at = datetime.now()
+
+        def run():
+            try:
+                with connection() as conn:
+                    self.sync(conn)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                self._syncing = False
+
+        threading.Thread(target=run, name=f"mirror-{os.path.basename(self.path)}", daemon=True).start()
+
+    def tables(self):
+        # All mirrored tables as DataFrames, read from disk once per sync
+        tables = self._tables
+        if tables is None:
+            if self.state() is None:
+                return None
+            local = self._connect()
+            try:
+                tables = {table: read_sql(f'SELECT * FROM "{table}"', local, name=f"mirror load {table}")
+                          for table in MIRRORED_TABLES}
+            finally:
+                local.close()
+            rules = tables[RULES_TABLE]
+            rules['ModifiedOn'] = pd.to_datetime(rules['ModifiedOn'])
+            self._tables = tables
+        return tables
+
+    def release_notes(self):
+        index = self._release_notes
+        if index is None:
+            tables = self.tables()
+            if tables is None:
+                return None
+            with stage('build release notes index'):
+                index = self._release_notes = ReleaseNotesIndex(tables)
+        return index
+
+
+_mirrors = {}
+_mirrors_lock = threading.Lock()
+
+
+def get_mirror(database, directory=MIRROR_DIR):
+    path = os.path.join(directory, f"mirror_{re.sub(r'[^A-Za-z0-9_.-]', '_', database)}.sqlite")
+    with _mirrors_lock:
+        if path not in _mirrors:
+            _mirrors[path] = RuleMirror(path)
+        return _mirrors[path]
+
+
+def _joined_names(ids, names):
+    items = ids.fillna('').astype(str).str.split(',').explode().str.strip()
+    named = items.map(names).dropna()
+    return named.groupby(level=0).agg(lambda values: ', '.join(sorted(set(values))))
+
+
+class ReleaseNotesIndex:
+    # Release notes rows for every active rule with exact country/matter type membership,
+    # built once per sync and filtered per search
+    def __init__(self, tables):
+        rules = tables[RULES_TABLE]
+        rules = rules[rules['Active'] == 1].reset_index(drop=True)
+        countries = tables['tblCountryMaster']
+        matter_types = tables['tblMatterTypeMaster']
+        rule_types = tables['tblRuleTypeMaster']
+
+        country_names = dict(zip(countries['ID'].astype(str), countries['Name']))
+        matter_type_names = dict(zip(matter_types['ID'].astype(str), matter_types['MaterType']))
+        rules['Country'] = _joined_names(rules['Jurisdiction'], country_names)
+        rules['Matter Type'] = _joined_names(rules['MatterType'], matter_type_names)
+        rules['Rule Type'] = rules['RuleType'].map(dict(zip(rule_types['ID'], rule_types['RuleType'])))
+
+        # Rules without a known country and matter type drop out of the SQL joins too
+        rules = rules[rules['Country'].notna() & rules['Matter Type'].notna()]
+        rules = rules.sort_values('ModifiedOn', ascending=False, kind='stable').reset_index(drop=True)
+        self.df = rules.reindex(columns=list(RELEASE_NOTES_COLUMNS)).rename(columns=RELEASE_NOTES_COLUMNS)
+        # Membership is kept by ID, names like "Korea, Republic of" contain the list separator
+        self.countries = MembershipMatrix(rules['Jurisdiction'].to_numpy())
+        self.matter_types = MembershipMatrix(rules['MatterType'].to_numpy())
+        self.country_ids = _ids_by_name(country_names)
+        self.matter_type_ids = _ids_by_name(matter_type_names)
+        self.modified_on = self.df['Modified On'].to_numpy()
+
+    def query(self, jurisdiction=None, matter_type=None, from_date=None, to_date=None):
+        mask = np.ones(len(self.df), dtype=bool)
+        if jurisdiction and jurisdiction != 'All':
+            mask &= _name_mask(self.countries, self.country_ids, jurisdiction)
+        if matter_type:
+            mask &= _name_mask(self.matter_types, self.matter_type_ids, matter_type)
+        if from_date:
+            mask &= self.modified_on >= np.datetime64(pd.Timestamp(from_date))
+        if to_date:
+            mask &= self.modified_on <= np.datetime64(pd.Timestamp(to_date))
+        return self.df[mask].reset_index(drop=True)
+
+
+def _ids_by_name(names):
+    ids = {}
+    for master_id, name in names.items():
+        ids.setdefault(str(name).strip().lower(), []).append(master_id)
+    return ids
+
+
+def _name_mask(matrix, ids_by_name, name):
+    # Names compare case-insensitively, like the database collation
+    mask = np.zeros(len(matrix), dtype=bool)
+    for master_id in ids_by_name.get(str(name).strip().lower(), []):
+        mask |= matrix.mask(master_id)
+    return mask
+
+
+def release_notes_from_tables(tables, jurisdiction=None, matter_type=None, from_date=None, to_date=None):
+    # Same rows as query_handler.get_release_notes_data, computed from the mirror
+    return ReleaseNotesIndex(tables).query(jurisdiction, matter_type, from_date, to_date)
+
+
+def describe_sync(state):
+    if state is None:
+        return "Local mirror: not synced yet"
+    age = (datetime.now() - state['synced_at']).total_seconds()
+    if age < 120:
+        ago = f"{int(age)}s ago"
+    elif age < 7200:
+        ago = f"{int(age // 60)} min ago"
+    else:
+        ago = state['synced_at'].strftime('%Y-%m-%d %H:%M')
+    return f"Local mirror: last synced {ago} ({state['rules']:,} rules)"
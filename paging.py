@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+
+PAGE_SIZES = [50, 100, 250, 500, 1000]
+# (sort, filter) combinations kept per result; page changes reuse them without re-sorting
+MAX_CACHED_VIEWS = 8
+
+
+class ResultPager:
+    def __init__(self, df):
+        self.df = df
+        self._sort_indexes = {}
+        self._filter_masks = {}
+        self._views = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def sort_index(self, column, ascending=True):
+        key = (column, ascending)
+        if key not in self._sort_indexes:
+            values = self.df[column].reset_index(drop=True)
+            if values.dtype == object:
+                # Mixed types (e.g. ints and None) sort by their text
+                values = values.where(values.isna(), values.astype(str))
+            ordered = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+            self._sort_indexes[key] = ordered.index.to_numpy()
+        return self._sort_indexes[key]
+
+    def filter_mask(self, column, text):
+        key = (column, text.lower())
+        if key not in self._filter_masks:
+            values = self.df[column]
+            self._filter_masks[key] = (
+                values.astype(str).str.contains(text, case=False, regex=False).to_numpy() & values.notna().to_numpy()
+            )
+        return self._filter_masks[key]
+
+    def positions(self, sort_column=None, ascending=True, filter_column=None, filter_text=None):
+        key = (sort_column, ascending, filter_column, filter_text)
+        if key not in self._views:
+            if sort_column:
+                order = self.sort_index(sort_column, ascending)
+            else:
+                order = np.arange(len(self.df))
+            if filter_column and filter_text:
+                order = order[self.filter_mask(filter_column, filter_text)[order]]
+            if len(self._views) >= MAX_CACHED_VIEWS:
+                self._views.pop(next(iter(self._views)))
+            self._views[key] = order
+        return self._views[key]
+
+    def page(self, positions, page_number, page_size):
+        start = (page_number - 1) * page_size
+        return self.df.iloc[positions[start:start + page_size]]
+
+
+def page_count(rows, page_size):
+    return max(1, math.ceil(rows / page_size))
+
+
+def get_pager(result):
+    if result.get('pager') is None:
+        result['pager'] = ResultPager(result['display'])
+    return result['pager']
@@ -1,5 +1,235 @@
-def get_rule_families(conn, filters=None):
+import re
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+from db_pool import statement_cache
+from fast_fetch import FAST_FETCH_ENABLED, FETCH_BATCH_SIZE, cursor_frame
+from instrumentation import read_sql, stage
+
+# Most recent statement executions, newest last
+QUERY_LOG = deque(maxlen=1000)
+ID_CHUNK_SIZE = 1000
+
+
+def execute_query(conn, query, params=(), name=None):
+    # The SQL text only depends on which filters are set, values always travel as ? parameters,
+    # so SQL Server reuses one plan per filter shape. Pooled connections keep one cursor per
+    # statement, which lets pyodbc reuse the prepared statement on the next execution.
+    cache = statement_cache(conn)
+    cursor = cache.get(query) if cache is not None else None
+    if cursor is None:
+        cursor = conn.cursor()
+        cursor.arraysize = FETCH_BATCH_SIZE
+        if cache is not None:
+            cache[query] = cursor
+
+    label = name or ' '.join(query.split())[:80]
+    df = None
+    started = time.perf_counter()
+    try:
+        # Execution and transfer are separate stages of the search trace
+        with stage(f"{label} execute"):
+            cursor.execute(query, list(params))
+        with stage(f"{label} fetch") as record:
+            if FAST_FETCH_ENABLED:
+                df = record.set_frame(cursor_frame(cursor))
+            else:
+                columns = [column[0] for column in cursor.description]
+                df = record.set_frame(pd.DataFrame.from_records(
+                    [tuple(row) for row in cursor.fetchall()], columns=columns))
+    except Exception:
+        if cache is not None:
+            cache.pop(query, None)
+        cursor.close()
+        raise
+    finally:
+        QUERY_LOG.append({
+            'Statement': label,
+            'Parameters': len(params),
+            'Rows': len(df) if df is not None else None,
+            'Seconds': round(time.perf_counter() - started, 4),
+            'Started': datetime.now(),
+        })
+    if cache is None:
+        cursor.close()
+    return df
+
+
+def fetch_for_ids(conn, query, column, ids):
+    # SQL Server allows ~2100 parameters per statement
+    frames = []
+    ids = list(ids)
+    for start in range(0, len(ids), ID_CHUNK_SIZE):
+        chunk = ids[start:start + ID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        frames.append(read_sql(f"{query} WHERE {column} IN ({placeholders})", conn, params=chunk,
+                               name=f"{query.split(' FROM ')[-1]} for {len(chunk)} IDs"))
+    if not frames:
+        return read_sql(f"{query} WHERE 1 = 0", conn)
+    return pd.concat(frames, ignore_index=True)
+
+
+def get_query_log():
+    return pd.DataFrame(list(QUERY_LOG), columns=['Statement', 'Parameters', 'Rows', 'Seconds', 'Started'])
+
+
+def get_jurisdictions(conn):
+    query = """
+    SELECT DISTINCT Name,
+           CASE Name 
+               WHEN 'United States' THEN 1
+               WHEN 'European Patent Office' THEN 2
+               WHEN 'WIPO' THEN 3
+               ELSE 4 
+           END as SortOrder
+    FROM tblCountryMaster 
+    WHERE (isDirtyFlag = 0 OR isDirtyFlag IS NULL)
+    ORDER BY 2, 1
+    """
+    return execute_query(conn, query, name='get_jurisdictions')
+
+def get_matter_types(conn):
     query = """
+    SELECT DISTINCT MaterType
+    FROM tblMatterTypeMaster 
+    WHERE (isDirtyFlag = 0 OR isDirtyFlag IS NULL)
+    ORDER BY MaterType
+    """
+    return execute_query(conn, query, name='get_matter_types')
+
+def get_filtered_options(conn, jurisdiction=None, matter_type=None):
+    conditions = []
+    params = []
+    if jurisdiction and jurisdiction != 'All':
+        conditions.append("c.Name = ?")
+        params.append(jurisdiction)
+    if matter_type:
+        conditions.append("m.MaterType = ?")
+        params.append(matter_type)
+    
+    where_clause = f"WHERE rd.Active = 1 {' AND ' + ' AND '.join(conditions) if conditions else ''}"
+    
+    query = f"""
+    SELECT DISTINCT
+        rd.ID,
+        rd.Activity,
+        CONCAT('[', rd.ID, '] ', rd.Activity) as DisplayName,
+        o.Label AS Outcome
+    FROM tblRuleDefination rd
+    CROSS APPLY dbo.SplitStrings(rd.MatterType, ',') mt
+    CROSS APPLY dbo.SplitStrings(rd.Jurisdiction, ',') j
+    JOIN tblMatterTypeMaster m ON RTRIM(LTRIM(mt.Item)) = CAST(m.ID AS VARCHAR)
+    JOIN tblCountryMaster c ON RTRIM(LTRIM(j.Item)) = CAST(c.ID AS VARCHAR)
+    LEFT JOIN tblOutcomes o ON rd.ID = o.[Rule]
+    {where_clause}
+    """
+    return execute_query(conn, query, params, name='get_filtered_options')
+
+def get_rule_options(conn):
+    query = """
+    SELECT DISTINCT
+        rd.ID,
+        rd.Activity,
+        CONCAT('[', rd.ID, '] ', rd.Activity) as DisplayName,
+        o.Label AS Outcome
+    FROM tblRuleDefination rd
+    LEFT JOIN tblOutcomes o ON rd.ID = o.[Rule]
+    WHERE rd.Active = 1
+    """
+    return execute_query(conn, query, name='get_rule_options')
+
+def get_rule_memberships(conn):
+    query = """
+    SELECT DISTINCT
+        rd.ID,
+        c.Name AS Jurisdiction,
+        m.MaterType
+    FROM tblRuleDefination rd
+    CROSS APPLY dbo.SplitStrings(rd.MatterType, ',') mt
+    CROSS APPLY dbo.SplitStrings(rd.Jurisdiction, ',') j
+    JOIN tblMatterTypeMaster m ON RTRIM(LTRIM(mt.Item)) = CAST(m.ID AS VARCHAR)
+    JOIN tblCountryMaster c ON RTRIM(LTRIM(j.Item)) = CAST(c.ID AS VARCHAR)
+    WHERE rd.Active = 1
+    """
+    return execute_query(conn, query, name='get_rule_memberships')
+
+def get_master_data_version(conn):
+    query = """
+    SELECT
+        (SELECT MAX(ModifiedOn) FROM tblRuleDefination) AS RulesModifiedOn,
+        (SELECT COUNT(*) FROM tblRuleDefination WHERE Active = 1) AS ActiveRules,
+        (SELECT COUNT(*) FROM tblOutcomes) AS Outcomes,
+        (SELECT COUNT(*) FROM tblCountryMaster WHERE isDirtyFlag = 0 OR isDirtyFlag IS NULL) AS Countries,
+        (SELECT COUNT(*) FROM tblMatterTypeMaster WHERE isDirtyFlag = 0 OR isDirtyFlag IS NULL) AS MatterTypes
+    """
+    return tuple(execute_query(conn, query, name='get_master_data_version').iloc[0])
+
+def get_rule_set_version(conn):
+    # Edits to outcomes and conditions bump their rule's ModifiedOn, as the mirror sync assumes
+    query = """
+    SELECT
+        (SELECT MAX(ModifiedOn) FROM tblRuleDefination) AS RulesModifiedOn,
+        (SELECT COUNT(*) FROM tblRuleDefination) AS Rules,
+        (SELECT COUNT(*) FROM tblOutcomes) AS Outcomes,
+        (SELECT COUNT(*) FROM tblConditions) AS Conditions
+    """
+    return tuple(execute_query(conn, query, name='get_rule_set_version').iloc[0])
+
+def get_release_notes_data(conn, jurisdiction=None, matter_type=None, from_date=None, to_date=None):
+    conditions = []
+    params = []
+    if jurisdiction and jurisdiction != 'All':
+        conditions.append("c.Name = ?")
+        params.append(jurisdiction)
+    if matter_type:
+        conditions.append("m.MaterType = ?")
+        params.append(matter_type)
+    if from_date:
+        conditions.append("rd.ModifiedOn >= ?")
+        params.append(from_date)
+    if to_date:
+        conditions.append("rd.ModifiedOn <= ?")
+        params.append(to_date)
+    
+    where_clause = f"WHERE rd.Active = 1 {' AND ' + ' AND '.join(conditions) if conditions else ''}"
+    
+    query = f"""
+    SELECT DISTINCT
+        rd.ID as 'QA Rule ID',
+        rd.ProdId as 'Rule ID',
+        rd.Activity as 'Rule Name',
+        rt.RuleType as 'Rule Type',
+        STUFF((
+            SELECT DISTINCT ', ' + m2.MaterType
+            FROM dbo.SplitStrings(rd.MatterType, ',') mt2
+            JOIN tblMatterTypeMaster m2 ON RTRIM(LTRIM(mt2.Item)) = CAST(m2.ID AS VARCHAR)
+            FOR XML PATH(''), TYPE).value('.', 'varchar(max)'), 1, 2, '') as 'Matter Type',
+        STUFF((
+            SELECT DISTINCT ', ' + c2.Name
+            FROM dbo.SplitStrings(rd.Jurisdiction, ',') j2
+            JOIN tblCountryMaster c2 ON RTRIM(LTRIM(j2.Item)) = CAST(c2.ID AS VARCHAR)
+            FOR XML PATH(''), TYPE).value('.', 'varchar(max)'), 1, 2, '') as Country,
+        rd.versionType as 'Version Type',
+        rd.CalcCode as 'Calc Code',
+        rd.versionNotes as 'Version Notes',
+        rd.releaseVersion as 'Release Version',
+        rd.Reference as Reference,
+        rd.ModifiedOn as 'Modified On'
+    FROM tblRuleDefination rd
+    CROSS APPLY dbo.SplitStrings(rd.MatterType, ',') mt
+    CROSS APPLY dbo.SplitStrings(rd.Jurisdiction, ',') j
+    JOIN tblMatterTypeMaster m ON RTRIM(LTRIM(mt.Item)) = CAST(m.ID AS VARCHAR)
+    JOIN tblCountryMaster c ON RTRIM(LTRIM(j.Item)) = CAST(c.ID AS VARCHAR)
+    LEFT JOIN tblRuleTypeMaster rt ON rd.RuleType = rt.ID
+    {where_clause}
+    ORDER BY rd.ModifiedOn DESC
+    """
+    return execute_query(conn, query, params, name='get_release_notes_data')
+
+RULE_FAMILIES_CTE = """
     WITH RuleAttributes AS (
         SELECT DISTINCT
             rd.ID AS RuleID,
@@ -52,7 +282,8 @@ def get_rule_families(conn, filters=None):
         FROM RuleFamilies rf
         JOIN ValidConnections vc ON rf.RuleID = vc.ParentRuleID
         WHERE rf.Level < 5
-    )
+    ),
+    FamilyRows AS (
     SELECT 
         rf.FamilyReference,
         rd.ID AS RuleID,
@@ -83,18 +314,91 @@ def get_rule_families(conn, filters=None):
         ).value('.', 'varchar(max)'), 1, 2, '') AS MatterType
     FROM RuleFamilies rf
     JOIN tblRuleDefination rd ON rd.ID = rf.RuleID
+    )
+"""
+
+
+def get_rule_families(conn, filters=None):
+    query = RULE_FAMILIES_CTE + """
+    SELECT * FROM FamilyRows
     """
     
+    params = []
     if filters:
         where_clauses = []
         if filters.get('matter_type'):
-            where_clauses.append(f"MatterType LIKE '%{filters['matter_type']}%'")
+            where_clauses.append("MatterType LIKE ?")
+            params.append(f"%{filters['matter_type']}%")
         if filters.get('jurisdiction'):
-            where_clauses.append(f"Jurisdictions LIKE '%{filters['jurisdiction']}%'")
+            where_clauses.append("Jurisdictions LIKE ?")
+            params.append(f"%{filters['jurisdiction']}%")
             
         if where_clauses:
             query += " WHERE " + " AND ".join(where_clauses)
             
-    query += " ORDER BY rf.FamilyReference, rf.Level"
+    query += " ORDER BY FamilyReference, Level"
+    
+    return execute_query(conn, query, params, name='get_rule_families')
+
+
+def _like_literal(text):
+    # LIKE wildcards in user input match literally (T-SQL bracket escapes)
+    return re.sub(r'([%_\[])', r'[\1]', str(text))
+
+
+def get_rule_family_report(conn, rule_id=None, outcome=None, jurisdiction=None, matter_type=None):
+    # Push-down version of the "What Triggers What" filters. Rule and outcome searches keep the
+    # family closure of get_family_references: every row of a family that contains the rule, or
+    # a rule with a matching outcome. Jurisdiction and matter type are exact master data names.
+    query = RULE_FAMILIES_CTE + """
+    SELECT
+        fr.*,
+        rt.RuleType,
+        STUFF((
+            SELECT ', ' + o.Label
+            FROM tblOutcomes o
+            WHERE o.[Rule] = fr.RuleID
+            FOR XML PATH(''), TYPE
+        ).value('.', 'varchar(max)'), 1, 2, '') AS Outcome
+    FROM FamilyRows fr
+    JOIN tblRuleDefination rd ON rd.ID = fr.RuleID
+    LEFT JOIN tblRuleTypeMaster rt ON rd.RuleType = rt.ID
+    """
+    
+    conditions = []
+    params = []
+    if rule_id:
+        conditions.append("fr.FamilyReference IN (SELECT FamilyReference FROM FamilyRows WHERE RuleID = ?)")
+        params.append(int(str(rule_id).strip()))
+    elif outcome:
+        conditions.append("""fr.FamilyReference IN (
+            SELECT f2.FamilyReference
+            FROM FamilyRows f2
+            JOIN tblOutcomes o2 ON o2.[Rule] = f2.RuleID
+            WHERE o2.Label LIKE ?)""")
+        params.append(f"%{_like_literal(outcome)}%")
+    # Through the rule's jurisdiction/matter type IDs; names such as "Korea, Republic of" contain
+    # the separator of the joined display lists
+    if jurisdiction and jurisdiction != 'All':
+        conditions.append("""EXISTS (
+            SELECT 1
+            FROM RuleAttributes ra
+            JOIN tblCountryMaster cm ON cm.ID = ra.JurisdictionID
+            WHERE ra.RuleID = fr.RuleID AND cm.Name = ?)""")
+        params.append(jurisdiction)
+    if matter_type:
+        conditions.append("""EXISTS (
+            SELECT 1
+            FROM RuleAttributes ra
+            JOIN tblMatterTypeMaster mt ON mt.ID = ra.MatterTypeID
+            WHERE ra.RuleID = fr.RuleID AND mt.MaterType = ?)""")
+        params.append(matter_type)
+    
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY fr.FamilyReference, fr.Level"
     
-    return pd.read_sql(query, conn)
\ No newline at end of file
+    df = execute_query(conn, query, params, name='get_rule_family_report')
+    # The direct parent is the previous link of the chain
+    df['TriggeredBy'] = df['ChainPath'].str.rsplit(' -> ', n=2).str[-2]
+    return df
\ No newline at end of file
@@ -0,0 +1,581 @@
+import argparse
+import getpass
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pandas as pd
+import pyodbc
+
+from bulk_calculate import calculate_bulk
+from business_calendars import get_calendars
+from compact_snapshot import expand_categories
+from db_pool import get_pool
+from due_dates import ISSUES_COLUMN, add_calculated_dates
+from exporter import EXPORT_FORMATS, WRITERS
+from family_index import build_family_index
+from impact_analysis import family_summary, get_graph_impact
+from instrumentation import stage, timed, trace_search
+from membership import build_membership_index
+from mirror import MIRROR_ENABLED, get_mirror
+from query_handler import get_jurisdictions, get_matter_types, get_release_notes_data, get_rule_family_report
+from rule_diff import ADDED, CHANGED, REMOVED, compare_databases
+from snapshot_cache import hierarchy_cache
+
+WHAT_TRIGGERS_WHAT = "What Triggers What"
+RELEASE_NOTES = "Release Notes"
+CALCULATE_RULE = "Calculate Rule"
+RULE_DIFF = "QA vs Production"
+
+WTW_COLUMNS = [
+    'FamilyReference', 'RuleID', 'ChainPath', 'RuleType', 'RuleName',
+    'MatterType', 'Jurisdictions', 'TriggeredBy', 'TriggerCondition',
+    'Output Type', 'Outcome', 'DueDate', 'FinalDueDate'
+]
+PARTIAL_CAPTION = ("Preliminary results while the rule hierarchy loads: trigger conditions, output types and "
+                   "due dates are missing and family references may differ. Search again to export.")
+RELEASE_NOTES_COLUMNS = [
+    'QA Rule ID', 'Rule ID', 'Rule Name', 'Rule Type', 'Matter Type',
+    'Country', 'Version Type', 'Calc Code', 'Version Notes',
+    'Release Version', 'Reference', 'Modified On'
+]
+IMPACT_COLUMNS = [
+    'FamilyReference', 'ChangedRuleID', 'RuleID', 'RuleName', 'Depth', 'Level', 'ChainPath',
+    'Jurisdictions', 'MatterType'
+]
+# Views of the Release Notes report
+CHANGED_RULES = "Changed rules"
+AFFECTED_FAMILIES = "Affected families"
+AFFECTED_CHAINS = "Affected chains"
+RELEASE_VIEWS = [CHANGED_RULES, AFFECTED_FAMILIES, AFFECTED_CHAINS]
+# Batch jobs in flight at once; DB connections are bounded separately by the pool
+DEFAULT_WORKERS = int(os.environ.get('REPORT_WORKERS', 8))
+
+
+@timed('connect')
+def get_db_connection(username, password, database):
+    conn_str = (
+        f"Driver={{ODBC Driver 17 for SQL Server}};"
+        f"Server=tcp:lumenip.database.windows.net,1433;"
+        f"Database={database};"
+        f"Uid={username}@lumenip;"
+        f"Pwd={password};"
+        f"Encrypt=yes;"
+        f"TrustServerCertificate=no;"
+        f"Connection Timeout=30;"
+    )
+    return pyodbc.connect(conn_str)
+
+
+def get_connection_pool(username, password, database, **kwargs):
+    return get_pool(username, password, database,
+                    lambda: get_db_connection(username, password, database), **kwargs)
+
+
+def get_hierarchy_snapshot(conn, database):
+    return hierarchy_cache.get(database, conn)
+
+
+def get_family_index(snapshot):
+    return snapshot.derived('family_index', lambda df: build_family_index(df, snapshot.chains))
+
+
+def membership_names(conn):
+    # Master data names per membership column; some contain the list separator themselves
+    if conn is None:
+        return None
+    return {
+        'Jurisdictions': list(get_jurisdictions(conn)['Name']),
+        'MatterType': list(get_matter_types(conn)['MaterType']),
+    }
+
+
+def get_membership_index(snapshot, conn=None):
+    return snapshot.derived('membership_index', lambda df: build_membership_index(df, membership_names(conn)))
+
+
+@timed('family references')
+def get_family_references(df, rule_id=None, rule_name=None, outcome=None, index=None):
+    if index is not None:
+        if rule_id:
+            return index.references_for(index.codes_for_rule_id(rule_id))
+        elif rule_name:
+            return index.references_for(index.codes_for_rule_name(rule_name))
+        elif outcome:
+            return index.references_for(index.codes_for_outcome(outcome))
+        return []
+    if rule_id:
+        return df[df['ChainPath'].apply(lambda x: str(rule_id) in x.split('->'))]['FamilyReference'].unique()
+    elif rule_name:
+        return df[df['RuleName'] == rule_name]['FamilyReference'].unique()
+    elif outcome:
+        return df[df['Outcome'].str.contains(outcome, case=False, na=False)]['FamilyReference'].unique()
+    return []
+
+
+def get_calculated_rule_data(conn, rule_id=None, trigger_date=None, jurisdiction=None, matter_type=None,
+                             snapshot=None, database=None):
+    snapshot = snapshot or get_hierarchy_snapshot(conn, database)
+    results_df = snapshot.df
+
+    if rule_id:
+        family_refs = get_family_references(results_df, rule_id=rule_id, index=get_family_index(snapshot))
+        results_df = results_df[results_df['FamilyReference'].isin(family_refs)]
+
+    # Filter before calculating so only the rows shown get dates
+    if (jurisdiction and jurisdiction != 'All') or matter_type:
+        with stage('filter') as record:
+            results_df = record.set_frame(results_df[get_membership_index(snapshot, conn).filter_mask(
+                results_df.index, jurisdiction=jurisdiction, matter_type=matter_type)])
+
+    # A fresh frame with the report's columns; the shared snapshot is never written into
+    results_df = snapshot.view(results_df.index)
+
+    if trigger_date:
+        # Convert trigger_date to datetime if it's not already
+        if isinstance(trigger_date, str):
+            trigger_date = pd.to_datetime(trigger_date).date()
+
+        # Each distinct formula is compiled once, dates are computed column-wise
+        with stage('calculate dates') as record:
+            results_df = record.set_frame(add_calculated_dates(results_df, trigger_date, calendars=get_calendars(),
+                                                               jurisdiction=jurisdiction))
+
+    return results_df
+
+
+def get_bulk_calculated_rule_data(conn, requests_df, snapshot=None, database=None):
+    # All uploaded matters are resolved against one snapshot in a single pass
+    snapshot = snapshot or get_hierarchy_snapshot(conn, database)
+    with stage('calculate dates (bulk)') as record:
+        result = calculate_bulk(snapshot.df, get_family_index(snapshot), requests_df, calendars=get_calendars())
+        return record.set_frame(expand_categories(result))
+
+
+def get_dashboard_metrics_triggers(filtered_df, membership=None):
+    if membership is not None:
+        return pd.DataFrame([{
+            'Jurisdictions': ', '.join(membership.labels_present('Jurisdictions', filtered_df.index)),
+            'MatterTypes': ', '.join(membership.labels_present('MatterType', filtered_df.index)),
+            'Actions': int((filtered_df['RuleType'] == 'Action').sum()),
+            'Tasks': int((filtered_df['RuleType'] == 'Task').sum())
+        }])
+    return pd.DataFrame([{
+        'Jurisdictions': ', '.join(sorted(set([j.strip() for j in filtered_df['Jurisdictions'].str.split(',').explode().str.strip()]))),
+        'MatterTypes': ', '.join(sorted(set([m.strip() for m in filtered_df['MatterType'].str.split(',').explode().str.strip()]))),
+        'Actions': len(filtered_df[filtered_df['RuleType'] == 'Action']),
+        'Tasks': len(filtered_df[filtered_df['RuleType'] == 'Task'])
+    }])
+
+
+def get_dashboard_metrics_release(filtered_df, from_date, to_date):
+    return pd.DataFrame([{
+        'Jurisdictions': ', '.join(sorted(set([j.strip() for j in filtered_df['Country'].str.split(',').explode().str.strip()]))),
+        'From': from_date.strftime('%Y-%m-%d'),
+        'To': to_date.strftime('%Y-%m-%d'),
+        'Actions': len(filtered_df[filtered_df['Rule Type'] == 'Action']),
+        'Tasks': len(filtered_df[filtered_df['Rule Type'] == 'Task'])
+    }])
+
+
+def truncate_text(text, max_length=30):
+    return text[:max_length] + '...' if len(text) > max_length else text
+
+
+def get_trigger_metrics(filtered_df, membership=None):
+    if filtered_df.empty:
+        return []
+    dashboard_df = get_dashboard_metrics_triggers(filtered_df, membership)
+    return [
+        ("Jurisdictions", truncate_text(dashboard_df['Jurisdictions'].iloc[0], max_length=50)),
+        ("Matter Types", truncate_text(dashboard_df['MatterTypes'].iloc[0])),
+        ("Actions", int(dashboard_df['Actions'].iloc[0])),
+        ("Tasks", int(dashboard_df['Tasks'].iloc[0])),
+    ]
+
+
+def get_release_metrics(filtered_df, from_date, to_date):
+    if filtered_df.empty:
+        return []
+    dashboard_df = get_dashboard_metrics_release(filtered_df, from_date, to_date)
+    return [
+        ("Jurisdictions", truncate_text(dashboard_df['Jurisdictions'].iloc[0], max_length=50)),
+        ("From", dashboard_df['From'].iloc[0]),
+        ("To", dashboard_df['To'].iloc[0]),
+        ("Actions", int(dashboard_df['Actions'].iloc[0])),
+        ("Tasks", int(dashboard_df['Tasks'].iloc[0])),
+    ]
+
+
+def _report(report_type, metrics, display_df, export_df, column_widths=(3, 1, 1, 1, 1), caption=None):
+    return {
+        'report_type': report_type,
+        'metrics': metrics,
+        'column_widths': list(column_widths),
+        'caption': caption,
+        'display': display_df,
+        'export': export_df,
+        'file_stem': report_type.lower().replace(' ', '_'),
+    }
+
+
+def what_triggers_what_report(conn, database, rule_id=None, outcome=None, jurisdiction=None, matter_type=None,
+                              snapshot=None, connection=None):
+    # connection: context manager factory; when given, a snapshot past its TTL whose watermark
+    # still matches is served while it reloads in the background, and with no snapshot at all
+    # the report is filtered in the database meanwhile
+    if snapshot is None and connection is not None:
+        cached = hierarchy_cache.peek(database, conn)
+        if cached is None or cached.age >= hierarchy_cache.ttl:
+            hierarchy_cache.warm_in_background(database, connection)
+            if cached is None:
+                filtered_df = get_rule_family_report(
+                    conn,
+                    rule_id=rule_id,
+                    outcome=outcome,
+                    jurisdiction=jurisdiction,
+                    matter_type=matter_type
+                )
+                # The query lacks the procedure's trigger conditions, output types and due dates
+                # and numbers families its own way, so it is shown as preliminary and not exported
+                membership = build_membership_index(filtered_df, membership_names(conn))
+                return _report(WHAT_TRIGGERS_WHAT, get_trigger_metrics(filtered_df, membership),
+                               filtered_df.reindex(columns=WTW_COLUMNS), None, caption=PARTIAL_CAPTION)
+            snapshot = cached
+    snapshot = snapshot or get_hierarchy_snapshot(conn, database)
+    results_df = snapshot.df
+    family_index = get_family_index(snapshot)
+    membership = get_membership_index(snapshot, conn)
+
+    with stage('filter') as record:
+        mask = pd.Series(True, index=results_df.index)
+
+        if any([rule_id, outcome]):
+            family_refs = get_family_references(
+                results_df,
+                rule_id=rule_id,
+                outcome=outcome,
+                index=family_index
+            )
+            mask &= results_df['FamilyReference'].isin(family_refs)
+
+        mask &= membership.filter_mask(jurisdiction=jurisdiction, matter_type=matter_type)
+
+        filtered_df = record.set_frame(snapshot.view(mask.to_numpy()))
+
+    metrics = get_trigger_metrics(filtered_df, membership)
+    return _report(WHAT_TRIGGERS_WHAT, metrics, filtered_df.reindex(columns=WTW_COLUMNS), filtered_df)
+
+
+def bulk_calculate_report(conn, database, requests_df, snapshot=None):
+    filtered_df = get_bulk_calculated_rule_data(conn, requests_df, snapshot=snapshot, database=database)
+    metrics = [
+        ("Matters", requests_df['MatterRef'].nunique()),
+        ("Input Rows", len(requests_df)),
+        ("Calculated Rows", len(filtered_df)),
+        ("Issues", int(filtered_df[ISSUES_COLUMN].notna().sum())),
+    ]
+    return _report(CALCULATE_RULE, metrics, filtered_df, filtered_df, column_widths=(1, 1, 1, 1, 1))
+
+
+def calculate_rule_report(conn, database, rule_id=None, trigger_date=None, jurisdiction=None, matter_type=None,
+                          snapshot=None):
+    snapshot = snapshot or get_hierarchy_snapshot(conn, database)
+    membership = get_membership_index(snapshot, conn)
+    filtered_df = get_calculated_rule_data(
+        conn, rule_id, trigger_date,
+        jurisdiction=jurisdiction, matter_type=matter_type, snapshot=snapshot
+    )
+
+    metrics = get_trigger_metrics(filtered_df, membership)
+    display_df = filtered_df
+    if not filtered_df.empty:
+        # Create display dataframe with base date column
+        display_df = filtered_df[[
+            'FamilyReference', 'RuleID', 'RuleType', 'RuleName',
+            'Output Type', 'Outcome'
+        ]].copy()
+
+        # Add Base Date before calculated dates
+        display_df['Base Date'] = pd.Timestamp(trigger_date).strftime('%Y-%m-%d')
+        display_df['Calculated_Due_Date'] = filtered_df['Calculated_Due_Date']
+        display_df['Calculated_Final_Due_Date'] = filtered_df['Calculated_Final_Due_Date']
+        if filtered_df[ISSUES_COLUMN].notna().any():
+            display_df[ISSUES_COLUMN] = filtered_df[ISSUES_COLUMN]
+
+        # Format dates for display
+        for date_col in ['Calculated_Due_Date', 'Calculated_Final_Due_Date']:
+            display_df[date_col] = pd.to_datetime(
+                display_df[date_col]).dt.strftime('%Y-%m-%d')
+    return _report(CALCULATE_RULE, metrics, display_df, filtered_df)
+
+
+def release_notes_report(conn, database, jurisdiction=None, matter_type=None, from_date=None, to_date=None,
+                         release_notes=None):
+    # release_notes: a mirror.ReleaseNotesIndex; the local mirror's is used when it has synced
+    if release_notes is None and MIRROR_ENABLED:
+        release_notes = get_mirror(database).release_notes()
+    release_filters = dict(
+        jurisdiction=jurisdiction if jurisdiction != 'All' else None,
+        matter_type=matter_type if matter_type else None,
+        from_date=from_date,
+        to_date=to_date
+    )
+    if release_notes is not None:
+        # Served from the local mirror; only changed rows cross the WAN on sync
+        with stage('filter') as record:
+            filtered_df = record.set_frame(release_notes.query(**release_filters))
+    else:
+        filtered_df = get_release_notes_data(conn, **release_filters)
+
+    metrics = get_release_metrics(filtered_df, from_date, to_date)
+    return _report(RELEASE_NOTES, metrics, filtered_df[RELEASE_NOTES_COLUMNS], filtered_df,
+                   column_widths=(3, 1, 1, 1, 1))
+
+
+def get_impact_data(conn, rule_ids, database=None, impact=None):
+    # Every chain at or below the changed rules in the full rule graph, with the nearest changed
+    # rule and its depth; impact: a GraphImpact, loaded for the database when not given
+    impact = impact or get_graph_impact(conn, database)
+    with stage('impact closure') as record:
+        impact_df = impact.affected_rows(rule_ids)
+        return record.set_frame(impact_df.sort_values(['FamilyReference', 'Level', 'Depth'], kind='stable'))
+
+
+def release_impact_report(conn, database, jurisdiction=None, matter_type=None, from_date=None, to_date=None,
+                          view=AFFECTED_CHAINS, impact=None, release_notes=None):
+    # The rules changed in the release window, traced down their families in the rule graph
+    changed = release_notes_report(conn, database, jurisdiction=jurisdiction, matter_type=matter_type,
+                                   from_date=from_date, to_date=to_date, release_notes=release_notes)['export']
+    rule_ids = changed['QA Rule ID'].dropna().unique()
+    impact_df = get_impact_data(conn, rule_ids, database=database, impact=impact)
+
+    metrics = []
+    if not impact_df.empty:
+        metrics = [
+            ("Changed Rules", len(rule_ids)),
+            ("Affected Families", impact_df['FamilyReference'].nunique()),
+            ("Affected Chains", len(impact_df)),
+            ("Dependent Rules", impact_df.loc[impact_df['Depth'] > 0, 'RuleID'].nunique()),
+            ("Max Depth", int(impact_df['Depth'].max())),
+        ]
+    caption = ("Traced through the full rule graph, beyond the What Triggers What level limit. Depth 0 is "
+               "the changed rule itself, 1 the rules it triggers directly, and so on.")
+    if view == AFFECTED_FAMILIES:
+        display_df = family_summary(impact_df)
+        report = _report(RELEASE_NOTES, metrics, display_df, display_df, column_widths=(1, 1, 1, 1, 1),
+                         caption=caption)
+    else:
+        report = _report(RELEASE_NOTES, metrics, impact_df[IMPACT_COLUMNS], impact_df,
+                         column_widths=(1, 1, 1, 1, 1), caption=caption)
+    report['file_stem'] = f"release_impact_{view.split()[-1]}"
+    return report
+
+
+def rule_diff_report(qa_connection, prod_connection):
+    # connections: context manager factories for the QA and production databases
+    diff_df = compare_databases(qa_connection, prod_connection)
+    metrics = []
+    if not diff_df.empty:
+        changes = diff_df['Change'].value_counts()
+        fields = diff_df['Changed Fields'].str.split(', ').explode()
+        fields = fields[fields != ''].value_counts()
+        metrics = [
+            ("Added", int(changes.get(ADDED, 0))),
+            ("Removed", int(changes.get(REMOVED, 0))),
+            ("Changed", int(changes.get(CHANGED, 0))),
+            ("Most Changed Field", fields.index[0] if len(fields) else '-'),
+        ]
+    return _report(RULE_DIFF, metrics, diff_df, diff_df, column_widths=(1, 1, 1, 2),
+                   caption="Rules are matched on the QA rule's ProdId; Rule ID is the production ID.")
+
+
+class ReportJob:
+    def __init__(self, report_type, jurisdiction=None, matter_type=None, from_date=None, to_date=None,
+                 rule_id=None, outcome=None):
+        if report_type not in (WHAT_TRIGGERS_WHAT, RELEASE_NOTES):
+            raise ValueError(f"Batch jobs support {WHAT_TRIGGERS_WHAT} and {RELEASE_NOTES}, not {report_type}")
+        if report_type == RELEASE_NOTES and not (from_date and to_date):
+            raise ValueError("Release Notes jobs need a from and to date")
+        self.report_type = report_type
+        self.jurisdiction = jurisdiction or 'All'
+        self.matter_type = matter_type or None
+        self.from_date = pd.Timestamp(from_date).date() if from_date else None
+        self.to_date = pd.Timestamp(to_date).date() if to_date else None
+        self.rule_id = rule_id or None
+        self.outcome = outcome or None
+
+    @property
+    def name(self):
+        parts = [self.report_type, self.jurisdiction, self.matter_type or 'All matter types']
+        if self.rule_id:
+            parts.append(f"rule {self.rule_id}")
+        if self.outcome:
+            parts.append(f"outcome {self.outcome}")
+        if self.report_type == RELEASE_NOTES:
+            parts.append(f"{self.from_date:%Y-%m-%d} to {self.to_date:%Y-%m-%d}")
+        return ' | '.join(parts)
+
+    def file_name(self, extension):
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', self.name.replace(' | ', '__')).strip('_').lower()
+        return f"{slug}.{extension}"
+
+    def run(self, conn, database, shared):
+        if self.report_type == WHAT_TRIGGERS_WHAT:
+            return what_triggers_what_report(
+                conn, database, rule_id=self.rule_id, outcome=self.outcome,
+                jurisdiction=self.jurisdiction, matter_type=self.matter_type, snapshot=shared.get('snapshot')
+            )
+        return release_notes_report(
+            conn, database, jurisdiction=self.jurisdiction, matter_type=self.matter_type,
+            from_date=self.from_date, to_date=self.to_date, release_notes=shared.get('release_notes')
+        )
+
+
+def load_shared_data(pool, database, jobs, use_mirror=MIRROR_ENABLED):
+    # Loaded once before the jobs start; after this most jobs never touch the database
+    shared = {}
+    report_types = {job.report_type for job in jobs}
+    with pool.connection() as conn:
+        if WHAT_TRIGGERS_WHAT in report_types:
+            snapshot = get_hierarchy_snapshot(conn, database)
+            get_family_index(snapshot)
+            get_membership_index(snapshot, conn)
+            shared['snapshot'] = snapshot
+        if RELEASE_NOTES in report_types and use_mirror:
+            mirror = get_mirror(database)
+            mirror.sync(conn)
+            shared['release_notes'] = mirror.release_notes()
+    return shared
+
+
+def _run_job(pool, database, job, shared, output_dir, extension):
+    started = time.perf_counter()
+    row = {'Job': job.name, 'Rows': None, 'Seconds': None, 'File': None, 'Error': None}
+    try:
+        with trace_search(job.name, database=database, jurisdiction=job.jurisdiction,
+                          matter_type=job.matter_type):
+            needs_db = (job.report_type == WHAT_TRIGGERS_WHAT and 'snapshot' not in shared) or \
+                       (job.report_type == RELEASE_NOTES and 'release_notes' not in shared)
+            if needs_db:
+                with pool.connection() as conn:
+                    result = job.run(conn, database, shared)
+            else:
+                result = job.run(None, database, shared)
+            path = os.path.join(output_dir, job.file_name(extension))
+            with stage('write export'):
+                WRITERS[extension](result['export'], path)
+        row.update({'Rows': len(result['export']), 'File': path})
+    except Exception as e:
+        row['Error'] = str(e)
+    row['Seconds'] = round(time.perf_counter() - started, 3)
+    return row
+
+
+def run_batch(pool, database, jobs, output_dir, export_format='CSV', workers=DEFAULT_WORKERS,
+              use_mirror=MIRROR_ENABLED, progress=None):
+    extension, _ = EXPORT_FORMATS[export_format]
+    os.makedirs(output_dir, exist_ok=True)
+    shared = load_shared_data(pool, database, jobs, use_mirror=use_mirror)
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='report') as executor:
+        futures = [executor.submit(_run_job, pool, database, job, shared, output_dir, extension) for job in jobs]
+        for future in as_completed(futures):
+            row = future.result()
+            rows.append(row)
+            if progress:
+                progress(row, len(rows), len(jobs))
+
+    manifest = pd.DataFrame(rows, columns=['Job', 'Rows', 'Seconds', 'File', 'Error']).sort_values('Job')
+    manifest.to_csv(os.path.join(output_dir, 'manifest.csv'), index=False)
+    return manifest
+
+
+def read_jobs_file(path):
+    # CSV with columns report, jurisdiction, matter_type, from_date, to_date, rule_id, outcome
+    df = pd.read_csv(path, dtype=str).fillna('')
+    df.columns = [column.strip().lower() for column in df.columns]
+    jobs = []
+    for row in df.to_dict('records'):
+        jobs.append(ReportJob(
+            _report_name(row.get('report', '')),
+            jurisdiction=row.get('jurisdiction'), matter_type=row.get('matter_type'),
+            from_date=row.get('from_date'), to_date=row.get('to_date'),
+            rule_id=row.get('rule_id'), outcome=row.get('outcome'),
+        ))
+    return jobs
+
+
+def _report_name(value):
+    names = {'wtw': WHAT_TRIGGERS_WHAT, 'what triggers what': WHAT_TRIGGERS_WHAT,
+             'release-notes': RELEASE_NOTES, 'release notes': RELEASE_NOTES}
+    name = names.get(str(value).strip().lower())
+    if name is None:
+        raise ValueError(f"Unknown report '{value}', use wtw or release-notes")
+    return name
+
+
+def build_jobs(reports, jurisdictions, matter_types, from_date=None, to_date=None):
+    return [
+        ReportJob(report, jurisdiction=jurisdiction, matter_type=matter_type, from_date=from_date, to_date=to_date)
+        for report in reports
+        for jurisdiction in jurisdictions
+        for matter_type in matter_types
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate report packs without the Streamlit UI")
+    parser.add_argument('--database', required=True)
+    parser.add_argument('--username', default=os.environ.get('DB_USERNAME'))
+    parser.add_argument('--reports', nargs='+', choices=['wtw', 'release-notes'], default=['wtw', 'release-notes'])
+    parser.add_argument('--jurisdictions', nargs='+', default=['all'],
+                        help="jurisdiction names, 'all' for every jurisdiction, 'All' for one unfiltered report")
+    parser.add_argument('--matter-types', nargs='+', default=[''], help="matter types; omit for all matter types")
+    parser.add_argument('--from-date', help="Release Notes start date (default: 30 days ago)")
+    parser.add_argument('--to-date', help="Release Notes end date (default: today)")
+    parser.add_argument('--jobs-file', help="CSV of jobs instead of the report/jurisdiction/matter type grid")
+    parser.add_argument('--output-dir', default='reports')
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='CSV')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-connections', type=int, default=4)
+    parser.add_argument('--no-mirror', action='store_true', help="query Release Notes from the database")
+    args = parser.parse_args(argv)
+
+    username = args.username or input("Username: ")
+    password = os.environ.get('DB_PASSWORD') or getpass.getpass("Password: ")
+    pool = get_connection_pool(username, password, args.database, max_size=args.max_connections)
+
+    if args.jobs_file:
+        jobs = read_jobs_file(args.jobs_file)
+    else:
+        jurisdictions = args.jurisdictions
+        if jurisdictions == ['all']:
+            with pool.connection() as conn:
+                jurisdictions = list(get_jurisdictions(conn)['Name'])
+        to_date = args.to_date or date.today().isoformat()
+        from_date = args.from_date or (pd.Timestamp(to_date) - timedelta(days=30)).date().isoformat()
+        reports = [_report_name(report) for report in args.reports]
+        jobs = build_jobs(reports, jurisdictions, args.matter_types, from_date, to_date)
+
+    def progress(row, done, total):
+        status = f"failed: {row['Error']}" if row['Error'] else f"{row['Rows']:,} rows"
+        print(f"[{done}/{total}] {row['Job']} ({row['Seconds']:.1f}s, {status})")
+
+    started = time.perf_counter()
+    manifest = run_batch(pool, args.database, jobs, args.output_dir, export_format=args.format,
+                         workers=args.workers, use_mirror=MIRROR_ENABLED and not args.no_mirror,
+                         progress=progress)
+    failed = manifest['Error'].notna().sum()
+    print(f"{len(manifest) - failed} of {len(manifest)} reports written to {args.output_dir} "
+          f"in {time.perf_counter() - started:.1f}s")
+    pool.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import read_sql, stage
+from query_handler import get_rule_set_version
+
+QA_DATABASE = 'lumenip-IPRulesEngineQA1'
+PROD_DATABASE = 'IPRulesEngine'
+DIFF_QUERIES = {
+    'rules': "SELECT * FROM tblRuleDefination",
+    'outcomes': "SELECT [Rule], Label FROM tblOutcomes",
+    'conditions': "SELECT [Rule], Value FROM tblConditions",
+}
+# Keys and timestamps differ between the databases by design
+IGNORED_FIELDS = ('ID', 'ProdId', 'ModifiedOn')
+DIFF_COLUMNS = ['Change', 'QA Rule ID', 'Rule ID', 'Rule Name', 'Changed Fields', 'QA Modified On',
+                'Prod Modified On']
+ADDED = 'Added'
+REMOVED = 'Removed'
+CHANGED = 'Changed'
+
+# Both databases' tables are read side by side, each on its own pooled connection
+_executor = ThreadPoolExecutor(max_workers=6, thread_name_prefix='rule-diff')
+_hashes = {}
+_hashes_lock = threading.Lock()
+
+
+def _field_hashes(values):
+    # Equal values hash equally however the driver typed the column (1 and 1.0, None and NaN)
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        values = values.astype(np.float64)
+    elif not pd.api.types.is_datetime64_any_dtype(values):
+        values = values.astype(object).where(values.notna(), None)
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+def _child_hashes(children, key, value, ids):
+    # Order-independent hash of each rule's child rows: the wrapping sum of their value hashes
+    result = np.zeros(len(ids), dtype=np.uint64)
+    positions = pd.Index(ids).get_indexer(children[key])
+    found = positions >= 0
+    np.add.at(result, positions[found], _field_hashes(children[value])[found])
+    return result
+
+
+class RuleHashes:
+    # One database's rule set as a matrix of per-field content hashes, one row per rule;
+    # a rule's outcome labels and condition values count as two more fields
+    def __init__(self, rules, outcomes, conditions, version=None):
+        self.version = version
+        self.ids = rules['ID'].to_numpy()
+        self.prod_ids = pd.to_numeric(rules['ProdId'], errors='coerce').to_numpy(dtype=np.float64) \
+            if 'ProdId' in rules else np.full(len(rules), np.nan)
+        self.names = rules['Activity'].to_numpy(dtype=object)
+        self.modified_on = pd.to_datetime(rules['ModifiedOn']).to_numpy() if 'ModifiedOn' in rules \
+            else np.full(len(rules), np.datetime64('NaT'))
+
+        columns = [column for column in rules.columns if column not in IGNORED_FIELDS]
+        self.fields = columns + ['Outcomes', 'Conditions']
+        self.hashes = np.column_stack(
+            [_field_hashes(rules[column]) for column in columns]
+            + [_child_hashes(outcomes, 'Rule', 'Label', self.ids),
+               _child_hashes(conditions, 'Rule', 'Value', self.ids)])
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def diff_rule_sets(qa, prod):
+    # Hash join of QA ProdId to production ID. Rules without a production counterpart were
+    # added in QA, production rules no QA rule points at were removed; fields only one of the
+    # databases has are not compared
+    fields = [field for field in qa.fields if field in prod.fields]
+    qa_columns = [qa.fields.index(field) for field in fields]
+    prod_columns = [prod.fields.index(field) for field in fields]
+
+    positions = pd.Index(prod.ids).get_indexer(qa.prod_ids)
+    matched = np.flatnonzero(positions >= 0)
+    differs = qa.hashes[matched][:, qa_columns] != prod.hashes[positions[matched]][:, prod_columns]
+    changed = differs.any(axis=1)
+    added = np.flatnonzero(positions < 0)
+    removed = np.ones(len(prod), dtype=bool)
+    removed[positions[matched]] = False
+    removed = np.flatnonzero(removed)
+
+    qa_rows = np.concatenate([added, np.full(len(removed), -1), matched[changed]])
+    prod_rows = np.concatenate([np.full(len(added), -1), removed, positions[matched[changed]]])
+    field_names = np.array(fields, dtype=object)
+
+    def take(values, rows, missing):
+        # Row -1, no rule on that side, reads the appended missing value
+        return np.append(values, missing)[rows]
+
+    return pd.DataFrame({
+        'Change': [ADDED] * len(added) + [REMOVED] * len(removed) + [CHANGED] * int(changed.sum()),
+        'QA Rule ID': take(qa.ids.astype(object), qa_rows, None),
+        'Rule ID': take(prod.ids.astype(object), prod_rows, None),
+        'Rule Name': np.where(qa_rows >= 0, take(qa.names, qa_rows, None), take(prod.names, prod_rows, None)),
+        'Changed Fields': [''] * (len(added) + len(removed))
+                          + [', '.join(field_names[row]) for row in differs[changed]],
+        'QA Modified On': take(qa.modified_on, qa_rows, np.datetime64('NaT')),
+        'Prod Modified On': take(prod.modified_on, prod_rows, np.datetime64('NaT')),
+    }, columns=DIFF_COLUMNS)
+
+
+def _version(connection):
+    with connection() as conn:
+        return get_rule_set_version(conn)
+
+
+def _read(connection, sql, name):
+    with connection() as conn:
+        return read_sql(sql, conn, name=name)
+
+
+def compare_databases(qa_connection, prod_connection, qa_database=QA_DATABASE, prod_database=PROD_DATABASE):
+    # connections: context manager factories such as ConnectionPool.connection. A database's
+    # hashes from an earlier diff are reused while its rule set version is unchanged
+    connections = {qa_database: qa_connection, prod_database: prod_connection}
+    with stage('rule set versions'):
+        versions = {database: _executor.submit(_version, connection)
+                    for database, connection in connections.items()}
+        versions = {database: future.result() for database, future in versions.items()}
+    with _hashes_lock:
+        hashes = {database: _hashes.get(database) for database in connections}
+    stale = [database for database in connections
+             if hashes[database] is None or hashes[database].version != versions[database]]
+
+    with stage('rule set load') as record:
+        reads = {(database, name): _executor.submit(_read, connections[database], sql, f"{database} {name}")
+                 for database in stale for name, sql in DIFF_QUERIES.items()}
+        tables = {key: future.result() for key, future in reads.items()}
+        record.rows = sum(len(df) for df in tables.values())
+    with stage('rule set hashes'):
+        for database in stale:
+            hashes[database] = RuleHashes(version=versions[database],
+                                          **{name: tables[database, name] for name in DIFF_QUERIES})
+            with _hashes_lock:
+                _hashes[database] = hashes[database]
+
+    with stage('rule set diff') as record:
+        return record.set_frame(diff_rule_sets(hashes[qa_database], hashes[prod_database]))
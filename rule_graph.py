@@ -0,0 +1,219 @@
+import networkx as nx
+import pandas as pd
+
+from instrumentation import read_sql
+from query_handler import fetch_for_ids
+
+RULES_QUERY = "SELECT ID, Activity, Jurisdiction, MatterType, Active FROM tblRuleDefination"
+OUTCOMES_QUERY = "SELECT [Rule], Label FROM tblOutcomes"
+CONDITIONS_QUERY = "SELECT [Rule], Value FROM tblConditions"
+COUNTRIES_QUERY = "SELECT ID, Name FROM tblCountryMaster"
+
+# Same labels as the CASE expression in query_handler.get_rule_families
+MATTER_TYPE_NAMES = {
+    '1': 'Patent',
+    '2': 'Trademark',
+    '3': 'Design',
+    '4': 'Utility Model',
+    '5': 'Domain Name',
+    '6': 'Unitary Patent',
+}
+FAMILY_COLUMNS = ['FamilyReference', 'RuleID', 'ChainPath', 'RuleName', 'Level', 'Jurisdictions', 'MatterType']
+
+
+def _split_items(value):
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return []
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+class RuleGraphEngine:
+    # In-memory ValidConnections graph; families, levels and chain paths have no depth limit
+    def __init__(self, rules, outcomes, conditions, countries):
+        self.rules = rules.reset_index(drop=True)
+        self.outcomes = outcomes.reset_index(drop=True)
+        self.conditions = conditions.reset_index(drop=True)
+        self.country_names = dict(zip(countries['ID'].astype(str).str.strip(), countries['Name']))
+
+        self.graph = nx.DiGraph()
+        self.names = {}
+        self.attributes = {}
+        self.jurisdiction_text = {}
+        self.matter_type_text = {}
+        self.family_rows = {}
+        self.rule_roots = {}
+        self.roots = []
+        self.cycles = []
+
+        self._update_rule_data(self.rules)
+        self._connect()
+        self.roots = self._find_roots()
+        for root in self.roots:
+            self._enumerate(root)
+
+    @classmethod
+    def load(cls, conn):
+        return cls(
+            read_sql(RULES_QUERY, conn, name='rule graph rules'),
+            read_sql(OUTCOMES_QUERY, conn, name='rule graph outcomes'),
+            read_sql(CONDITIONS_QUERY, conn, name='rule graph conditions'),
+            read_sql(COUNTRIES_QUERY, conn, name='rule graph countries'),
+        )
+
+    def _update_rule_data(self, rules):
+        active = rules['Active'].fillna(0).astype(int) == 1
+        for rule_id in rules.loc[~active, 'ID']:
+            self._remove_rule(rule_id)
+
+        for row in rules[active].itertuples(index=False):
+            jurisdictions = _split_items(row.Jurisdiction)
+            matter_types = _split_items(row.MatterType)
+            self.graph.add_node(row.ID)
+            self.names[row.ID] = row.Activity
+            self.attributes[row.ID] = frozenset((j, m) for j in jurisdictions for m in matter_types)
+            if not matter_types:
+                jurisdictions = []
+            if not jurisdictions:
+                matter_types = []
+            names = sorted({self.country_names[j] for j in jurisdictions if j in self.country_names})
+            self.jurisdiction_text[row.ID] = ', '.join(names) or None
+            labels = sorted({MATTER_TYPE_NAMES.get(m, m) for m in matter_types})
+            self.matter_type_text[row.ID] = ', '.join(labels) or None
+
+    def _remove_rule(self, rule_id):
+        if rule_id in self.graph:
+            self.graph.remove_node(rule_id)
+        for store in (self.names, self.attributes, self.jurisdiction_text, self.matter_type_text):
+            store.pop(rule_id, None)
+
+    def _candidate_edges(self, rule_ids=None):
+        outcomes = self.outcomes.rename(columns={'Rule': 'ParentRuleID'})
+        conditions = self.conditions.rename(columns={'Rule': 'ChildRuleID'})
+        if rule_ids is None:
+            pairs = outcomes.merge(conditions, left_on='Label', right_on='Value')
+        else:
+            ids = list(rule_ids)
+            pairs = pd.concat([
+                outcomes[outcomes['ParentRuleID'].isin(ids)].merge(conditions, left_on='Label', right_on='Value'),
+                outcomes.merge(conditions[conditions['ChildRuleID'].isin(ids)], left_on='Label', right_on='Value'),
+            ])
+        return pairs[['ParentRuleID', 'ChildRuleID']].drop_duplicates().itertuples(index=False)
+
+    def _connect(self, rule_ids=None):
+        # A connection is valid when both rules share a jurisdiction/matter type pair
+        restrict = None if rule_ids is None else set(rule_ids)
+        for parent, child in self._candidate_edges(restrict):
+            if parent not in self.attributes or child not in self.attributes:
+                continue
+            if not self.attributes[parent].isdisjoint(self.attributes[child]):
+                self.graph.add_edge(parent, child)
+
+    def _find_roots(self):
+        return sorted(node for node in self.graph.nodes if self.graph.in_degree(node) == 0)
+
+    def _enumerate(self, root):
+        rows = []
+        stack = [(root, (root,))]
+        while stack:
+            rule_id, path = stack.pop()
+            rows.append((rule_id, ' -> '.join(str(r) for r in path), len(path)))
+            self.rule_roots.setdefault(rule_id, set()).add(root)
+            for child in sorted(self.graph.successors(rule_id), reverse=True):
+                if child in path:
+                    self.cycles.append(path + (child,))
+                    continue
+                stack.append((child, path + (child,)))
+        self.family_rows[root] = rows
+
+    def _drop_family(self, root):
+        for rule_id, _, _ in self.family_rows.pop(root, []):
+            roots = self.rule_roots.get(rule_id)
+            if roots is not None:
+                roots.discard(root)
+                if not roots:
+                    del self.rule_roots[rule_id]
+        self.cycles = [cycle for cycle in self.cycles if cycle[0] != root]
+
+    def apply_changes(self, rules, outcomes, conditions, rule_ids):
+        # Replace the rows of the changed rules and recompute only the families that touch them
+        rule_ids = set(rule_ids)
+        affected = set()
+        for rule_id in rule_ids:
+            affected |= self.rule_roots.get(rule_id, set())
+
+        self.rules = pd.concat([self.rules[~self.rules['ID'].isin(rule_ids)], rules], ignore_index=True)
+        self.outcomes = pd.concat([self.outcomes[~self.outcomes['Rule'].isin(rule_ids)], outcomes], ignore_index=True)
+        self.conditions = pd.concat([self.conditions[~self.conditions['Rule'].isin(rule_ids)], conditions],
+                                    ignore_index=True)
+
+        present = [r for r in rule_ids if r in self.graph]
+        self.graph.remove_edges_from(list(self.graph.in_edges(present)) + list(self.graph.out_edges(present)))
+        for rule_id in rule_ids - set(rules['ID']):
+            self._remove_rule(rule_id)
+        self._update_rule_data(self.rules[self.rules['ID'].isin(rule_ids)])
+        self._connect(rule_ids)
+
+        old_roots = set(self.roots)
+        self.roots = self._find_roots()
+        new_roots = set(self.roots)
+        affected |= new_roots - old_roots
+        for rule_id in rule_ids:
+            if rule_id in self.graph:
+                affected |= (nx.ancestors(self.graph, rule_id) | {rule_id}) & new_roots
+
+        for root in affected | (old_roots - new_roots):
+            self._drop_family(root)
+        for root in affected & new_roots:
+            self._enumerate(root)
+        return affected
+
+    def refresh(self, conn, rule_ids):
+        rule_ids = list(rule_ids)
+        return self.apply_changes(
+            fetch_for_ids(conn, RULES_QUERY, 'ID', rule_ids),
+            fetch_for_ids(conn, OUTCOMES_QUERY, '[Rule]', rule_ids),
+            fetch_for_ids(conn, CONDITIONS_QUERY, '[Rule]', rule_ids),
+            rule_ids,
+        )
+
+    def refresh_since(self, conn, watermark):
+        # Rules modified at or after watermark (a MAX(ModifiedOn) of an earlier load) and rules
+        # deleted since; >= re-pulls rows stamped exactly at the watermark, which is idempotent
+        changed = read_sql("SELECT ID FROM tblRuleDefination WHERE ModifiedOn >= ?", conn,
+                           params=[pd.Timestamp(watermark).to_pydatetime()], name='rule graph changed rules')
+        current = read_sql("SELECT ID FROM tblRuleDefination", conn, name='rule graph rule IDs')
+        rule_ids = set(changed['ID']) | (set(self.rules['ID']) - set(current['ID']))
+        return self.refresh(conn, rule_ids) if rule_ids else set()
+
+    def families(self, filters=None):
+        references = []
+        rule_ids = []
+        chain_paths = []
+        levels = []
+        for number, root in enumerate(self.roots, start=1):
+            reference = f"RF-{number:05d}"
+            for rule_id, chain_path, level in self.family_rows.get(root, []):
+                references.append(reference)
+                rule_ids.append(rule_id)
+                chain_paths.append(chain_path)
+                levels.append(level)
+
+        df = pd.DataFrame({
+            'FamilyReference': references,
+            'RuleID': rule_ids,
+            'ChainPath': chain_paths,
+            'Level': levels,
+        })
+        df['RuleName'] = df['RuleID'].map(self.names)
+        df['Jurisdictions'] = df['RuleID'].map(self.jurisdiction_text)
+        df['MatterType'] = df['RuleID'].map(self.matter_type_text)
+
+        if filters:
+            # LIKE '%value%' under a case-insensitive collation
+            if filters.get('matter_type'):
+                df = df[df['MatterType'].str.contains(filters['matter_type'], case=False, regex=False, na=False)]
+            if filters.get('jurisdiction'):
+                df = df[df['Jurisdictions'].str.contains(filters['jurisdiction'], case=False, regex=False, na=False)]
+
+        return df.sort_values(['FamilyReference', 'Level'], kind='stable')[FAMILY_COLUMNS].reset_index(drop=True)
+
@@ -0,0 +1,221 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+SEARCH_LIMIT = 50
+# Trigrams found in more than this share of rules barely narrow a search and are skipped
+# when the query has rarer ones
+COMMON_TRIGRAM_SHARE = 0.2
+# Share of the query's trigrams a rule needs to be a fuzzy match
+MIN_TRIGRAM_SCORE = 0.5
+# Changed rules go to a small delta segment until they exceed this share of the base
+MAX_DELTA_SHARE = 0.1
+
+# Score weights; every exact or prefix match outranks any purely fuzzy one
+EXACT_ID = 100.0
+NAME_PREFIX = 40.0
+WORD_PREFIX = 30.0
+NAME_WORDS = 15.0
+TRIGRAM = 25.0
+LAST_CODE_POINT = '\U0010ffff'
+SEPARATORS = r'[\W_]+'
+
+
+def normalize(values):
+    # Lower case, punctuation to single spaces, padded so words start and end with a space
+    text = pd.Series(values, dtype=object).fillna('').astype(str).str.lower()
+    return ' ' + text.str.replace(SEPARATORS, ' ', regex=True).str.strip() + ' '
+
+
+def normalize_query(query):
+    # normalize() for one string, without the pandas overhead on every keystroke
+    return ' ' + re.sub(SEPARATORS, ' ', str(query).lower()).strip() + ' '
+
+
+def _trigram_codes(texts):
+    # Every trigram as one int64 (three 21-bit code points) with the position of its text
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    chars = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    owners = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    if len(chars) < 3:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    codes = (chars[:-2] << 42) | (chars[1:-1] << 21) | chars[2:]
+    inside = owners[:-2] == owners[2:]
+    return codes[inside], owners[:-2][inside]
+
+
+def _csr(keys, positions, n_keys):
+    # Postings grouped by key code: positions[offsets[k]:offsets[k + 1]] for key k
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+    return offsets, positions[order].astype(np.int32)
+
+
+def documents(rule_options):
+    # One row per rule: display name, searchable name (ID and Activity) and full text (plus outcomes)
+    options = rule_options.dropna(subset=['ID'])
+    rules = options.drop_duplicates('ID').set_index('ID')
+    labels = options.dropna(subset=['Outcome']).drop_duplicates(['ID', 'Outcome'])
+    outcomes = {}
+    for rule_id, label in zip(labels['ID'].tolist(), normalize(labels['Outcome'].to_numpy()).tolist()):
+        outcomes[rule_id] = outcomes.get(rule_id, '') + label[1:]
+    name = ' ' + rules.index.astype(str) + normalize(rules['Activity'].to_numpy()).to_numpy()
+    return pd.DataFrame({
+        'DisplayName': rules['DisplayName'].to_numpy(),
+        'Name': name,
+        'Text': name + pd.Index(rules.index.map(outcomes)).fillna(''),
+    }, index=rules.index)
+
+
+class _WordIndex:
+    # Sorted vocabulary with the rules using each word; a prefix is one contiguous range
+    def __init__(self, texts):
+        n = max(len(texts), 1)
+        words = pd.Series(texts, dtype=object).str.split().explode().dropna()
+        word_codes, vocabulary = pd.factorize(words)
+        order = np.argsort(np.asarray(vocabulary, dtype=object))
+        self.words = np.asarray(vocabulary, dtype=object)[order]
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        # (word, rule) pairs deduplicated and sorted in one go as word * n + rule
+        pairs = np.unique(rank[word_codes] * n + words.index.to_numpy())
+        self.offsets, self.docs = _csr(pairs // n, pairs % n, len(self.words))
+
+    def prefix_mask(self, tokens, size):
+        # Rules where every token starts one of their words
+        matched = np.zeros(size, dtype=np.int32)
+        for token in tokens:
+            start = np.searchsorted(self.words, token, side='left')
+            end = np.searchsorted(self.words, token + LAST_CODE_POINT, side='left')
+            hits = np.zeros(size, dtype=bool)
+            hits[self.docs[self.offsets[start]:self.offsets[end]]] = True
+            matched += hits
+        return matched == len(tokens)
+
+
+class _Segment:
+    # Immutable word-prefix and trigram index over a set of rule documents
+    def __init__(self, docs):
+        self.ids = docs.index.to_numpy()
+        self.positions = {rule_id: position for position, rule_id in enumerate(docs.index.astype(str))}
+        self.display = docs['DisplayName'].to_numpy(dtype=object)
+        self.names = docs['Name'].to_numpy(dtype=object)
+        # Among equal scores shorter display names rank first
+        self.length_penalty = (docs['DisplayName'].astype(str).str.len().to_numpy() * 1e-3).astype(np.float32)
+        texts = docs['Text'].tolist()
+        n = max(len(texts), 1)
+
+        self.name_words = _WordIndex(docs['Name'].tolist())
+        self.text_words = _WordIndex(texts)
+
+        codes, owners = _trigram_codes(texts)
+        trigram_codes, trigrams = pd.factorize(codes)
+        pairs = np.unique(trigram_codes * n + owners)
+        self.trigrams = {code: position for position, code in enumerate(trigrams.tolist())}
+        self.trigram_offsets, self.trigram_docs = _csr(pairs // n, pairs % n, len(trigrams))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, query, tokens, query_trigrams):
+        score = np.zeros(len(self), dtype=np.float32)
+        if not len(self):
+            return score
+
+        # Prefix: every query word starts a word of the rule's ID, name or outcomes
+        score += np.where(self.text_words.prefix_mask(tokens, len(self)), np.float32(WORD_PREFIX), np.float32(0))
+        score += np.where(self.name_words.prefix_mask(tokens, len(self)), np.float32(NAME_WORDS), np.float32(0))
+
+        # Fuzzy: share of the query's trigrams found in the rule
+        postings = [(self.trigram_offsets[code], self.trigram_offsets[code + 1])
+                    for code in (self.trigrams.get(trigram) for trigram in query_trigrams) if code is not None]
+        if postings:
+            selective = [(start, end) for start, end in postings if end - start <= COMMON_TRIGRAM_SHARE * len(self)]
+            used = selective or postings
+            total = len(used) if selective else len(query_trigrams)
+            hits = np.bincount(np.concatenate([self.trigram_docs[start:end] for start, end in used]),
+                               minlength=len(self))
+            close = np.flatnonzero(hits >= MIN_TRIGRAM_SCORE * total)
+            score[close] += TRIGRAM * hits[close] / total
+
+        position = self.positions.get(query.strip())
+        if position is not None:
+            score[position] += EXACT_ID
+        return score
+
+
+class RuleSearchIndex:
+    # Ranked lookups over rule ID, Activity and outcome labels. A base segment plus a small
+    # delta segment of rules changed since it was built; updated() only re-indexes those
+    def __init__(self, rule_options=None, docs=None):
+        self.docs = documents(rule_options) if docs is None else docs
+        self.base = _Segment(self.docs)
+        self.base_docs = self.docs
+        self.base_live = np.ones(len(self.base), dtype=bool)
+        self.delta = None
+
+    def __len__(self):
+        return len(self.docs)
+
+    def updated(self, rule_options):
+        # Index for new master data; this index is left untouched for readers still using it
+        docs = documents(rule_options)
+        base_docs = self.base_docs.reindex(docs.index)
+        changed = ~((base_docs['Text'] == docs['Text']) & (base_docs['DisplayName'] == docs['DisplayName']))
+        if changed.sum() > MAX_DELTA_SHARE * max(len(self.base), 1):
+            return RuleSearchIndex(docs=docs)
+
+        index = RuleSearchIndex.__new__(RuleSearchIndex)
+        index.docs = docs
+        index.base = self.base
+        index.base_docs = self.base_docs
+        # Rules removed or changed since the base was built are hidden there
+        index.base_live = np.isin(self.base.ids, docs.index[~changed].to_numpy())
+        index.delta = _Segment(docs[changed]) if changed.any() else None
+        return index
+
+    def _segments(self):
+        segments = [(self.base, self.base_live)]
+        if self.delta is not None:
+            segments.append((self.delta, np.ones(len(self.delta), dtype=bool)))
+        return segments
+
+    def allowed(self, rule_ids):
+        # Per-segment masks for search(); worth caching per filter, they cost more than a search
+        return [live & np.isin(segment.ids, rule_ids) for segment, live in self._segments()]
+
+    def search(self, query, limit=SEARCH_LIMIT, allowed=None):
+        # allowed: masks from allowed() restricting results, e.g. to a jurisdiction/matter type
+        text = normalize_query(query)
+        tokens = text.split()
+        if not tokens:
+            return pd.DataFrame(columns=['ID', 'DisplayName', 'Score'])
+        query_trigrams = sorted(set(_trigram_codes([text])[0].tolist()))
+
+        segments = self._segments()
+        masks = allowed if allowed is not None else [live for _, live in segments]
+        results = []
+        for (segment, _), mask in zip(segments, masks):
+            score = segment.scores(text, tokens, query_trigrams)
+            # Any match scores far above the penalty, so only matches stay positive
+            score = np.where(mask & (score > 0), score - segment.length_penalty, np.float32(0))
+            candidates = np.flatnonzero(score)
+            if len(candidates) > limit * 4:
+                candidates = candidates[np.argpartition(-score[candidates], limit * 4)[:limit * 4]]
+            for position in candidates.tolist():
+                # Names starting with the query come first among otherwise equal matches
+                name = segment.names[position]
+                bonus = NAME_PREFIX if name[name.index(' ', 1):].startswith(text.rstrip()) else 0.0
+                results.append((segment.ids[position], segment.display[position],
+                                float(score[position]) + bonus))
+
+        results.sort(key=lambda row: (-row[2], str(row[1])))
+        return pd.DataFrame(results[:limit], columns=['ID', 'DisplayName', 'Score'])
+
+
+def build_rule_search(rule_options, previous=None):
+    if previous is None:
+        return RuleSearchIndex(rule_options)
+    return previous.updated(rule_options)
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from compact_snapshot import COMPACT_ENABLED, CompactHierarchy, add_index_memory, memory_report
+from instrumentation import read_sql, stage
+
+HIERARCHY_QUERY = "EXEC dbo.RuleHierarchyReport"
+WATERMARK_QUERY = "SELECT MAX(ModifiedOn) FROM tblRuleDefination"
+
+# Seconds a snapshot may be served before it is reloaded unconditionally
+DEFAULT_TTL = float(os.environ.get('RULE_HIERARCHY_TTL', 900))
+# Seconds between MAX(ModifiedOn) checks while a snapshot is still within its TTL
+DEFAULT_WATERMARK_INTERVAL = float(os.environ.get('RULE_HIERARCHY_WATERMARK_INTERVAL', 30))
+
+
+class HierarchySnapshot:
+    # df is the compact frame (categoricals, int32 IDs, no ChainPath) unless compact is False;
+    # view() gives rows back with the report's original columns
+    def __init__(self, database, df, watermark, load_seconds=0.0, compact=COMPACT_ENABLED):
+        self.database = database
+        self.chains = None
+        self.memory = None
+        self._compact = None
+        if compact:
+            with stage('compact snapshot') as record:
+                self._compact = CompactHierarchy(df)
+                self.memory = memory_report(df, self._compact)
+                self.chains = self._compact.chains
+                df = record.set_frame(self._compact.frame)
+        self.df = df
+        self.watermark = watermark
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.checked_at = self.loaded_at
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    @property
+    def age(self):
+        return time.time() - self.loaded_at
+
+    def view(self, rows=None, columns=None):
+        # rows: index labels, a boolean mask or None for every row
+        if self._compact is not None:
+            return self._compact.view(rows, columns)
+        df = self.df if rows is None else self.df.loc[rows]
+        return df.copy() if columns is None else df.reindex(columns=columns)
+
+    def derived(self, key, build):
+        # Structures computed from the snapshot (indexes etc.) live and die with it
+        with self._lock:
+            if key not in self._derived:
+                with stage(f"build {key}"):
+                    self._derived[key] = build(self.df)
+                # Indexes that know their size show up in the memory report
+                nbytes = getattr(self._derived[key], 'nbytes', None)
+                if nbytes is not None and self.memory is not None:
+                    self.memory = add_index_memory(self.memory, key, nbytes)
+            return self._derived[key]
+
+
+def _total_mb(snapshot, column):
+    if snapshot is None or snapshot.memory is None:
+        return None
+    return snapshot.memory[column].iloc[-1]
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class HierarchySnapshotCache:
+    def __init__(self, ttl=DEFAULT_TTL, watermark_interval=DEFAULT_WATERMARK_INTERVAL,
+                 query=HIERARCHY_QUERY, watermark_query=WATERMARK_QUERY):
+        self.ttl = ttl
+        self.watermark_interval = watermark_interval
+        self.query = query
+        self.watermark_query = watermark_query
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._inflight = {}
+        self._stats = {}
+
+    def _counters(self, database):
+        if database not in self._stats:
+            self._stats[database] = {
+                'hits': 0, 'misses': 0, 'coalesced': 0,
+                'ttl_expired': 0, 'watermark_changed': 0,
+            }
+        return self._stats[database]
+
+    def _read_watermark(self, conn):
+        cursor = conn.cursor()
+        try:
+            with stage('hierarchy watermark'):
+                row = cursor.execute(self.watermark_query).fetchone()
+        finally:
+            cursor.close()
+        return row[0] if row else None
+
+    def get(self, database, conn):
+        now = time.time()
+        with self._lock:
+            counters = self._counters(database)
+            snapshot = self._snapshots.get(database)
+            if snapshot is not None:
+                if now - snapshot.loaded_at >= self.ttl:
+                    # Left in place until the reload replaces it, so peek() can keep serving it
+                    counters['ttl_expired'] += 1
+                    snapshot = None
+                elif now - snapshot.checked_at < self.watermark_interval:
+                    counters['hits'] += 1
+                    return snapshot
+
+        watermark = self._read_watermark(conn)
+        if snapshot is not None:
+            with self._lock:
+                if watermark == snapshot.watermark:
+                    snapshot.checked_at = now
+                    counters['hits'] += 1
+                    return snapshot
+                counters['watermark_changed'] += 1
+                if self._snapshots.get(database) is snapshot:
+                    del self._snapshots[database]
+
+        return self._load(database, conn, watermark)
+
+    def _load(self, database, conn, watermark):
+        with self._lock:
+            counters = self._counters(database)
+            flight = self._inflight.get(database)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[database] = _Flight()
+            else:
+                counters['coalesced'] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            started = time.perf_counter()
+            # Repeated text arrives as categoricals already when the snapshot is compacted anyway
+            df = read_sql(self.query, conn, name='hierarchy snapshot load', categories=COMPACT_ENABLED)
+            snapshot = HierarchySnapshot(database, df, watermark, time.perf_counter() - started)
+            with self._lock:
+                self._snapshots[database] = snapshot
+                counters['misses'] += 1
+            flight.result = snapshot
+            return snapshot
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[database]
+            flight.event.set()
+
+    def peek(self, database, conn=None):
+        # The current snapshot without loading one. Past its TTL it is still returned while its
+        # watermark matches the one read on conn, so it can be served during a background reload
+        with self._lock:
+            snapshot = self._snapshots.get(database)
+        if snapshot is None or snapshot.age < self.ttl:
+            return snapshot
+        if conn is None or self._read_watermark(conn) != snapshot.watermark:
+            return None
+        return snapshot
+
+    def warm_in_background(self, database, connection):
+        # connection: a context manager factory such as ConnectionPool.connection
+        with self._lock:
+            if database in self._inflight:
+                return
+
+        def load():
+            try:
+                with connection() as conn:
+                    self.get(database, conn)
+            except Exception:
+                # The next search falls back to push-down and tries again
+                pass
+
+        threading.Thread(target=load, name=f"warm-{database}", daemon=True).start()
+
+    def invalidate(self, database=None):
+        with self._lock:
+            if database is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(database, None)
+
+    def stats(self):
+        with self._lock:
+            rows = []
+            for database, counters in self._stats.items():
+                snapshot = self._snapshots.get(database)
+                rows.append({
+                    'Database': database,
+                    **counters,
+                    'rows': len(snapshot.df) if snapshot is not None else 0,
+                    'age_seconds': round(snapshot.age, 1) if snapshot is not None else None,
+                    'load_seconds': round(snapshot.load_seconds, 2) if snapshot is not None else None,
+                    'MB before': _total_mb(snapshot, 'Before MB'),
+                    'MB after': _total_mb(snapshot, 'After MB'),
+                    'watermark': snapshot.watermark if snapshot is not None else None,
+                })
+        return pd.DataFrame(rows)
+
+
+hierarchy_cache = HierarchySnapshotCache()
@@ -0,0 +1,41 @@
+import io
+
+import pandas as pd
+
+from bulk_calculate import calculate_bulk, read_bulk_input
+from due_dates import ISSUES_COLUMN
+from family_index import FamilyIndex
+
+HIERARCHY = pd.DataFrame({
+    'FamilyReference': ['RF-1', 'RF-1', 'RF-2', 'RF-2'],
+    'ChainPath': ['1', '1 -> 2', '3', '3 -> 2'],
+    'RuleID': [1, 2, 3, 2],
+    'RuleType': 'Task',
+    'RuleName': ['a', 'b', 'c', 'd'],
+    'Output Type': 'x',
+    'Outcome': None,
+    'DueDate': ['add 1 month', 'add 2 days', None, 'per local practice'],
+    'FinalDueDate': None,
+})
+
+
+def bulk(upload):
+    requests_df = read_bulk_input(io.StringIO(upload), 'upload.csv')
+    return calculate_bulk(HIERARCHY, FamilyIndex(HIERARCHY), requests_df)
+
+
+def test_rows_keep_upload_order():
+    result = bulk("Matter Ref,Rule ID,Trigger Date\n"
+                  "M1,99,2024-01-01\nM2,[1] a,2024-01-31\nM3,98,2024-01-01\nM4,3,2024-01-31\n")
+    assert result['MatterRef'].tolist() == ['M1', 'M2', 'M2', 'M3', 'M4', 'M4']
+    assert result[ISSUES_COLUMN].tolist()[0] == 'Rule not found in hierarchy'
+    assert result['RuleID'].dtype == 'Int64'
+    assert result['Calculated_Due_Date'].iloc[1] == pd.Timestamp('2024-02-29')
+
+
+def test_missing_trigger_date_keeps_formula_issues():
+    result = bulk("Matter Ref,Rule ID,Trigger Date\nM1,3,not a date\n")
+    assert result[ISSUES_COLUMN].tolist() == [
+        'Invalid or missing trigger date',
+        "DueDate: unrecognised formula 'per local practice'; Invalid or missing trigger date",
+    ]
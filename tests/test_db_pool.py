@@ -0,0 +1,94 @@
+import sqlite3
+import threading
+
+import pytest
+
+from db_pool import ConnectionPool, PoolTimeout, close_all_pools, get_pool
+
+
+def sqlite_pool(**kwargs):
+    return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), **kwargs)
+
+
+def test_released_connection_is_reused():
+    pool = sqlite_pool()
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+    with pool.connection() as again:
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+    assert pool.stats() == {'size': 1, 'idle': 1, 'in_use': 0, 'max_size': 4, 'created': 1, 'recycled': 0}
+
+
+def test_checkout_grows_to_max_size():
+    pool = sqlite_pool(max_size=2)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    assert pool.stats()['in_use'] == 2
+    with pytest.raises(PoolTimeout):
+        pool.acquire(timeout=0.01)
+
+
+@pytest.mark.parametrize('kwargs, timeout, reported', [
+    ({'checkout_timeout': 0.02}, None, '0.02s'),
+    ({'checkout_timeout': 30}, 0.01, '0.01s'),
+])
+def test_timeout_reports_the_timeout_used(kwargs, timeout, reported):
+    pool = sqlite_pool(max_size=1, **kwargs)
+    pool.acquire()
+    with pytest.raises(PoolTimeout, match=reported):
+        pool.acquire(timeout)
+
+
+def test_waiting_checkout_gets_released_connection():
+    pool = sqlite_pool(max_size=1)
+    conn = pool.acquire()
+    timer = threading.Timer(0.05, pool.release, args=(conn,))
+    timer.start()
+    assert pool.acquire(timeout=5) is conn
+    timer.join()
+
+
+def test_failed_health_check_evicts_connection():
+    pool = sqlite_pool()
+    with pool.connection() as conn:
+        pass
+    conn.close()
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert fresh.execute("SELECT 1").fetchone() == (1,)
+    assert pool.stats()['created'] == 2
+    assert pool.stats()['recycled'] == 1
+
+
+def test_idle_connection_expires():
+    pool = sqlite_pool(idle_timeout=-1)
+    with pool.connection() as conn:
+        pass
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert pool.stats()['recycled'] == 1
+
+
+def test_error_rolls_back_and_keeps_connection():
+    pool = sqlite_pool()
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO t VALUES (1)")
+            raise ValueError
+    with pool.connection() as again:
+        assert again is conn
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone() == (0,)
+
+
+def test_get_pool_is_shared_per_login():
+    factory = lambda: sqlite3.connect(':memory:')
+    try:
+        pool = get_pool('user', 'secret', 'db', factory)
+        assert get_pool('user', 'secret', 'db', factory) is pool
+        assert get_pool('user', 'other', 'db', factory) is not pool
+    finally:
+        close_all_pools()
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from due_dates import ISSUES_COLUMN, add_calculated_dates, compile_formula, compute_due_dates
+
+
+@pytest.mark.parametrize('formula, expected', [
+    ('add 2 months', '2025-02-28'),
+    ('add 1 year and 6 months', '2026-06-30'),
+    ('add 4 months - 1 day', '2025-04-29'),
+    ('add 4 months minus 1 day', '2025-04-29'),
+    ('add 1 month + 10 days', '2025-02-10'),
+    ('subtract 1 month and 2 days', '2024-11-28'),
+    ('subtract 7 days', '2024-12-24'),
+    ('add 2 weeks', '2025-01-14'),
+    ('add 2 months.', '2025-02-28'),
+    ('add 2 month(s)', '2025-02-28'),
+    ('add 30 days after grant', '2025-01-30'),
+    ('Deadline: add 1 year, see local rules', '2025-12-31'),
+])
+def test_signed_terms(formula, expected):
+    dates, errors = compute_due_dates('2024-12-31', [formula])
+    assert dates.iloc[0] == pd.Timestamp(expected)
+    assert errors.iloc[0] is None
+
+
+@pytest.mark.parametrize('formula', [
+    'add 1.5 months',
+    '30 days or 2 months whichever later',
+    'add 2 months whichever is earlier',
+    'add 5',
+    'per local practice',
+    'add 3 fortnights',
+    'add 2 months then 3 days',
+    'add 2 months after grant plus 3 days',
+])
+def test_unparsed_text_is_an_issue(formula):
+    compiled = compile_formula(formula)
+    assert not compiled.valid
+    assert compiled.terms == ()
+
+
+@pytest.mark.parametrize('formula, expected', [
+    # Terms apply in written order, so the month clamp depends on where the days fall
+    ('add 1 month + 1 day', '2025-03-01'),
+    ('add 1 day + 1 month', '2025-02-28'),
+    ('add 10 days add 1 month', '2025-03-09'),
+])
+def test_terms_apply_in_written_order(formula, expected):
+    dates, errors = compute_due_dates('2025-01-30', [formula])
+    assert dates.iloc[0] == pd.Timestamp(expected)
+
+
+def test_business_days_follow_earlier_terms():
+    # From Thursday: Friday then Sunday, or Saturday (counted from Monday) then Tuesday
+    dates, _ = compute_due_dates('2025-01-02', ['add 1 business day + 2 days', 'add 2 days + 1 business day'])
+    assert list(dates) == [pd.Timestamp('2025-01-05'), pd.Timestamp('2025-01-07')]
+
+
+def test_issues_column():
+    df = pd.DataFrame({'DueDate': ['add 4 months - 1 day', 'add 1.5 months'],
+                       'FinalDueDate': ['add 6 months', '30 days or 2 months whichever later']})
+    add_calculated_dates(df, '2024-12-31')
+    assert df['Calculated_Due_Date'].iloc[0] == pd.Timestamp('2025-04-29')
+    assert df['Calculated_Due_Date'].isna().iloc[1]
+    assert df['Calculated_Final_Due_Date'].isna().iloc[1]
+    assert pd.isna(df[ISSUES_COLUMN].iloc[0])
+    assert "'1.5'" in df[ISSUES_COLUMN].iloc[1]
+    assert "FinalDueDate: unexpected 'or'" in df[ISSUES_COLUMN].iloc[1]
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from membership import ListSplitter, MembershipMatrix, build_membership_index
+
+NAMES = {
+    'Jurisdictions': ['Korea, Republic of', 'Korea', 'United States', 'WIPO'],
+    'MatterType': ['Patent', 'Trademark'],
+}
+
+
+def hierarchy():
+    return pd.DataFrame({
+        'Jurisdictions': ['Korea, Republic of', 'Korea, Republic of, United States', 'Korea', 'United States, WIPO',
+                          None],
+        'MatterType': ['Patent', 'Patent, Trademark', 'Trademark', 'Patent', None],
+    })
+
+
+def test_known_names_keep_their_commas():
+    split = ListSplitter(NAMES['Jurisdictions'])
+    assert split('Korea, Republic of, United States') == ['Korea, Republic of', 'United States']
+    assert split('Korea, United States') == ['Korea', 'United States']
+    assert split('Unknown, Place') == ['Unknown', 'Place']
+    assert split(None) == []
+
+
+def test_filter_mask_with_comma_name():
+    df = hierarchy()
+    for values in (df, df.astype('category')):
+        index = build_membership_index(values, NAMES)
+        assert list(index.filter_mask(jurisdiction='Korea, Republic of')) == [True, True, False, False, False]
+        assert list(index.filter_mask(jurisdiction='korea')) == [False, False, True, False, False]
+        assert list(index.filter_mask(jurisdiction='Korea, Republic of', matter_type='Trademark')) == \
+            [False, True, False, False, False]
+
+
+def test_labels_present_are_whole_names():
+    index = build_membership_index(hierarchy(), NAMES)
+    assert index.labels_present('Jurisdictions') == ['Korea', 'Korea, Republic of', 'United States', 'WIPO']
+    assert index.labels_present('Jurisdictions', pd.Index([0, 4])) == ['Korea, Republic of']
+
+
+def test_without_names_lists_split_on_commas():
+    matrix = MembershipMatrix(np.array(['1,2', None, '2', ''], dtype=object))
+    assert list(matrix.mask('2')) == [True, False, True, False]
+    assert matrix.labels_present() == ['1', '2']
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from db_pool import close_all_pools, get_pool, statement_cache
+from query_handler import QUERY_LOG, execute_query, get_jurisdictions, get_query_log
+
+
+class RecordingConnection:
+    # sqlite3 connection that keeps every cursor it hands out
+    def __init__(self):
+        self.conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self.cursors = []
+
+    def cursor(self):
+        cursor = self.conn.cursor()
+        self.cursors.append(cursor)
+        return cursor
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+
+@pytest.fixture
+def pool():
+    yield get_pool('user', 'secret', 'test', RecordingConnection)
+    close_all_pools()
+
+
+def test_pooled_connection_reuses_statement_cursor(pool):
+    query = "SELECT ? AS Value"
+    with pool.connection() as conn:
+        first = execute_query(conn, query, (1,))
+        second = execute_query(conn, query, (2,))
+        assert list(statement_cache(conn)) == [query]
+    assert first['Value'].tolist() == [1]
+    assert second['Value'].tolist() == [2]
+    assert len(conn.cursors) == 1
+    with pool.connection() as again:
+        assert again is conn
+        execute_query(again, query, (3,))
+    # The only new cursor is the pool's health check on checkout
+    assert len(conn.cursors) == 2
+
+
+def test_failed_statement_leaves_cache(pool):
+    with pool.connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            execute_query(conn, "SELECT * FROM missing")
+        assert statement_cache(conn) == {}
+
+
+def test_unpooled_connection_closes_cursor():
+    conn = RecordingConnection()
+    df = execute_query(conn, "SELECT 1 AS One")
+    assert df['One'].tolist() == [1]
+    assert statement_cache(conn) is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.cursors[0].fetchall()
+
+
+def test_parameters_are_bound_not_formatted():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE tblCountryMaster (Name TEXT, isDirtyFlag INTEGER)")
+    conn.executemany("INSERT INTO tblCountryMaster VALUES (?, ?)",
+                     [("Côte d'Ivoire", 0), ('Korea, Republic of', None), ('WIPO', 0), ('Retired', 1)])
+    df = execute_query(conn, "SELECT Name FROM tblCountryMaster WHERE Name = ? OR Name = ?",
+                       ("Côte d'Ivoire", "x' OR '1' = '1"))
+    assert df['Name'].tolist() == ["Côte d'Ivoire"]
+    assert get_jurisdictions(conn)['Name'].tolist() == ['WIPO', "Côte d'Ivoire", 'Korea, Republic of']
+
+
+def test_query_log_records_each_execution():
+    conn = sqlite3.connect(':memory:')
+    QUERY_LOG.clear()
+    execute_query(conn, "SELECT ? AS a,\n       ? AS b", (1, 2))
+    execute_query(conn, "SELECT 1", name='named')
+    with pytest.raises(sqlite3.OperationalError):
+        execute_query(conn, "SELECT * FROM missing", name='broken')
+    log = get_query_log()
+    assert log['Statement'].tolist() == ['SELECT ? AS a, ? AS b', 'named', 'broken']
+    assert log['Parameters'].tolist() == [2, 0, 0]
+    assert log['Rows'].tolist()[:2] == [1, 1]
+    assert log['Rows'].isna().iloc[2]
+    assert (log['Seconds'] >= 0).all()